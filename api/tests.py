@@ -0,0 +1,314 @@
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import User, JobRole, Skill
+from staff.models import Staff, Experience, StaffReview
+from client.models import (
+    CompanyProfile, Job, JobTemplate, Vacancy, JobApplication, Checkin, Checkout, JobAds, MyStaff, FavouriteStaff,
+    JobReport, CompanyReview, InviteMystaff,
+)
+from chat.models import ChatRoom, ChatMessage
+from dashboard.models import Notification, FAQ, TermsAndConditions, LetmeReview, CompanyListed
+from shifting.models import Shifting, DailyShift
+from subscription.models import Packages
+
+
+MOUNTS = ('app/', 'web/')
+
+# every GET route of the api, mounted under both api/v1/app/ and api/v1/web/
+# route: [(user, url kwargs from seeded objects, query params, query budget)]
+# the budget holds for any amount of rows, test_budgets_hold_as_rows_grow checks the count does not move
+ROUTES = {
+    # users
+    'staffsignup/': [(None, {}, {}, 0)],
+    'clientsignup/': [(None, {}, {}, 0)],
+    'signin/': [(None, {}, {}, 0)],
+    'token/refresh/': [(None, {}, {}, 0)],
+    'token/verify/': [(None, {}, {}, 0)],
+    'logout/': [('staff', {}, {}, 0)],
+    'staffinvitation/': [('staff', {}, {}, 1)],
+    'api/skills/': [(None, {}, {}, 1)],
+    'api/jobroles/': [(None, {}, {}, 1)],
+    'uniforms/': [(None, {}, {}, 1)],
+
+    # client
+    'company/profile/': [('client', {}, {}, 3)],
+    'company/profile/image/': [('client', {}, {}, 0)],
+    'company/vacancy/': [('client', {}, {}, 0)],
+    'company/<int:job_id>/vacancy/': [('client', {'job_id': 'job'}, {}, 4)],
+    'company/vacancy/<int:pk>/': [('client', {'pk': 'vacancy'}, {}, 8)],
+    'company/jobs/': [('client', {}, {}, 6)],
+    'company/jobs/<int:pk>/': [('client', {'pk': 'job'}, {}, 6)],
+    'company/staff/favourites/': [('client', {}, {}, 2)],
+    'company/staff/favourites/<int:pk>/': [('client', {'pk': 'favourite'}, {}, 2)],
+    'company/staff/own/': [('client', {}, {}, 5)],
+    'company/staff/own/<int:pk>/': [('client', {'pk': 'mystaff'}, {}, 5)],
+    'company/job/applications/': [('client', {}, {}, 3)],
+    'company/job/applications/<int:pk>/': [('client', {'pk': 'pending'}, {}, 8)],
+    'company/job/<int:vacancy_id>/applications/': [('client', {'vacancy_id': 'vacancy'}, {}, 6)],
+    'company/job/<int:vacancy_id>/applications/<int:pk>/': [
+        ('client', {'vacancy_id': 'vacancy', 'pk': 'pending'}, {}, 8),
+    ],
+    'company/reports/export/': [('client', {}, {}, 2)],
+    'company/job/<int:vacancy_id>/applications/bulk/': [('client', {'vacancy_id': 'vacancy'}, {}, 0)],
+    'company/job/applications/<int:pk>/contract/': [('client', {'pk': 'application'}, {}, 1)],
+    'company/job/<int:vacancy_id>/contracts/': [('client', {'vacancy_id': 'vacancy'}, {}, 3)],
+    'company/job/applications/checkin/': [('client', {}, {}, 2)],
+    'company/job/applications/checkin/<int:pk>/': [('client', {'pk': 'checkin'}, {}, 2)],
+    'company/job/applications/checkout/': [('client', {}, {}, 2)],
+    'company/job/applications/checkout/<int:pk>/': [('client', {'pk': 'checkout'}, {}, 2)],
+    'company/review/': [('client', {}, {}, 5)],
+    'company/<int:application_id>/review/': [('client', {'application_id': 'application'}, {}, 5)],
+    'vacancy/<int:application_id>/tips/': [('client', {'application_id': 'application'}, {}, 0)],
+    'company/job/ads/': [('client', {}, {}, 3)],
+    'company/job/ads/<int:pk>/': [('client', {'pk': 'ads'}, {}, 4)],
+    'company/shifting/<int:shifting_id>/request/': [('client', {'shifting_id': 'shifting'}, {}, 4)],
+    'company/shifting/<int:shifting_id>/accept/<int:pk>/': [
+        ('client', {'shifting_id': 'shifting', 'pk': 'daily_shift'}, {}, 4),
+    ],
+    'company/staff/invited/': [('client', {}, {}, 2)],
+    'company/staff/invited/<int:package_id>/': [('client', {'package_id': 'package'}, {}, 2)],
+
+    # staff
+    'staff/profile/': [('staff', {}, {}, 4)],
+    # measured on a cold cache, one of them refills the company favourites set
+    'staff/profile/<int:pk>/': [('client', {'pk': 'staff'}, {}, 5)],
+    'staff/job/apply/': [('staff', {}, {}, 8)],
+    'staff/job/apply/<int:pk>/': [('staff', {'pk': 'vacancy'}, {}, 8)],
+    'staff/jobs/': [('staff', {}, {}, 4)],
+    'staff/jobs/<int:pk>/': [('staff', {'pk': 'application'}, {}, 6)],
+    'staff/jobs/<int:pk>/checkin/': [('staff', {'pk': 'application'}, {}, 6)],
+    'staff/jobs/<int:pk>/checkout/': [('staff', {'pk': 'application'}, {}, 6)],
+    'staff/reviews/': [('staff', {}, {}, 2)],
+    'vacancy/<int:application_id>/review/': [('staff', {'application_id': 'application'}, {}, 2)],
+    'staff/job/report/<int:application_id>/': [
+        ('staff', {'application_id': 'application'}, {}, 6),
+        ('staff', {'application_id': 'application'}, {'all': 'true'}, 3),
+    ],
+    'myshift/': [('staff', {}, {}, 2)],
+    'staff/shift/checkin/': [('staff', {}, {}, 2)],
+    'staff/shift/checkin/<int:pk>/': [('staff', {'pk': 'daily_shift'}, {}, 2)],
+    'staff/shift/': [('staff', {}, {}, 2)],
+    'staff/shift/<int:pk>/': [('staff', {'pk': 'daily_shift'}, {}, 2)],
+    'staff/shift/<int:pk>/checkin/': [('staff', {'pk': 'daily_shift'}, {}, 2)],
+    'staff/shift/<int:pk>/checkout/': [('staff', {'pk': 'daily_shift'}, {}, 2)],
+    'staff/shift/checkout/': [('staff', {}, {}, 2)],
+    'staff/experiences/': [('staff', {}, {}, 1)],
+    'staff/experiences/<int:pk>/': [('staff', {'pk': 'experience'}, {}, 3)],
+    'staff/workinghours/<int:staff_id>/': [('client', {'staff_id': 'staff'}, {}, 2)],
+    'staff/review/upcomming-job/<int:pk>/': [('client', {'pk': 'staff'}, {}, 3)],
+    'staff/review/job-history/<int:pk>/': [('client', {'pk': 'staff'}, {}, 4)],
+    'staff/review/review-list/<int:pk>/': [('client', {'pk': 'staff'}, {}, 3)],
+    'staff/applications/status/': [('staff', {}, {}, 2)],
+
+    # dashboard
+    'dashboard/notification/': [('client', {}, {}, 2), ('staff', {}, {}, 2)],
+    'dashboard/notification/<int:pk>/': [('staff', {'pk': 'notification'}, {}, 2)],
+    'dashboard/notification/unread-count/': [('staff', {}, {}, 1)],
+    'dashboard/skills/': [('staff', {}, {}, 1)],
+    'dashboard/jobs/': [('client', {}, {}, 7), ('staff', {}, {}, 2)],
+    'dashboard/jobs/<int:pk>/': [('client', {'pk': 'vacancy'}, {}, 4), ('staff', {'pk': 'vacancy'}, {}, 4)],
+    'dashboard/jobs/nearby/': [('staff', {}, {'latitude': '59.9139', 'longitude': '10.7522'}, 2)],
+    'dashboard/jobs/status-count/': [('client', {}, {}, 1)],
+    'dashboard/statistics/': [('client', {}, {}, 1)],
+    'job/templates/': [('client', {}, {}, 3)],
+    'job/templates/<int:pk>/': [('client', {'pk': 'template'}, {}, 6)],
+    'faq/': [(None, {}, {}, 1)],
+    'terms/': [(None, {}, {}, 1)],
+    'report/': [('staff', {}, {}, 1)],
+    'letme-review/': [(None, {}, {}, 1)],
+    'letme-company/': [(None, {}, {}, 2)],
+    'notify/': [('client', {}, {}, 0)],
+
+    # chat
+    'chat-list/': [('client', {}, {}, 2), ('staff', {}, {}, 2)],
+    'chat-history/<int:room_id>/': [('staff', {'room_id': 'room'}, {}, 2)],
+
+    # shifting
+    'company/shifting/shift/': [('client', {}, {}, 1)],
+    'company/<int:company_id>/shifting/': [('client', {'company_id': 'company'}, {}, 6)],
+
+    # subscription
+    'packages/': [('client', {}, {}, 1)],
+    'webhook/': [(None, {}, {}, 0)],
+
+    # homedashbord, celeryapi
+    'hhh/': [(None, {}, {}, 0)],
+    'celery/staff/': [('client', {}, {}, 1)],
+    'celery/payment/': [('client', {}, {}, 1)],
+}
+
+
+def api_routes(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from api_routes(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            yield route
+
+
+class QueryBudgetTests(TestCase):
+
+    def setUp(self):
+        # routes that render files in the worker, celery runs eagerly in tests
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = self.settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.role = JobRole.objects.create(name="Waiter", staff_price=200, client_price=300)
+        self.skill = Skill.objects.create(name="Bartending")
+        self.client_user = User.objects.create_user(
+            email="client@user.com", phone_number="123", first_name="Test", last_name="Client", password="foo", is_client=True
+        )
+        self.company = CompanyProfile.objects.create(
+            user=self.client_user, company_name="Company", contact_number="123",
+            company_email="company@user.com", billing_email="billing@user.com", company_address="Oslo",
+        )
+        self.staff_user = User.objects.create_user(
+            email="staff@user.com", phone_number="123", first_name="Test", last_name="Staff", password="foo", is_staff=True
+        )
+        self.staff = Staff.objects.create(user=self.staff_user, role=self.role, dob=date(2000, 1, 1))
+        self.staff.skills.add(self.skill)
+        self.job = Job.objects.create(company=self.company, title="Dinner")
+        self.template = JobTemplate.objects.create(name="Dinner", client=self.company, job=self.job)
+        self.mystaff = MyStaff.objects.create(client=self.company, staff=self.staff, status=True)
+        self.shifting = Shifting.objects.create(company=self.company, shift_for=self.mystaff)
+        self.room, _ = ChatRoom.objects.get_or_create_by_users(self.client_user.id, self.staff_user.id)
+        # bulk_create skips the stripe product signals
+        self.package, = Packages.objects.bulk_create([
+            Packages(name="Basic", number_of_staff=5, is_active=True, stripe_product_id="prod", stripe_price_id="price")
+        ])
+        FAQ.objects.create(question="Why?", answer="Because")
+        TermsAndConditions.objects.create(title="Terms", content="Terms")
+        LetmeReview.objects.create(reviewer="Reviewer", review="Great")
+        CompanyListed.objects.create(company=self.company)
+        self.rows = 0
+        self.grow(2)
+
+    def grow(self, count):
+        """Add count more rows to every collection the routes read."""
+        today = timezone.now().date()
+        for _ in range(count):
+            self.rows += 1
+            n = self.rows
+            other_user = User.objects.create_user(
+                email=f"staff{n}@user.com", phone_number="123", first_name="Other", last_name=f"Staff{n}",
+                password="foo", is_staff=True,
+            )
+            other = Staff.objects.create(user=other_user, role=self.role, dob=date(2000, 1, 1))
+            other.skills.add(self.skill)
+
+            self.vacancy = Vacancy.objects.create(
+                job=self.job, job_title=self.role, number_of_staff=3, open_date=today + timedelta(days=1),
+                close_date=today + timedelta(days=1), start_time=time(9), end_time=time(17), location="Oslo",
+                latitude=Decimal("59.913900"), longitude=Decimal("10.752200"),
+            )
+            self.vacancy.skills.add(self.skill)
+            self.vacancy.participants.add(self.staff)
+
+            in_time = timezone.make_aware(datetime.combine(today, time(9)))
+            self.application = JobApplication.objects.create(
+                vacancy=self.vacancy, applicant=self.staff, is_approve=True, job_status="completed",
+                in_time=in_time, out_time=in_time + timedelta(hours=8), checkin_approve=True, checkout_approve=True,
+            )
+            self.pending = JobApplication.objects.create(vacancy=self.vacancy, applicant=other)
+            JobApplication.objects.create(
+                vacancy=self.vacancy, applicant=self.staff, job_status="accepted", is_approve=True,
+            )
+            self.checkin = Checkin.objects.create(application=self.application, in_time=in_time, location="Oslo")
+            self.checkout = Checkout.objects.create(
+                application=self.application, out_time=in_time + timedelta(hours=8), location="Oslo",
+            )
+            JobReport.objects.create(
+                job_application=self.application, working_hour=8, regular_pay=Decimal("1600"), total_pay=Decimal("1600"),
+            )
+            StaffReview.objects.create(
+                staff=self.staff, vacancy=self.vacancy, review_by=self.company, rating=4, content="Good", job_role="Waiter",
+            )
+            CompanyReview.objects.create(
+                review_by=self.staff, review_for=self.company, application=self.application, rating=5, content="Nice",
+            )
+            self.favourite = FavouriteStaff.objects.create(company=self.company, staff=other)
+            FavouriteStaff.objects.get_or_create(company=self.company, staff=self.staff)
+            MyStaff.objects.create(client=self.company, staff=other, status=True)
+            self.ads = JobAds.objects.create(
+                company=self.company, job_title="Chef", start_date=timezone.now(), login_email="ads@user.com", status=True,
+            )
+            self.ads.skills.add(self.skill)
+            InviteMystaff.objects.create(
+                client=self.company, staff_name=f"Invited {n}", staff_email=f"invited{n}@user.com", phone="123",
+                job_role="Waiter", employee_type="part time",
+            )
+            self.experience = Experience.objects.create(
+                user=self.staff_user, job_role=self.role, start_date=date(2020, 1, 1), end_date=date(2021, 1, 1),
+            )
+            self.staff.experience.add(self.experience)
+            self.daily_shift = DailyShift.objects.create(
+                shift=self.shifting, staff=self.staff, day=today, start_time=time(9), end_time=time(17), location="Oslo",
+                status=True,
+            )
+            self.notification = Notification.objects.create(user=self.staff_user, message=f"message {n}")
+            Notification.objects.create(user=self.client_user, message=f"message {n}")
+
+            room, _ = ChatRoom.objects.get_or_create_by_users(self.client_user.id, other_user.id)
+            for user in (self.client_user, other_user):
+                ChatMessage.objects.create(room=room, sender=user, content="hello")
+            ChatMessage.objects.create(room=self.room, sender=self.staff_user, content=f"hello {n}")
+        # the last application stays awaiting approval of the client
+        JobApplication.objects.filter(id=self.pending.id).update(is_approve=False, job_status="pending")
+
+    def request(self, mount, route, user, kwargs, params):
+        path = route
+        for name, attribute in kwargs.items():
+            path = path.replace(f"<int:{name}>", str(getattr(self, attribute).id))
+        api = APIClient()
+        api.raise_request_exception = False
+        if user:
+            api.force_authenticate(getattr(self, f"{user}_user"))
+        cache.clear()
+        # the first request settles writes a GET may do once, the second is measured
+        api.get(f"/api/v1/{mount}{path}", params)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = api.get(f"/api/v1/{mount}{path}", params)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        return len(queries), response.status_code
+
+    def measure(self):
+        """{(mount, route, user, params): (queries, budget)} of every case in ROUTES"""
+        counts = {}
+        for mount in MOUNTS:
+            for route, cases in ROUTES.items():
+                for user, kwargs, params, budget in cases:
+                    queries, status_code = self.request(mount, route, user, kwargs, params)
+                    self.assertLess(status_code, 500, f"{mount}{route}")
+                    counts[mount, route, user, tuple(params)] = queries, budget
+        return counts
+
+    def test_every_route_has_a_budget(self):
+        routes = set(api_routes(get_resolver().url_patterns))
+        for mount in MOUNTS:
+            mounted = {route[len(f"api/v1/{mount}"):] for route in routes if route.startswith(f"api/v1/{mount}")}
+            self.assertEqual(mounted, set(ROUTES), mount)
+
+    def test_budgets_hold_as_rows_grow(self):
+        small = self.measure()
+        self.grow(6)
+        large = self.measure()
+        for key, (queries, budget) in large.items():
+            with self.subTest(key):
+                self.assertLessEqual(queries, budget)
+                # an N+1 shows up as more queries for more rows
+                self.assertEqual(queries, small[key][0])
@@ -16,4 +16,5 @@ class StaffInfoSerializer(serializers.ModelSerializer):
     def get_email(self, obj):
         return obj.user.email
     def get_swift_code(self, obj):
-        return f'{obj.bankdetails.swift_code}'
+        bank_details = getattr(obj, 'bank_details', None)
+        return bank_details.swift_code if bank_details else None
@@ -16,20 +16,22 @@ class StaffToCelery(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        staffs = Staff.objects.all()
+        staffs = Staff.objects.select_related('user', 'bank_details')
         serializer = StaffInfoSerializer(staffs, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 class StaffPaymentCeleryAPI(APIView):
 
     def get(self, request):
-        applications = JobApplication.objects.filter(checkout_approve=True)
+        applications = (
+            JobApplication.objects.filter(checkout_approve=True, total_working_hours__isnull=False)
+            .select_related(
+                'applicant__user', 'applicant__role', 'vacancy__job', 'vacancy__job_title', 'job_report'
+            )
+        )
         payment_lists = []
         for application in applications:
-            seconds = application.total_working_hours.total_seconds()
-            print(seconds, type(seconds))
-            hours, rem = divmod(int(seconds), 3600)
-            minutes, _ = divmod(rem,60)
+            report = getattr(application, 'job_report', None)
 
             data = {
                 "staff_id": application.applicant.id,
@@ -37,7 +39,7 @@ class StaffPaymentCeleryAPI(APIView):
                 "mail": application.applicant.user.email,
                 "job id": application.vacancy.job.id,
                 "job title": application.vacancy.job.title,
-                "client id": application.vacancy.job.company.id,
+                "client id": application.vacancy.job.company_id,
                 "staff role salary": application.applicant.role.staff_price,
                 "staff role actual job": application.vacancy.job_title.name,
                 "start date": application.vacancy.open_date,
@@ -46,7 +48,7 @@ class StaffPaymentCeleryAPI(APIView):
                 "end time": application.vacancy.end_time,
                 # "total working hour" : f'{hours} hours {minutes} minutes',
                 "total working hour" : str(application.total_working_hours),
-                "total salary": float (application.jobreport_set.first().total_pay)
+                "total salary": float(report.total_pay) if report and report.total_pay is not None else None
                 
             }
             payment_lists.append(data)
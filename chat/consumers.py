@@ -1,12 +1,22 @@
+import asyncio
 import json
+import time
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from dashboard import presence
 from .models import ChatRoom, ChatMessage
 
 User = get_user_model()
 
+# seconds between two "typing" broadcasts of the same user
+TYPING_INTERVAL = 3
+
+
 class ChatConsumer(AsyncWebsocketConsumer):
+    typing = False
+    typing_sent_at = 0.0
+
     async def connect(self):
         self.user = self.scope["user"]
         print("[CONNECT] User:", self.user)
@@ -22,19 +32,58 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
+        # resolve the room once, every message after this is a single insert
+        self.room_id = await self.get_room_id(self.user.id, self.other_user_id)
+        if self.room_id is None:
+            print("[ERROR] Unknown user_id in URL")
+            await self.close()
+            return
+
         self.room_group_name = self.get_room_group_name(self.user.id, self.other_user_id)
         print("[ROOM JOIN] Room Group:", self.room_group_name)
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
 
+        await presence.connected(presence.CHAT, self.user.id, self.channel_name)
+        self.heartbeat = asyncio.ensure_future(presence.keep_alive(presence.CHAT, self.user.id, self.channel_name))
+        # the peer's status for this client, ours for the peer if they are in the room
+        await self.send(text_data=json.dumps({
+            "type": "presence",
+            "user": self.other_user_id,
+            "online": await self.peer_online(),
+        }))
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {"type": "chat_presence", "user": self.user.id, "online": True},
+        )
+
     async def disconnect(self, close_code):
+        # closed before joining a room
+        if not hasattr(self, "room_group_name"):
+            return
         print(f"[DISCONNECT] User {self.user} from room {self.room_group_name}")
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        self.heartbeat.cancel()
+        await presence.disconnected(presence.CHAT, self.user.id, self.channel_name)
+        # other tabs may still be open
+        if not await sync_to_async(presence.online_users)([self.user.id], presence.ONLINE_KINDS):
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {"type": "chat_presence", "user": self.user.id, "online": False},
+            )
 
     async def receive(self, text_data):
         try:
             data = json.loads(text_data)
+            event_type = data.get("type", "message")
+            if event_type == "read":
+                await self.receive_read(data)
+                return
+            if event_type == "typing":
+                await self.receive_typing(data)
+                return
+
             message = data.get("message", "").strip()
             if not message:
                 print("[WARN] Empty message ignored")
@@ -46,10 +95,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 content=message
             )
 
+            # a sent message ends typing, clients clear the indicator on it
+            self.typing = False
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     "type": "chat_message",
+                    "id": saved_msg["id"],
                     "message": saved_msg["content"],
                     "sender": saved_msg["sender"],
                     "timestamp": saved_msg["timestamp"],
@@ -60,8 +112,63 @@ class ChatConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             print("[ERROR] receive:", e)
 
+    async def receive_read(self, data):
+        # everything up to message_id is read, one UPDATE and one compact receipt
+        try:
+            message_id = int(data["message_id"])
+        except (KeyError, TypeError, ValueError):
+            print("[WARN] Read receipt without message_id ignored")
+            return
+        if await self.mark_read(message_id):
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {"type": "chat_read", "reader": self.user.id, "message_id": message_id},
+            )
+
+    async def receive_typing(self, data):
+        # debounce keystrokes, "typing" goes out at most once per TYPING_INTERVAL, "stopped" once
+        typing = bool(data.get("typing", True))
+        now = time.monotonic()
+        if typing:
+            if self.typing and now - self.typing_sent_at < TYPING_INTERVAL:
+                return
+            self.typing_sent_at = now
+        elif not self.typing:
+            return
+        self.typing = typing
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {"type": "chat_typing", "user": self.user.id, "typing": typing},
+        )
+
+    async def chat_read(self, event):
+        await self.send(text_data=json.dumps({
+            "type": "read",
+            "reader": event["reader"],
+            "message_id": event["message_id"],
+        }))
+
+    async def chat_typing(self, event):
+        if event["user"] == self.user.id:
+            return
+        await self.send(text_data=json.dumps({
+            "type": "typing",
+            "user": event["user"],
+            "typing": event["typing"],
+        }))
+
+    async def chat_presence(self, event):
+        if event["user"] == self.user.id:
+            return
+        await self.send(text_data=json.dumps({
+            "type": "presence",
+            "user": event["user"],
+            "online": event["online"],
+        }))
+
     async def chat_message(self, event):
         await self.send(text_data=json.dumps({
+            "id": event.get("id"),
             "message": event["message"],
             "sender": event["sender"],
             "timestamp": event["timestamp"],
@@ -72,26 +179,32 @@ class ChatConsumer(AsyncWebsocketConsumer):
         ids = sorted([user1_id, user2_id])
         return f"chat_room_{ids[0]}_{ids[1]}"
 
-    @database_sync_to_async
-    def save_message(self, sender_id, receiver_id, content):
-        users = sorted([sender_id, receiver_id])
-
-        # Get or create the room with both participants
-        room = ChatRoom.objects.filter(participants__id=users[0]) \
-                               .filter(participants__id=users[1]) \
-                               .distinct().first()
-        if not room:
-            room = ChatRoom.objects.create()
-            room.participants.add(*users)
-
-        msg = ChatMessage.objects.create(
-            room=room,
+    # async ORM, no database_sync_to_async wrapper per message
+    async def get_room_id(self, user_id, other_user_id):
+        if not await User.objects.filter(id=other_user_id).aexists():
+            return None
+        room, _ = await ChatRoom.objects.aget_or_create_by_users(user_id, other_user_id)
+        return room.id
+
+    async def peer_online(self):
+        online = await sync_to_async(presence.online_users)([self.other_user_id], presence.ONLINE_KINDS)
+        return bool(online)
+
+    async def mark_read(self, message_id):
+        return await ChatMessage.objects.filter(
+            room_id=self.room_id, id__lte=message_id, is_read=False
+        ).exclude(sender_id=self.user.id).aupdate(is_read=True)
+
+    async def save_message(self, sender_id, receiver_id, content):
+        msg = await ChatMessage.objects.acreate(
+            room_id=self.room_id,
             sender_id=sender_id,
             content=content
         )
 
         return {
+            "id": msg.id,
             "content": msg.content,
-            "sender": msg.sender.id,
+            "sender": msg.sender_id,
             "timestamp": str(msg.timestamp),
         }
@@ -0,0 +1,80 @@
+import asyncio
+import statistics
+import time
+import uuid
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from chat.routing import websocket_urlpatterns
+from users.models import User
+
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class Command(BaseCommand):
+    help = 'Load test ChatConsumer with in-memory websocket clients, reports messages/second and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20, help='Number of websocket clients, paired two by two')
+        parser.add_argument('--messages', type=int, default=50, help='Messages sent by every client')
+        parser.add_argument('--timeout', type=float, default=10)
+
+    def handle(self, *args, **options):
+        clients = max(2, options['clients'] - options['clients'] % 2)
+        prefix = f"loadtest-{uuid.uuid4().hex[:8]}"
+        users = [
+            User.objects.create_user(
+                email=f"{prefix}-{i}@example.com", phone_number="0", first_name="Load", last_name=str(i), password=None
+            )
+            for i in range(clients)
+        ]
+        try:
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER):
+                latencies, elapsed = asyncio.run(self.run(users, options['messages'], options['timeout']))
+        finally:
+            # rooms and messages go with the users
+            User.objects.filter(email__startswith=prefix).delete()
+
+        latencies.sort()
+        total = len(latencies)
+        p99 = latencies[min(total - 1, int(total * 0.99))]
+        self.stdout.write(f'clients: {clients}, messages: {total}, elapsed: {elapsed:.2f}s')
+        self.stdout.write(f'throughput: {total / elapsed:.1f} msg/s')
+        self.stdout.write(
+            f'latency ms: p50 {statistics.median(latencies) * 1000:.2f}, p99 {p99 * 1000:.2f}, max {latencies[-1] * 1000:.2f}'
+        )
+
+    async def run(self, users, messages, timeout):
+        application = URLRouter(websocket_urlpatterns)
+        sockets = []
+        for i, user in enumerate(users):
+            partner = users[i ^ 1]
+            communicator = WebsocketCommunicator(application, f"/ws/chat/{partner.id}/")
+            communicator.scope["user"] = user
+            connected, _ = await communicator.connect(timeout=timeout)
+            if not connected:
+                raise RuntimeError(f"client {i} could not connect")
+            sockets.append((user, communicator))
+
+        async def client(user, communicator):
+            latencies = []
+            for n in range(messages):
+                token = f"{user.id}:{n}"
+                started = time.perf_counter()
+                await communicator.send_json_to({"message": token})
+                # partner messages and presence frames arrive on the same socket, wait for our own echo
+                while (await communicator.receive_json_from(timeout=timeout)).get("message") != token:
+                    pass
+                latencies.append(time.perf_counter() - started)
+            return latencies
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(client(user, communicator) for user, communicator in sockets))
+        elapsed = time.perf_counter() - started
+        for _, communicator in sockets:
+            await communicator.disconnect()
+        return [latency for result in results for latency in result], elapsed
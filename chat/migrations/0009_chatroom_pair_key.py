@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_pair_keys(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+
+    members = {}
+    for room_id, user_id in ChatRoom.participants.through.objects.values_list('chatroom_id', 'user_id'):
+        members.setdefault(room_id, set()).add(user_id)
+
+    canonical = {}
+    for room_id in sorted(members):
+        if len(members[room_id]) != 2:
+            continue
+        pair = tuple(sorted(members[room_id]))
+        if pair not in canonical:
+            canonical[pair] = room_id
+            ChatRoom.objects.filter(id=room_id).update(user_low_id=pair[0], user_high_id=pair[1])
+        else:
+            # duplicate room of the same two users, keep the history in the oldest one
+            ChatMessage.objects.filter(room_id=room_id).update(room_id=canonical[pair])
+            ChatRoom.objects.filter(id=room_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_chatroom_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='user_high',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='user_low',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_pair_keys, migrations.RunPython.noop),
+    ]
@@ -11,22 +11,34 @@ from django.utils import timezone
 
 class ChatRoomManager(models.Manager):
     def get_or_create_by_users(self, user1_id, user2_id):
-        users = sorted([user1_id, user2_id])
-        rooms = self.filter(participants__id=users[0]).filter(participants__id=users[1])
-        for room in rooms:
-            if room.participants.count() == 2:
-                return room, False
-
-        room = self.create()
-        room.participants.add(*users)
-        return room, True
+        # (user_low, user_high) is unique, one indexed lookup finds the room
+        user_low, user_high = sorted([user1_id, user2_id])
+        room, created = self.get_or_create(user_low_id=user_low, user_high_id=user_high)
+        if created:
+            room.participants.add(user_low, user_high)
+        return room, created
+
+    async def aget_or_create_by_users(self, user1_id, user2_id):
+        user_low, user_high = sorted([user1_id, user2_id])
+        room, created = await self.aget_or_create(user_low_id=user_low, user_high_id=user_high)
+        if created:
+            await room.participants.aadd(user_low, user_high)
+        return room, created
     
 class ChatRoom(models.Model):
     participants = models.ManyToManyField(User)
+    # canonical pair key of a two person room, smaller user id first
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', blank=True, null=True)
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     objects = ChatRoomManager() 
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='unique_chat_room_pair'),
+        ]
+
     def __str__(self):
         return f'Chat Room {self.id} with {self.participants.count()} participants'
     
@@ -43,6 +55,10 @@ class ChatMessage(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # history pages and last message lookups seek on (room, timestamp, id)
+            models.Index(fields=['room', 'timestamp', 'id']),
+        ]
 
 
 # class ChatList(models.Model):
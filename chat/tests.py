@@ -1,3 +1,136 @@
-from django.test import TestCase
+from datetime import date
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from dashboard import presence
+from users.models import User, JobRole
+from staff.models import Staff
+from .models import ChatRoom, ChatMessage
+from .routing import websocket_urlpatterns
+
+
+def create_user(email):
+    return User.objects.create_user(
+        email=email, phone_number="123", first_name="Test", last_name="User", password="foo"
+    )
+
+
+class ChatRoomPairTests(TestCase):
+
+    def test_same_room_for_both_orders(self):
+        first, second = create_user("a@user.com"), create_user("b@user.com")
+        room, created = ChatRoom.objects.get_or_create_by_users(second.id, first.id)
+        self.assertTrue(created)
+        self.assertEqual((room.user_low_id, room.user_high_id), (first.id, second.id))
+        self.assertEqual(ChatRoom.objects.get_or_create_by_users(first.id, second.id), (room, False))
+        self.assertEqual(room.participants.count(), 2)
+
+
+class ChatConsumerTests(TransactionTestCase):
+
+    def setUp(self):
+        presence.get_registry().clear()
+
+    async def connect(self, user, other):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/chat/{other.id}/")
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        status = await communicator.receive_json_from()
+        self.assertEqual((status["type"], status["user"]), ("presence", other.id))
+        return communicator
+
+    async def test_message_is_saved_in_resolved_room(self):
+        sender = await database_sync_to_async(create_user)("a@user.com")
+        receiver = await database_sync_to_async(create_user)("b@user.com")
+
+        communicator = await self.connect(sender, receiver)
+        await communicator.send_json_to({"message": "hello"})
+        event = await communicator.receive_json_from()
+        self.assertEqual(event["message"], "hello")
+        await communicator.disconnect()
+
+        message = await database_sync_to_async(ChatMessage.objects.select_related("room").get)()
+        self.assertEqual((message.room.user_low_id, message.room.user_high_id), (sender.id, receiver.id))
+
+    async def test_read_receipt_and_typing_debounce(self):
+        sender = await database_sync_to_async(create_user)("a@user.com")
+        receiver = await database_sync_to_async(create_user)("b@user.com")
+        sender_socket = await self.connect(sender, receiver)
+        receiver_socket = await self.connect(receiver, sender)
+        self.assertEqual(await sender_socket.receive_json_from(), {"type": "presence", "user": receiver.id, "online": True})
+
+        for _ in range(5):
+            await sender_socket.send_json_to({"type": "typing"})
+        self.assertEqual(await receiver_socket.receive_json_from(), {"type": "typing", "user": sender.id, "typing": True})
+        self.assertTrue(await receiver_socket.receive_nothing())
+
+        for text in ("one", "two"):
+            await sender_socket.send_json_to({"message": text})
+        for socket in (sender_socket, receiver_socket):
+            last = [await socket.receive_json_from() for _ in range(2)][-1]
+
+        await receiver_socket.send_json_to({"type": "read", "message_id": last["id"]})
+        receipt = await sender_socket.receive_json_from()
+        self.assertEqual(receipt, {"type": "read", "reader": receiver.id, "message_id": last["id"]})
+        unread = await database_sync_to_async(ChatMessage.objects.filter(is_read=False).count)()
+        self.assertEqual(unread, 0)
+
+        await receiver_socket.receive_json_from()
+        await sender_socket.disconnect()
+        self.assertEqual(await receiver_socket.receive_json_from(), {"type": "presence", "user": sender.id, "online": False})
+        await receiver_socket.disconnect()
+
+
+class ChatListTests(TestCase):
+
+    def test_chat_list_is_constant_queries(self):
+        client_user = User.objects.create_user(
+            email="client@user.com", phone_number="123", first_name="Client", last_name="User", password="foo", is_client=True
+        )
+        role = JobRole.objects.create(name="Waiter")
+        for i in range(3):
+            staff_user = create_user(f"staff{i}@user.com")
+            Staff.objects.create(user=staff_user, role=role, dob=date(2000, 1, 1))
+            room, _ = ChatRoom.objects.get_or_create_by_users(client_user.id, staff_user.id)
+            ChatMessage.objects.create(room=room, sender=staff_user, content=f"hello {i}")
+            ChatMessage.objects.create(room=room, sender=staff_user, content=f"latest {i}")
+
+        api = APIClient()
+        api.force_authenticate(client_user)
+        with self.assertNumQueries(2):
+            response = api.get("/api/v1/app/chat-list/")
+
+        data = response.data["data"]
+        self.assertEqual([chat["last_message"] for chat in data], ["latest 2", "latest 1", "latest 0"])
+        self.assertEqual(data[0]["unread_count"], 2)
+
+
+class ChatHistoryTests(TestCase):
+
+    def test_seek_pages(self):
+        first, second = create_user("a@user.com"), create_user("b@user.com")
+        room, _ = ChatRoom.objects.get_or_create_by_users(first.id, second.id)
+        ids = [ChatMessage.objects.create(room=room, sender=first, content=str(i)).id for i in range(5)]
+        api = APIClient()
+        api.force_authenticate(second)
+        url = f"/api/v1/app/chat-history/{room.id}/"
+
+        with self.assertNumQueries(2):
+            response = api.get(url, {"limit": 2})
+        self.assertEqual([m["id"] for m in response.data["data"]], ids[3:])
+        self.assertTrue(response.data["has_more"])
+
+        response = api.get(url, {"limit": 2, "before": response.data["before"]})
+        self.assertEqual([m["id"] for m in response.data["data"]], ids[1:3])
+
+        response = api.get(url, {"limit": 10, "after": ids[1]})
+        self.assertEqual([m["id"] for m in response.data["data"]], ids[2:])
+        self.assertFalse(response.data["has_more"])
+
+        for limit in ("-1", "0", "abc"):
+            self.assertEqual(api.get(url, {"limit": limit}).status_code, 400)
@@ -1,72 +1,154 @@
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
+from django.db.models import Q, F, Case, When, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from staff.models import Staff
 from client.models import CompanyProfile
+from dashboard.presence import online_users, ONLINE_KINDS
 from . models import ChatMessage, ChatRoom
 
 
+class ChatListPagination(CursorPagination):
+    page_size = 20
+    ordering = ("-last_activity", "-id")
+
+
 class ChatListView(APIView):
     """
     VIEW CHAT LIST
     """
     def get(self, request):
         user = request.user
-        chat_rooms = ChatRoom.objects.filter(participants=user)
-        print("chat rooms:", chat_rooms)
+        messages = ChatMessage.objects.filter(room=OuterRef("pk")).order_by("-timestamp", "-id")
+        unread = (
+            ChatMessage.objects.filter(room=OuterRef("pk"), is_read=False)
+            .exclude(sender=user)
+            .values("room")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        # one query for the page, last message and unread count come from subqueries
+        chat_rooms = (
+            ChatRoom.objects.filter(Q(user_low=user) | Q(user_high=user))
+            .annotate(
+                other_user_id=Case(When(user_low=user, then=F("user_high")), default=F("user_low")),
+                last_message=Subquery(messages.values("content")[:1]),
+                last_timestamp=Subquery(messages.values("timestamp")[:1]),
+                unread_count=Coalesce(Subquery(unread), 0),
+                last_activity=Coalesce(Subquery(messages.values("timestamp")[:1]), F("created_at")),
+            )
+        )
+        paginator = ChatListPagination()
+        rooms = paginator.paginate_queryset(chat_rooms, request, view=self)
 
-        chat_list = []
-        
+        # counterpart profiles of the whole page in one query
+        other_ids = [room.other_user_id for room in rooms]
         if user.is_client:
-            for room in chat_rooms:
-                particiapants = room.participants.exclude(id=user.id)[0]
-                profile= Staff.objects.filter(user=particiapants).first()
-                if profile:
-                    chat_list.append({
-                        "id": room.id,
-                        "name": profile.user.first_name + " " + profile.user.last_name,
-                        "image": profile.avatar.url if profile.avatar else None,
-                        "last_message": room.messages.last().content if room.messages.exists() else "",
-                        # "last_message": room.messages.last().content if room.messages.exists() else "",
-                        # "timestamp": room.messages.last().timestamp if room.messages.exists() else None
-                    })
+            profiles = {
+                profile.user_id: {
+                    "name": profile.user.first_name + " " + profile.user.last_name,
+                    "image": profile.avatar.url if profile.avatar else None,
+                }
+                for profile in Staff.objects.filter(user_id__in=other_ids).select_related("user")
+            }
         elif user.is_staff:
-            for room in chat_rooms:
-                particiapants = room.participants.exclude(id=user.id)[0]
-                profile = CompanyProfile.objects.filter(user=particiapants).first()
-                if profile:
-                    chat_list.append({
-                        "id": room.id,
-                        "name": profile.company_name,
-                        "image": profile.company_logo.url if profile.company_logo else None,
-                        "last_message": room.messages.last().content if room.messages.exists() else "",
-                        # "timestamp": room.messages.last().timestamp if room.messages.exists() else None
-                    })
-        
-        
-        return Response(chat_list, status=status.HTTP_200_OK)
+            profiles = {
+                profile.user_id: {
+                    "name": profile.company_name,
+                    "image": profile.company_logo.url if profile.company_logo else None,
+                }
+                for profile in CompanyProfile.objects.filter(user_id__in=other_ids)
+            }
+        else:
+            profiles = {}
+
+        # one redis round trip for the whole page
+        online = online_users(other_ids, ONLINE_KINDS)
+
+        chat_list = []
+        for room in rooms:
+            profile = profiles.get(room.other_user_id)
+            if profile:
+                chat_list.append({
+                    "id": room.id,
+                    "user_id": room.other_user_id,
+                    **profile,
+                    "last_message": room.last_message or "",
+                    "timestamp": room.last_timestamp,
+                    "unread_count": room.unread_count,
+                    "online": room.other_user_id in online,
+                })
+
+        response_data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "data": chat_list,
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+HISTORY_PAGE_SIZE = 30
+HISTORY_MAX_PAGE_SIZE = 100
 
 
 class ChatHistoryAPIView(APIView):
     """
     VIEW CHAT HISTORY
+    latest page by default, ?before=<message id> for older and ?after=<message id> for newer messages
     """
     def get(self, request, room_id):
         user = request.user
-        try:
-            chat_room = ChatRoom.objects.get(id=room_id, participants=user)
-        except ChatRoom.DoesNotExist:
+        if not ChatRoom.objects.filter(Q(user_low=user) | Q(user_high=user), id=room_id).exists():
             return Response({"error": "Chat room not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        messages = chat_room.messages.all().order_by('timestamp')
-        message_list = [
-            {
-                "sender": message.sender.id,
-                "content": message.content,
-                "timestamp": message.timestamp.isoformat(),
-                "is_read": message.is_read
-            } for message in messages
-        ]
-
-        return Response(message_list, status=status.HTTP_200_OK)
\ No newline at end of file
+        try:
+            limit = min(int(request.query_params.get("limit", HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+            before = request.query_params.get("before")
+            after = request.query_params.get("after")
+            before = int(before) if before else None
+            after = int(after) if after else None
+        except ValueError:
+            return Response({"error": "limit, before and after must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"error": "limit must be at least 1."}, status=status.HTTP_400_BAD_REQUEST)
+
+        messages = ChatMessage.objects.filter(room_id=room_id)
+        if after:
+            # keyset seek past the (timestamp, id) of the cursor message
+            pivot = Subquery(ChatMessage.objects.filter(room_id=room_id, id=after).values("timestamp"))
+            messages = messages.filter(Q(timestamp__gt=pivot) | Q(timestamp=pivot, id__gt=after)).order_by("timestamp", "id")
+        else:
+            if before:
+                pivot = Subquery(ChatMessage.objects.filter(room_id=room_id, id=before).values("timestamp"))
+                messages = messages.filter(Q(timestamp__lt=pivot) | Q(timestamp=pivot, id__lt=before))
+            messages = messages.order_by("-timestamp", "-id")
+
+        # plain dicts, no model instances and no sender lookups
+        message_list = list(messages.values("id", "sender_id", "content", "timestamp", "is_read")[:limit + 1])
+        has_more = len(message_list) > limit
+        message_list = message_list[:limit]
+        if not after:
+            message_list.reverse()
+
+        response_data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "has_more": has_more,
+            "before": message_list[0]["id"] if message_list else None,
+            "after": message_list[-1]["id"] if message_list else None,
+            "data": [
+                {
+                    "id": message["id"],
+                    "sender": message["sender_id"],
+                    "content": message["content"],
+                    "timestamp": message["timestamp"].isoformat(),
+                    "is_read": message["is_read"],
+                } for message in message_list
+            ],
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
@@ -13,6 +13,7 @@ from unfold.contrib.filters.admin import RangeDateFilter, RangeDateTimeFilter
 from import_export.admin import ImportExportModelAdmin
 from import_export import resources, fields
 
+from . import exports
 from .models import (
     CompanyProfile,
     JobTemplate,
@@ -62,7 +63,7 @@ class VacancyInline(StackedInline):  # or admin.StackedInline for a different la
     extra = 0
     fields = (
         'job_title', 'number_of_staff', 'skills', 'uniform', 'open_date', 'close_date',
-        'start_time', 'end_time', 'location', 'job_status', 'salary', 'participants', 'shift_job'
+        'start_time', 'end_time', 'location', 'latitude', 'longitude', 'geofence_radius', 'job_status', 'salary', 'participants', 'shift_job'
     )
     readonly_fields = ('salary',)
     show_change_link = True
@@ -145,6 +146,7 @@ class JobApplicationAdmin(ModelAdmin):
                 'applicant',
                 'job_status',
                 'is_approve',
+                'contract_status',
                 
             )
         }),
@@ -184,14 +186,14 @@ class StaffInvitationAdmin(ModelAdmin):
 
 @admin.register(Checkin)
 class CheckinAdmin(ModelAdmin):
-   list_display = ('application', 'in_time', 'location','is_approved')
+   list_display = ('application', 'in_time', 'location', 'distance', 'within_geofence', 'is_approved')
    list_editable = ('is_approved',)
 
    def get_queryset(self, request):
        return super().get_queryset(request).select_related('application')
 @admin.register(Checkout)
 class CheckoutAdmin(ModelAdmin):
-    list_display = ('application', 'out_time', 'location','is_approved')
+    list_display = ('application', 'out_time', 'location', 'distance', 'within_geofence', 'is_approved')
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('application')
@@ -265,9 +267,20 @@ class JobReportAdmin(ImportExportModelAdmin, ModelAdmin):
     list_per_page = 20
     date_hierarchy = 'created_at'
 
+    actions = ['export_csv', 'export_xlsx']
+
     def has_import_permission(self, request):
         return False
 
+    # import-export builds the whole dataset in memory, these stream from a cursor instead
+    @admin.action(description='Export selected reports as CSV (streaming)')
+    def export_csv(self, request, queryset):
+        return exports.payroll_response(exports.payroll_rows(queryset), 'csv', 'job_reports')
+
+    @admin.action(description='Export selected reports as XLSX (streaming)')
+    def export_xlsx(self, request, queryset):
+        return exports.payroll_response(exports.payroll_rows(queryset), 'xlsx', 'job_reports')
+
     
 
 
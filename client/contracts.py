@@ -0,0 +1,77 @@
+# job contract pdf rendering
+from functools import lru_cache
+
+from django.template.loader import get_template
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+
+
+CONTRACT_TEMPLATE = 'contact.html'
+CONTRACT_STYLESHEET = 'contract.css'
+
+
+@lru_cache(maxsize=None)
+def _font_config():
+    # fontconfig lookups are the slowest part of a cold render, keep one per process
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def _stylesheet():
+    css = get_template(CONTRACT_STYLESHEET).render()
+    return CSS(string=css, font_config=_font_config())
+
+
+@lru_cache(maxsize=None)
+def _template():
+    return get_template(CONTRACT_TEMPLATE)
+
+
+def warm_up():
+    """Load fonts, stylesheet and template before the first contract is rendered."""
+    _template()
+    _stylesheet()
+
+
+def contract_context(application):
+    vacancy = application.vacancy
+    user = application.applicant.user
+    return {
+        'staff_name': user.first_name + ' ' + user.last_name,
+        'vacancy_name': vacancy.job_title.name,
+        'starting_date_time': f'{vacancy.open_date} at {vacancy.start_time}',
+        'price_per_hour': vacancy.job_title.staff_price,
+        'location': vacancy.location,
+        'company_name': vacancy.job.company,
+        'company_website': 'https://www.example.com',
+        'year': '2025',
+    }
+
+
+def render_contract_html(context):
+    """Email version of the contract, with the stylesheet inlined."""
+    return _template().render(context)
+
+
+def _render_document(context):
+    # the pdf skips the inline <style>, the parsed stylesheet is passed instead
+    html = _template().render({**context, 'pdf': True})
+    return HTML(string=html).render(stylesheets=[_stylesheet()], font_config=_font_config())
+
+
+def render_contract_pdf(context):
+    return _render_document(context).write_pdf()
+
+
+def render_contracts(contexts):
+    """Render one pdf per context, sharing the warm fonts and stylesheet."""
+    return [render_contract_pdf(context) for context in contexts]
+
+
+def render_contracts_merged(contexts):
+    """Render every context into a single multi-page pdf."""
+    documents = [_render_document(context) for context in contexts]
+    if not documents:
+        return None
+    pages = [page for document in documents for page in document.pages]
+    return documents[0].copy(pages).write_pdf()
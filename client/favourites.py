@@ -0,0 +1,50 @@
+# favourite staff of every company as one cached set, versioned per company
+# the version lives in the shared redis cache (settings.CACHES), a bump from any process or worker
+# moves every reader to the new set, a per-process cache would keep serving the old one for a day
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+FAVOURITES_TIMEOUT = 60 * 60 * 24
+
+
+def _version_key(company_id):
+    return f'favourite_staff_version_{company_id}'
+
+
+def _version(company_id):
+    # a clock value, a version lost to eviction never comes back as an older one
+    key = _version_key(company_id)
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key) or time.time_ns()
+
+
+def staff_ids(company_id):
+    """frozenset of the staff the company marked as favourite, one query on a miss"""
+    from .models import FavouriteStaff
+
+    if not company_id:
+        return frozenset()
+    key = f'favourite_staff_{company_id}_{_version(company_id)}'
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(FavouriteStaff.objects.filter(company_id=company_id).values_list('staff_id', flat=True))
+        # a refill that read before a write lands on the old version, nobody reads that any more
+        cache.set(key, ids, FAVOURITES_TIMEOUT)
+    return ids
+
+
+def is_favourite(company_id, staff_id):
+    return staff_id in staff_ids(company_id)
+
+
+def changed(company_id):
+    """move the company to a new version once the write is committed"""
+    def bump():
+        try:
+            cache.incr(_version_key(company_id))
+        except ValueError:
+            cache.set(_version_key(company_id), time.time_ns(), None)
+    transaction.on_commit(bump)
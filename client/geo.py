@@ -0,0 +1,135 @@
+# check-in geofencing, haversine distances for whole batches in one numpy pass
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.db.models import Q
+
+from . import geohash
+from .models import Checkin, Checkout
+
+
+# mean earth radius in meters
+EARTH_RADIUS = 6371008.8
+SCORE_FIELDS = ['distance', 'within_geofence']
+
+
+def parse_coordinates(data):
+    """(latitude, longitude) Decimals of a request payload, (None, None) when absent, ValueError when invalid"""
+    latitude, longitude = data.get('latitude'), data.get('longitude')
+    if latitude in (None, '') and longitude in (None, ''):
+        return None, None
+    try:
+        latitude, longitude = Decimal(str(latitude)), Decimal(str(longitude))
+    except InvalidOperation:
+        raise ValueError('latitude and longitude must be numbers')
+    # NaN can not be compared, the range check below would raise InvalidOperation on it
+    if not (latitude.is_finite() and longitude.is_finite()):
+        raise ValueError('latitude and longitude must be numbers')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('latitude or longitude out of range')
+    return latitude.quantize(Decimal('0.000001')), longitude.quantize(Decimal('0.000001'))
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great circle distance in meters, arguments are degrees or arrays of degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def geofence(lat, lon, venue_lat, venue_lon, radius):
+    """Rounded distances and pass/fail of every point against its venue radius."""
+    distance = np.rint(haversine(lat, lon, venue_lat, venue_lon)).astype(np.int64)
+    return distance, distance <= np.asarray(radius, dtype=np.int64)
+
+
+def pending(model=Checkin):
+    """Check-in or check-out records not scored yet."""
+    return model.objects.filter(distance__isnull=True)
+
+
+def _score_batch(model, rows):
+    ids, lat, lon, venue_lat, venue_lon, radius = zip(*rows)
+    distance, inside = geofence(lat, lon, venue_lat, venue_lon, radius)
+    records = [
+        model(id=record_id, distance=int(meters), within_geofence=bool(passed))
+        for record_id, meters, passed in zip(ids, distance, inside)
+    ]
+    model.objects.bulk_update(records, SCORE_FIELDS)
+    return len(records)
+
+
+def score_records(records, batch_size=5000):
+    """Persist distance and geofence result of a Checkin or Checkout queryset, returns the number scored.
+
+    records without coordinates on either end are left unscored
+    """
+    rows = records.filter(
+        latitude__isnull=False,
+        longitude__isnull=False,
+        application__vacancy__latitude__isnull=False,
+        application__vacancy__longitude__isnull=False,
+    ).order_by('id').values_list(
+        'id', 'latitude', 'longitude',
+        'application__vacancy__latitude', 'application__vacancy__longitude', 'application__vacancy__geofence_radius',
+    )
+    scored = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            scored += _score_batch(records.model, batch)
+            batch = []
+    if batch:
+        scored += _score_batch(records.model, batch)
+    return scored
+
+
+def score_record(record):
+    """Score one saved Checkin or Checkout in place against its application's vacancy, returns the distance.
+
+    the vacancy already loaded on the record is used, the only query is the UPDATE
+    """
+    vacancy = record.application.vacancy
+    if None in (record.latitude, record.longitude, vacancy.latitude, vacancy.longitude):
+        return None
+    distance, inside = geofence(record.latitude, record.longitude, vacancy.latitude, vacancy.longitude, vacancy.geofence_radius)
+    record.distance, record.within_geofence = int(distance), bool(inside)
+    type(record).objects.filter(id=record.id).update(distance=record.distance, within_geofence=record.within_geofence)
+    return record.distance
+
+
+def score_pending(batch_size=5000):
+    """Score every pending check-in and check-out, returns (checkins, checkouts)."""
+    return score_records(pending(Checkin), batch_size), score_records(pending(Checkout), batch_size)
+
+
+def nearby(vacancies, latitude, longitude, radius, limit):
+    """(vacancy id, meters) of the closest vacancies within radius, sorted by distance and start.
+
+    geohash cells cut the candidates, the bounding box trims the cell edges,
+    exact distances of what is left come from one numpy pass
+    """
+    box = geohash.bounding_box(float(latitude), float(longitude), radius)
+    cells = Q()
+    for cell in geohash.covering_cells(*box):
+        cells |= Q(geohash__startswith=cell)
+    rows = list(
+        vacancies.filter(
+            cells,
+            latitude__range=(box[0], box[2]),
+            longitude__range=(box[1], box[3]),
+        ).values_list('id', 'latitude', 'longitude', 'open_date', 'start_time')
+    )
+    if not rows:
+        return []
+
+    ids, lats, lons, open_dates, start_times = zip(*rows)
+    distance = np.rint(haversine(latitude, longitude, lats, lons)).astype(np.int64)
+    matches = [
+        (int(meters), open_date, start_time, vacancy_id)
+        for vacancy_id, meters, open_date, start_time in zip(ids, distance, open_dates, start_times)
+        if meters <= radius
+    ]
+    matches.sort()
+    return [(vacancy_id, meters) for meters, _, _, vacancy_id in matches[:limit]]
@@ -0,0 +1,75 @@
+# geohash buckets for vacancy coordinates, nearby cells share a prefix
+import math
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# ~150m cells, radius queries match shorter prefixes of it
+PRECISION = 7
+# most prefix cells a radius query ORs together
+MAX_CELLS = 16
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        # even bits split longitude, odd bits latitude
+        span, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(latitude, longitude) degrees covered by one cell."""
+    total = precision * 5
+    return 180 / 2 ** (total // 2), 360 / 2 ** ((total + 1) // 2)
+
+
+def bounding_box(latitude, longitude, radius):
+    """(min_lat, min_lon, max_lat, max_lon) around a point, radius in meters."""
+    lat_delta = math.degrees(radius / 6371008.8)
+    lon_delta = lat_delta / max(math.cos(math.radians(latitude)), 0.01)
+    return (
+        max(latitude - lat_delta, -90.0), max(longitude - lon_delta, -180.0),
+        min(latitude + lat_delta, 90.0), min(longitude + lon_delta, 180.0),
+    )
+
+
+def covering_cells(min_lat, min_lon, max_lat, max_lon):
+    """Geohash prefixes covering the box, the finest precision that needs at most MAX_CELLS."""
+    for precision in range(PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        # cells are aligned to the south-west corner of the world
+        rows = math.floor((max_lat + 90) / lat_step) - math.floor((min_lat + 90) / lat_step) + 1
+        columns = math.floor((max_lon + 180) / lon_step) - math.floor((min_lon + 180) / lon_step) + 1
+        if rows * columns <= MAX_CELLS:
+            break
+
+    cells = set()
+    # one step never skips a cell, the last row and column are clamped to the box edge
+    latitude = min_lat
+    while True:
+        longitude = min_lon
+        while True:
+            cells.add(encode(latitude, longitude, precision))
+            if longitude >= max_lon:
+                break
+            longitude = min(longitude + lon_step, max_lon)
+        if latitude >= max_lat:
+            break
+        latitude = min(latitude + lat_step, max_lat)
+    return sorted(cells)
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from weasyprint import HTML
+
+from client import contracts
+
+
+class Command(BaseCommand):
+    help = 'Compare contract pdfs/second of the old inline render with the cached contract renderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=50, help='Number of contracts to render per run')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        contexts = [
+            {
+                'staff_name': f'Staff {i}',
+                'vacancy_name': 'Waiter',
+                'starting_date_time': '2025-01-01 at 18:00:00',
+                'price_per_hour': 200,
+                'location': 'Oslo',
+                'company_name': 'Letme',
+                'company_website': 'https://www.example.com',
+                'year': '2025',
+            }
+            for i in range(count)
+        ]
+
+        def legacy():
+            # what JobApplicationAPI.post used to do for every approval
+            for context in contexts:
+                HTML(string=render_to_string('contact.html', context)).write_pdf()
+
+        contracts.warm_up()
+        runs = [
+            ('inline render (old path)', legacy),
+            ('cached renderer', lambda: contracts.render_contracts(contexts)),
+            ('cached renderer, merged', lambda: contracts.render_contracts_merged(contexts)),
+        ]
+        for name, run in runs:
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{name:<28} {count / elapsed:8.2f} pdf/s ({elapsed:.2f}s for {count})')
@@ -0,0 +1,155 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from chat.models import ChatRoom
+from client.models import CompanyJobSummary, JobReport
+from dashboard.models import Notification
+from staff.models import Staff
+from users.models import User
+
+
+# name: (who asks, url, query params)
+ENDPOINTS = {
+    'staff-feed': ('staff', '/api/v1/app/dashboard/jobs/', {}),
+    'client-feed': ('company', '/api/v1/app/dashboard/jobs/', {}),
+    'pending-actions': ('company', '/api/v1/app/company/job/applications/', {}),
+    'chat-list': ('chat', '/api/v1/app/chat-list/', {}),
+    'notifications': ('notifications', '/api/v1/app/dashboard/notification/', {}),
+    'payroll-export': ('payroll', '/api/v1/app/company/reports/export/', {'file_format': 'csv'}),
+}
+COMPARED = ('p50_ms', 'p95_ms', 'peak_kib')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Time the hot endpoints against the current database, reports p50/p95 latency, queries and memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS), help='Only these, repeatable')
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--output', help='Write the results as json, for the next --compare')
+        parser.add_argument('--compare', help='json written by an earlier --output run')
+
+    def handle(self, *args, **options):
+        users = self.heaviest_users()
+        previous = {}
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)['endpoints']
+
+        results = {}
+        for name in options['endpoint'] or ENDPOINTS:
+            actor, url, params = ENDPOINTS[name]
+            if users[actor] is None:
+                self.stdout.write(self.style.WARNING(f'{name}: no data for a {actor} user, skipped'))
+                continue
+            api = APIClient()
+            api.force_authenticate(users[actor])
+            results[name] = self.measure(api, url, params, options)
+            self.report(name, results[name], previous.get(name))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'database': connection.vendor,
+                    'iterations': options['iterations'],
+                    'cold': options['cold'],
+                    'endpoints': results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def heaviest_users(self):
+        """the user with the most rows behind every endpoint, the slow path is the one worth timing"""
+        def user(user_id):
+            return User.objects.filter(id=user_id).first() if user_id else None
+
+        staff = Staff.objects.annotate(total=Count('job_applications')).order_by('-total').values_list('user_id', flat=True).first()
+        company = CompanyJobSummary.objects.order_by('-total_applicants').values_list('company__user_id', flat=True).first()
+        chat = (
+            ChatRoom.participants.through.objects.values('user_id').annotate(total=Count('id'))
+            .order_by('-total').values_list('user_id', flat=True).first()
+        )
+        notifications = (
+            Notification.objects.values('user_id').annotate(total=Count('id'))
+            .order_by('-total').values_list('user_id', flat=True).first()
+        )
+        payroll = (
+            JobReport.objects.filter(job_application__isnull=False)
+            .values('job_application__vacancy__job__company__user_id').annotate(total=Count('id'))
+            .order_by('-total').values_list('job_application__vacancy__job__company__user_id', flat=True).first()
+        )
+        return {
+            'staff': user(staff),
+            'company': user(company),
+            'chat': user(chat),
+            'notifications': user(notifications),
+            'payroll': user(payroll),
+        }
+
+    def request(self, api, url, params, cold):
+        if cold:
+            cache.clear()
+        response = api.get(url, params)
+        if response.status_code >= 400:
+            raise CommandError(f'{url} answered {response.status_code}')
+        # streamed exports only do their work while being read
+        if response.streaming:
+            return sum(len(chunk) for chunk in response.streaming_content)
+        return len(response.content)
+
+    def measure(self, api, url, params, options):
+        for _ in range(options['warmup']):
+            self.request(api, url, params, options['cold'])
+
+        latencies = []
+        for _ in range(options['iterations']):
+            started = time.perf_counter()
+            size = self.request(api, url, params, options['cold'])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        # tracemalloc slows every allocation down, memory and queries get their own request
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                self.request(api, url, params, options['cold'])
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'max_ms': round(max(latencies), 2),
+            'queries': len(queries),
+            'peak_kib': round(peak / 1024, 1),
+            'bytes': size,
+        }
+
+    def report(self, name, result, previous):
+        line = (
+            f'{name:<16} p50 {result["p50_ms"]:8.2f}ms  p95 {result["p95_ms"]:8.2f}ms  '
+            f'queries {result["queries"]:3d}  peak {result["peak_kib"]:9.1f}KiB  {result["bytes"]}B'
+        )
+        if previous:
+            changes = []
+            for key in COMPARED:
+                if previous.get(key):
+                    change = (result[key] - previous[key]) / previous[key] * 100
+                    changes.append(f'{key.split("_")[0]} {change:+.1f}%')
+            line += f'  ({", ".join(changes)})'
+        self.stdout.write(line)
@@ -0,0 +1,56 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from client import payroll
+from client.models import JobApplication, JobReport, Vacancy
+from users.models import JobRole
+
+
+class Command(BaseCommand):
+    help = 'Compare per-row JobReport.generate_report with the batch payroll engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help='Number of synthetic applications')
+        parser.add_argument('--db', action='store_true', help='Also time generate_reports against the current database')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        rng = random.Random(42)
+        worked = [timedelta(minutes=rng.randint(60, 14 * 60)) for _ in range(count)]
+        prices = [rng.choice([150, 180, 200, 250]) for _ in range(count)]
+
+        roles = {price: JobRole(name=f'Role {price}', staff_price=price) for price in set(prices)}
+        reports = [
+            JobReport(job_application=JobApplication(total_working_hours=duration, vacancy=Vacancy(job_title=roles[price])))
+            for duration, price in zip(worked, prices)
+        ]
+
+        def per_row():
+            # what JobReport.save() does for every report
+            for report in reports:
+                report.generate_report()
+
+        def batch():
+            pay = payroll.compute_pay([int(duration.total_seconds()) for duration in worked], prices)
+            return [payroll._money(cents) for cents in pay['total_pay']]
+
+        started = time.perf_counter()
+        per_row()
+        legacy_elapsed = time.perf_counter() - started
+        started = time.perf_counter()
+        totals = batch()
+        batch_elapsed = time.perf_counter() - started
+
+        mismatches = sum(report.total_pay != total for report, total in zip(reports, totals))
+        self.stdout.write(f'{"per-row generate_report":<26} {legacy_elapsed:8.3f}s for {count}')
+        self.stdout.write(f'{"batch compute_pay":<26} {batch_elapsed:8.3f}s for {count}')
+        self.stdout.write(f'totals differing from generate_report: {mismatches}')
+
+        if options['db']:
+            started = time.perf_counter()
+            created, updated = payroll.generate_reports()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'generate_reports on database: {created} created, {updated} updated in {elapsed:.3f}s')
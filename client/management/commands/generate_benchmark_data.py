@@ -0,0 +1,248 @@
+import random
+import time
+from datetime import date, datetime, time as clock, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.models import ChatMessage, ChatRoom
+from client import geohash, payroll, search
+from client.models import CompanyProfile, Job, JobApplication, Vacancy, VacancyStats
+from client.tasks import refresh_company_job_summaries
+from dashboard.models import Notification
+from staff.models import Staff
+from users.models import JobRole, Skill, User
+
+
+EMAIL_DOMAIN = 'benchmark.letme.no'
+ROLES = (('Waiter', 180, 260), ('Bartender', 200, 290), ('Chef', 250, 350), ('Cleaner', 150, 220), ('Host', 170, 240))
+SKILLS = (
+    'Bartending', 'Barista', 'Fine dining', 'Banquet', 'Cashier', 'Grill', 'Pastry', 'Wine service',
+    'Room service', 'Dishwashing', 'Catering', 'Cocktails', 'Food safety', 'Reception', 'Event setup',
+)
+LOCATIONS = ('Grunerlokka', 'Majorstuen', 'Aker Brygge', 'Frogner', 'Sentrum', 'Bjorvika', 'Tøyen', 'Sagene')
+VACANCY_STATUS = (('active', 60), ('progress', 10), ('draft', 10), ('cancelled', 5), ('finished', 15))
+APPLICATION_STATUS = (('pending', 50), ('accepted', 25), ('rejected', 15), ('expired', 10))
+# around Oslo, enough spread for the nearby feed to hit several geohash cells
+LATITUDE, LONGITUDE, SPREAD = 59.91, 10.75, 0.15
+
+
+class Command(BaseCommand):
+    help = 'Fill the benchmark database with a scaled synthetic dataset using bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=1000)
+        parser.add_argument('--staff', type=int, default=10000)
+        parser.add_argument('--vacancies', type=int, default=100000)
+        parser.add_argument('--applications', type=int, default=1000000)
+        parser.add_argument('--chat-rooms', type=int, default=20000)
+        parser.add_argument('--messages', type=int, default=200000)
+        parser.add_argument('--notifications', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42, help='Same seed, same dataset')
+        parser.add_argument('--flush', action='store_true', help='Empty the benchmark database first')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BENCHMARK', False):
+            raise CommandError('Run with DJANGO_SETTINGS_MODULE=project.benchmark_settings, this writes millions of rows')
+        if options['flush']:
+            call_command('flush', interactive=False, verbosity=0)
+        elif User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').exists():
+            raise CommandError('Benchmark data already exists, pass --flush to regenerate it')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = date.today()
+        started = time.perf_counter()
+
+        roles, skills = self.step('roles and skills', self.create_catalog)
+        companies = self.step('companies', self.create_companies, options['companies'])
+        staff = self.step('staff', self.create_staff, options['staff'], roles)
+        jobs = self.step('jobs', self.create_jobs, max(1, options['vacancies'] // 4), companies)
+        vacancies = self.step('vacancies', self.create_vacancies, options['vacancies'], jobs, roles, skills)
+        self.step('applications', self.create_applications, options['applications'], vacancies, staff)
+        users = [company.user_id for company in companies] + [profile.user_id for profile in staff]
+        self.step('chat', self.create_chat, options['chat_rooms'], options['messages'], companies, staff)
+        self.step('notifications', self.create_notifications, options['notifications'], users)
+
+        # bulk_create skips save() and the signals, rebuild what they maintain
+        vacancy_ids = [vacancy['id'] for vacancy in vacancies]
+        self.step('vacancy stats', self.in_batches, vacancy_ids, VacancyStats.recount)
+        self.step('company summaries', refresh_company_job_summaries)
+        self.step('search text', search.refresh, vacancy_ids)
+        self.step('job reports', payroll.generate_reports)
+
+        self.stdout.write(self.style.SUCCESS(f'Benchmark data ready in {time.perf_counter() - started:.1f}s'))
+
+    def step(self, name, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        self.stdout.write(f'{name:<20} {time.perf_counter() - started:8.2f}s')
+        return result
+
+    def in_batches(self, ids, function):
+        for start in range(0, len(ids), self.batch_size):
+            function(ids[start:start + self.batch_size])
+
+    def insert(self, model, objects, keep=False, **kwargs):
+        """bulk_create a generator batch by batch, the saved objects are only kept when asked"""
+        created = []
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                saved = model.objects.bulk_create(batch, **kwargs)
+                if keep:
+                    created.extend(saved)
+                batch = []
+        if batch:
+            saved = model.objects.bulk_create(batch, **kwargs)
+            if keep:
+                created.extend(saved)
+        return created
+
+    def pick(self, items):
+        # skewed towards the front, a few busy companies and staff like production
+        return items[int(len(items) * self.rng.random() ** 2)]
+
+    def weighted(self, choices):
+        values, weights = zip(*choices)
+        return self.rng.choices(values, weights)[0]
+
+    def create_catalog(self):
+        roles = JobRole.objects.bulk_create(
+            [JobRole(name=name, staff_price=staff_price, client_price=client_price) for name, staff_price, client_price in ROLES]
+        )
+        skills = Skill.objects.bulk_create([Skill(name=name) for name in SKILLS])
+        return roles, skills
+
+    def create_users(self, kind, count, **fields):
+        # one hash for everybody, hashing a million passwords would dominate the run
+        password = make_password('benchmark')
+        return self.insert(User, keep=True, objects=(
+            User(
+                email=f'{kind}-{i}@{EMAIL_DOMAIN}', phone_number=f'4790{i:06d}', first_name=kind.title(),
+                last_name=str(i), password=password, **fields
+            )
+            for i in range(count)
+        ))
+
+    def create_companies(self, count):
+        users = self.create_users('company', count, is_client=True)
+        return self.insert(CompanyProfile, keep=True, objects=(
+            CompanyProfile(
+                user_id=user.id, company_name=f'Company {i}', contact_number=f'4790{i:06d}',
+                company_email=f'company-{i}@{EMAIL_DOMAIN}', billing_email=f'billing-{i}@{EMAIL_DOMAIN}',
+                company_address=self.rng.choice(LOCATIONS),
+            )
+            for i, user in enumerate(users)
+        ))
+
+    def create_staff(self, count, roles):
+        users = self.create_users('staff', count, is_staff=True)
+        return self.insert(Staff, keep=True, objects=(
+            Staff(
+                user_id=user.id, role_id=self.rng.choice(roles).id, dob=date(1980 + i % 25, 1 + i % 12, 1 + i % 28),
+                age=20 + i % 25, gender=self.rng.choice(('M', 'F')), country='Norway',
+            )
+            for i, user in enumerate(users)
+        ))
+
+    def create_jobs(self, count, companies):
+        return self.insert(Job, keep=True, objects=(
+            Job(company_id=self.pick(companies).id, title=f'{self.rng.choice(LOCATIONS)} shift {i}')
+            for i in range(count)
+        ))
+
+    def create_vacancies(self, count, jobs, roles, skills):
+        rows = []
+
+        def vacancies():
+            for _ in range(count):
+                role = self.rng.choice(roles)
+                start_hour = self.rng.randint(7, 15)
+                hours = self.rng.randint(4, 8)
+                number_of_staff = self.rng.randint(1, 5)
+                latitude = round(LATITUDE + self.rng.uniform(-SPREAD, SPREAD), 6)
+                longitude = round(LONGITUDE + self.rng.uniform(-SPREAD, SPREAD), 6)
+                open_date = self.today + timedelta(days=self.rng.randint(-60, 60))
+                vacancy = Vacancy(
+                    job_id=self.pick(jobs).id, job_title_id=role.id, number_of_staff=number_of_staff,
+                    open_date=open_date, close_date=open_date + timedelta(days=self.rng.randint(0, 3)),
+                    start_time=clock(start_hour), end_time=clock(start_hour + hours),
+                    location=self.rng.choice(LOCATIONS), latitude=latitude, longitude=longitude,
+                    geohash=geohash.encode(latitude, longitude), job_status=self.weighted(VACANCY_STATUS),
+                    # what calculate_salary() would store
+                    salary=role.staff_price * hours * number_of_staff,
+                )
+                rows.append({'id': None, 'open_date': open_date, 'start_hour': start_hour, 'hours': hours})
+                yield vacancy
+
+        created = self.insert(Vacancy, vacancies(), keep=True)
+        for row, vacancy in zip(rows, created):
+            row['id'] = vacancy.id
+        self.insert(Vacancy.skills.through, (
+            Vacancy.skills.through(vacancy_id=vacancy.id, skill_id=skill.id)
+            for vacancy in created
+            for skill in self.rng.sample(skills, 2)
+        ))
+        return rows
+
+    def create_applications(self, count, vacancies, staff):
+        participants = set()
+
+        def applications():
+            for _ in range(count):
+                vacancy = self.rng.choice(vacancies)
+                applicant = self.pick(staff)
+                job_status = self.weighted(APPLICATION_STATUS)
+                application = JobApplication(
+                    vacancy_id=vacancy['id'], applicant_id=applicant.id, job_status=job_status,
+                    is_approve=job_status == 'accepted',
+                )
+                if job_status == 'accepted':
+                    participants.add((vacancy['id'], applicant.id))
+                    if vacancy['open_date'] < self.today:
+                        # worked shift, what check-in and check-out approval leave behind
+                        in_time = datetime.combine(vacancy['open_date'], clock(vacancy['start_hour']), tzinfo=dt_timezone.utc)
+                        out_time = in_time + timedelta(hours=vacancy['hours'], minutes=self.rng.randint(-30, 90))
+                        application.in_time, application.out_time = in_time, out_time
+                        application.checkin_approve = application.checkout_approve = True
+                        application.total_working_hours = out_time - in_time
+                yield application
+
+        self.insert(JobApplication, applications())
+        self.insert(Vacancy.participants.through, (
+            Vacancy.participants.through(vacancy_id=vacancy_id, staff_id=staff_id) for vacancy_id, staff_id in participants
+        ), ignore_conflicts=True)
+
+    def create_chat(self, room_count, message_count, companies, staff):
+        pairs = set()
+        # bounded, small datasets may not have room_count distinct pairs
+        for _ in range(room_count * 2):
+            if len(pairs) == room_count:
+                break
+            pairs.add(tuple(sorted((self.pick(companies).user_id, self.pick(staff).user_id))))
+        rooms = self.insert(ChatRoom, (ChatRoom(user_low_id=low, user_high_id=high) for low, high in sorted(pairs)), keep=True)
+        if not rooms:
+            return
+        self.insert(ChatRoom.participants.through, (
+            ChatRoom.participants.through(chatroom_id=room.id, user_id=user_id)
+            for room in rooms
+            for user_id in (room.user_low_id, room.user_high_id)
+        ))
+        self.insert(ChatMessage, (
+            ChatMessage(
+                room_id=room.id, sender_id=self.rng.choice((room.user_low_id, room.user_high_id)),
+                content=f'message {i}', is_read=self.rng.random() < 0.8,
+            )
+            for i, room in ((i, self.pick(rooms)) for i in range(message_count))
+        ))
+
+    def create_notifications(self, count, users):
+        self.insert(Notification, (
+            Notification(user_id=self.pick(users), message=f'notification {i}', is_read=self.rng.random() < 0.7)
+            for i in range(count)
+        ))
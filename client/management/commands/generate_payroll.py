@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from client import payroll
+
+
+class Command(BaseCommand):
+    help = 'Create or refresh job reports of every checkout-approved application, optionally for a period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First vacancy open date, YYYY-MM-DD')
+        parser.add_argument('--end', help='Last vacancy open date, YYYY-MM-DD')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        created, updated = payroll.generate_reports(options['start'], options['end'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Created {created} and updated {updated} job reports.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from client import search
+from client.models import Vacancy
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search text and vector of every vacancy, e.g. after queryset updates that skip the signals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        vacancy_ids = list(Vacancy.objects.order_by('id').values_list('id', flat=True))
+        search.refresh(vacancy_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {len(vacancy_ids)} vacancies.'))
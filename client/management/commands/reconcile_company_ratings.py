@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from client.models import CompanyProfile, CompanyRating
+
+
+class Command(BaseCommand):
+    help = 'Recount the rating row of every company profile from its reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Only report the companies that drifted')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        company_ids = list(CompanyProfile.objects.order_by('id').values_list('id', flat=True))
+        checked = fixed = 0
+
+        for start in range(0, len(company_ids), batch_size):
+            batch = company_ids[start:start + batch_size]
+            counts = CompanyRating.counts_for(batch)
+            current = {
+                company_id: (count, total)
+                for company_id, count, total in CompanyRating.objects.filter(company_id__in=batch, review_count__gt=0)
+                .values_list('company_id', 'review_count', 'rating_total')
+            }
+            drifted = [company_id for company_id in batch if current.get(company_id) != counts.get(company_id)]
+            for company_id in drifted:
+                self.stdout.write(f'company {company_id}: {current.get(company_id, (0, 0))} -> {counts.get(company_id, (0, 0))}')
+            if drifted and not options['dry_run']:
+                CompanyRating.recount(drifted)
+            checked += len(batch)
+            fixed += len(drifted)
+
+        action = 'drifted' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} companies, {fixed} {action}.'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from client.models import Vacancy, VacancyStats, TRACKED_STATUS
+
+
+FIELDS = TRACKED_STATUS + ('participants',)
+
+
+class Command(BaseCommand):
+    help = 'Recount the application status and participant counters of every vacancy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Only report the vacancies that drifted')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        vacancy_ids = list(Vacancy.objects.order_by('id').values_list('id', flat=True))
+        checked = fixed = 0
+
+        for start in range(0, len(vacancy_ids), batch_size):
+            batch = vacancy_ids[start:start + batch_size]
+            counts = VacancyStats.counts_for(batch)
+            current = {
+                row[0]: dict(zip(FIELDS, row[1:]))
+                for row in VacancyStats.objects.filter(vacancy_id__in=batch).values_list('vacancy_id', *FIELDS)
+            }
+            drifted = [vacancy_id for vacancy_id in batch if current.get(vacancy_id) != counts[vacancy_id]]
+            for vacancy_id in drifted:
+                self.stdout.write(f'vacancy {vacancy_id}: {current.get(vacancy_id)} -> {counts[vacancy_id]}')
+            if drifted and not options['dry_run']:
+                VacancyStats.recount(drifted)
+            checked += len(batch)
+            fixed += len(drifted)
+
+        action = 'drifted' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} vacancies, {fixed} {action}.'))
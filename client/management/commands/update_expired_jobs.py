@@ -1,6 +1,6 @@
 import datetime
 from django.core.management.base import BaseCommand
-from client.models import JobApplication, Vacancy  
+from client.models import JobApplication, Vacancy, VacancyStats
 
 class Command(BaseCommand):
     help = 'Update job applications to expired if their vacancy close date has passed'
@@ -15,5 +15,7 @@ class Command(BaseCommand):
         updated_count = JobApplication.objects.filter(
             vacancy__in=expired_vacancies
         ).exclude(job_status='accepted').update(job_status='expired')
+        # update() skips the signals that keep the counters
+        VacancyStats.recount(expired_vacancies.values_list('id', flat=True))
 
         self.stdout.write(f'Successfully updated {updated_count} expired job applications.')
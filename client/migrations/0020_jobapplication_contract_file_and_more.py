@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0019_checkin_checkin_status_checkout_checkout_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobapplication',
+            name='contract_file',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobapplication',
+            name='contract_status',
+            field=models.CharField(blank=True, choices=[('pending', 'PENDING'), ('processing', 'PROCESSING'), ('sent', 'SENT'), ('failed', 'FAILED')], max_length=10, null=True),
+        ),
+    ]
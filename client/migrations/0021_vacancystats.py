@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_vacancy_stats(apps, schema_editor):
+    Vacancy = apps.get_model('client', 'Vacancy')
+    VacancyStats = apps.get_model('client', 'VacancyStats')
+    JobApplication = apps.get_model('client', 'JobApplication')
+    statuses = ('pending', 'accepted', 'rejected', 'expired')
+
+    stats = {vacancy_id: VacancyStats(vacancy_id=vacancy_id) for vacancy_id in Vacancy.objects.values_list('id', flat=True)}
+    rows = (
+        JobApplication.objects.filter(job_status__in=statuses)
+        .values_list('vacancy_id', 'job_status')
+        .annotate(total=models.Count('id'))
+        .order_by()
+    )
+    for vacancy_id, job_status, total in rows:
+        setattr(stats[vacancy_id], job_status, total)
+    rows = Vacancy.participants.through.objects.values_list('vacancy_id').annotate(total=models.Count('id')).order_by()
+    for vacancy_id, total in rows:
+        stats[vacancy_id].participants = total
+    VacancyStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0020_jobapplication_contract_file_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VacancyStats',
+            fields=[
+                ('vacancy', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='client.vacancy')),
+                ('pending', models.PositiveIntegerField(default=0)),
+                ('accepted', models.PositiveIntegerField(default=0)),
+                ('rejected', models.PositiveIntegerField(default=0)),
+                ('expired', models.PositiveIntegerField(default=0)),
+                ('participants', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Vacancy Stats',
+                'verbose_name_plural': 'Vacancy Stats',
+            },
+        ),
+        migrations.RunPython(fill_vacancy_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_company_summaries(apps, schema_editor):
+    CompanyProfile = apps.get_model('client', 'CompanyProfile')
+    CompanyJobSummary = apps.get_model('client', 'CompanyJobSummary')
+    Vacancy = apps.get_model('client', 'Vacancy')
+    JobApplication = apps.get_model('client', 'JobApplication')
+    Job = apps.get_model('client', 'Job')
+    statuses = ('active', 'progress', 'draft', 'cancelled', 'finished')
+
+    summaries = {company_id: CompanyJobSummary(company_id=company_id) for company_id in CompanyProfile.objects.values_list('id', flat=True)}
+    rows = (
+        Vacancy.objects.filter(job_status__in=statuses)
+        .values_list('job__company_id', 'job_status')
+        .annotate(total=models.Count('id'))
+        .order_by()
+    )
+    for company_id, job_status, total in rows:
+        setattr(summaries[company_id], job_status, total)
+    rows = JobApplication.objects.values_list('vacancy__job__company_id').annotate(total=models.Count('id')).order_by()
+    for company_id, total in rows:
+        summaries[company_id].total_applicants = total
+    rows = Job.objects.values_list('company_id').annotate(total=models.Count('id')).order_by()
+    for company_id, total in rows:
+        summaries[company_id].total_jobs = total
+    CompanyJobSummary.objects.bulk_create(summaries.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0021_vacancystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyJobSummary',
+            fields=[
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='job_summary', serialize=False, to='client.companyprofile')),
+                ('active', models.PositiveIntegerField(default=0)),
+                ('progress', models.PositiveIntegerField(default=0)),
+                ('draft', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('finished', models.PositiveIntegerField(default=0)),
+                ('total_applicants', models.PositiveIntegerField(default=0)),
+                ('total_jobs', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Company Job Summary',
+                'verbose_name_plural': 'Company Job Summaries',
+            },
+        ),
+        migrations.RunPython(fill_company_summaries, migrations.RunPython.noop),
+    ]
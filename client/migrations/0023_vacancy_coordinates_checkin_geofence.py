@@ -0,0 +1,81 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+def clear_unscored_distance(apps, schema_editor):
+    # 0 was the old default, None now means not scored yet
+    for model in ('Checkin', 'Checkout'):
+        apps.get_model('client', model).objects.filter(distance=0).update(distance=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0022_companyjobsummary'),
+        ('staff', '0006_alter_staff_avatar'),
+        ('users', '0004_alter_uniform_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkin',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkin',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkin',
+            name='within_geofence',
+            field=models.BooleanField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkout',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkout',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkout',
+            name='within_geofence',
+            field=models.BooleanField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='vacancy',
+            name='geofence_radius',
+            field=models.PositiveIntegerField(default=200, help_text='meters'),
+        ),
+        migrations.AddField(
+            model_name='vacancy',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='vacancy',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AlterField(
+            model_name='checkin',
+            name='distance',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='checkout',
+            name='distance',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='vacancy',
+            index=models.Index(fields=['latitude', 'longitude'], name='client_vaca_latitud_0e5d3d_idx'),
+        ),
+        migrations.RunPython(clear_unscored_distance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+from client import geohash
+
+
+def fill_geohash(apps, schema_editor):
+    Vacancy = apps.get_model('client', 'Vacancy')
+    vacancies = Vacancy.objects.filter(latitude__isnull=False, longitude__isnull=False).only('latitude', 'longitude')
+    batch = []
+    for vacancy in vacancies.iterator(chunk_size=2000):
+        vacancy.geohash = geohash.encode(vacancy.latitude, vacancy.longitude)
+        batch.append(vacancy)
+    Vacancy.objects.bulk_update(batch, ['geohash'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0023_vacancy_coordinates_checkin_geofence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vacancy',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
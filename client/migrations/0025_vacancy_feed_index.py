@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0024_vacancy_geohash'),
+        ('staff', '0006_alter_staff_avatar'),
+        ('users', '0004_alter_uniform_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vacancy',
+            index=models.Index(fields=['job_status', '-created_at', '-id'], name='client_vaca_job_sta_f5530b_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:20
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from client import search
+
+
+SEARCH_INDEXES = [
+    ('client_vacancy_search_vector_gin', 'USING gin (search_vector)'),
+    ('client_vacancy_search_text_trgm', 'USING gin (search_text gin_trgm_ops)'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN has no sqlite equivalent, the fallback search reads search_text directly
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, method in SEARCH_INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON client_vacancy {method}')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def fill_search(apps, schema_editor):
+    Vacancy = apps.get_model('client', 'Vacancy')
+    search.refresh(Vacancy.objects.order_by('id').values_list('id', flat=True), model=Vacancy)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0025_vacancy_feed_index'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='vacancy',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='vacancy',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+def fill_company_ratings(apps, schema_editor):
+    CompanyProfile = apps.get_model('client', 'CompanyProfile')
+    CompanyReview = apps.get_model('client', 'CompanyReview')
+
+    rows = (
+        CompanyReview.objects.filter(review_for__isnull=False)
+        .values_list('review_for_id')
+        .annotate(count=models.Count('id'), total=models.Sum('rating'))
+        .order_by()
+    )
+    companies = [CompanyProfile(id=company_id, rating_count=count, rating_total=total) for company_id, count, total in rows]
+    CompanyProfile.objects.bulk_update(companies, ['rating_count', 'rating_total'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0026_vacancy_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companyprofile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='companyprofile',
+            name='rating_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_company_ratings, migrations.RunPython.noop),
+    ]
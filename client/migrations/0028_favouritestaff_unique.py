@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:49
+
+from django.db import migrations, models
+
+
+def remove_duplicate_favourites(apps, schema_editor):
+    FavouriteStaff = apps.get_model('client', 'FavouriteStaff')
+    # keep the first favourite of every (company, staff) pair
+    keep = (
+        FavouriteStaff.objects.values('company_id', 'staff_id')
+        .annotate(first_id=models.Min('id'), total=models.Count('id'))
+        .filter(total__gt=1)
+        .values_list('company_id', 'staff_id', 'first_id')
+        .order_by()
+    )
+    for company_id, staff_id, first_id in keep:
+        FavouriteStaff.objects.filter(company_id=company_id, staff_id=staff_id).exclude(id=first_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0027_companyprofile_rating'),
+        ('staff', '0007_staffrating'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favourites, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favouritestaff',
+            constraint=models.UniqueConstraint(fields=('company', 'staff'), name='unique_favourite_staff'),
+        ),
+    ]
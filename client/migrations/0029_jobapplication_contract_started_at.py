@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0028_favouritestaff_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobapplication',
+            name='contract_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
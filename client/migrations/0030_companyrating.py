@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_company_ratings(apps, schema_editor):
+    CompanyRating = apps.get_model('client', 'CompanyRating')
+    CompanyReview = apps.get_model('client', 'CompanyReview')
+
+    rows = (
+        CompanyReview.objects.filter(review_for__isnull=False)
+        .values_list('review_for_id')
+        .annotate(count=models.Count('id'), total=models.Sum('rating'))
+        .order_by()
+    )
+    ratings = [CompanyRating(company_id=company_id, review_count=count, rating_total=total) for company_id, count, total in rows]
+    CompanyRating.objects.bulk_create(ratings, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0029_jobapplication_contract_started_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyRating',
+            fields=[
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating', serialize=False, to='client.companyprofile')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Company Rating',
+                'verbose_name_plural': 'Company Ratings',
+            },
+        ),
+        migrations.RunPython(fill_company_ratings, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='companyprofile',
+            name='rating_count',
+        ),
+        migrations.RemoveField(
+            model_name='companyprofile',
+            name='rating_total',
+        ),
+    ]
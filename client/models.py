@@ -1,13 +1,16 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from datetime import datetime
+from datetime import datetime, timedelta
+from decimal import Decimal
 from django.utils import timezone
 from django.core.validators import ValidationError
 
 from users.models import Skill, Uniform, JobRole
 from staff.models import Staff
 from project.s3bucket  import CustomS3Storage
+from . import geohash
 
 User = get_user_model()
 
@@ -33,6 +36,14 @@ class CompanyProfile(models.Model):
         verbose_name_plural = 'Company Profiles'
         ordering = ['-created_at']
 
+    @property
+    def avg_rating(self):
+        # select_related('rating') when listing profiles
+        try:
+            return self.rating.avg_rating
+        except CompanyRating.DoesNotExist:
+            return None
+
 class Job(models.Model):
     company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE, related_name='jobs')
     title = models.CharField(max_length=200)
@@ -58,6 +69,9 @@ class Job(models.Model):
         ]
 
 
+# meters around the venue a check-in passes the geofence
+GEOFENCE_RADIUS = 200
+
 JOB_STATUS = (
     ('active', 'Active'),
     ('progress', 'InProgress'),
@@ -78,6 +92,15 @@ class Vacancy(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
     location = models.CharField(max_length=255, blank=True, null=True)
+    # venue coordinates, check-ins are scored against them
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    geofence_radius = models.PositiveIntegerField(default=GEOFENCE_RADIUS, help_text='meters')
+    # spatial bucket of the coordinates, set in save
+    geohash = models.CharField(max_length=12, blank=True, null=True, db_index=True, editable=False)
+    # job title, role, skills and location, kept by client.signals, GIN indexed on postgres (migration 0026)
+    search_text = models.TextField(blank=True, default='', editable=False)
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
     job_status = models.CharField(max_length=255, choices=JOB_STATUS, default='active')
     
     salary = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -97,6 +120,9 @@ class Vacancy(models.Model):
     
         indexes = [
             models.Index(fields=['open_date', 'close_date', 'start_time', 'end_time']),
+            models.Index(fields=['latitude', 'longitude']),
+            # staff feed keyset
+            models.Index(fields=['job_status', '-created_at', '-id']),
         ]
 
     def calculate_salary(self):
@@ -105,11 +131,23 @@ class Vacancy(models.Model):
         self.salary = (self.job_title.staff_price * hours * self.number_of_staff) 
         return self.salary
     
-    # set salary in save method
+    # set salary and geohash in save method
     def save(self, *args, **kwargs):
         self.calculate_salary()
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geohash.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = None
         super().save(*args, **kwargs)
 
+    def application_status(self):
+        try:
+            stats = self.stats
+        except VacancyStats.DoesNotExist:
+            # vacancy saved before the counters existed
+            stats = VacancyStats.recount([self.id])[0]
+        return stats.application_status()
+
 
 
     
@@ -145,6 +183,15 @@ JOB_STATUS = (
     ('late', 'LATE'),
     ('completed', 'COMPLETED')
 )
+# contract pdf status, set once the application is approved
+CONTRACT_STATUS = (
+    ('pending', 'PENDING'),
+    ('processing', 'PROCESSING'),
+    ('sent', 'SENT'),
+    ('failed', 'FAILED'),
+)
+# a render still 'processing' after this lost its worker
+CONTRACT_TIMEOUT = timedelta(minutes=15)
 class JobApplication(models.Model):
     vacancy = models.ForeignKey(Vacancy, on_delete=models.CASCADE)
     applicant = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='job_applications')
@@ -159,10 +206,22 @@ class JobApplication(models.Model):
     checkout_approve = models.BooleanField(default=False)
     
     total_working_hours = models.DurationField(null=True, blank=True)
+
+    contract_status = models.CharField(max_length=10, choices=CONTRACT_STATUS, blank=True, null=True)
+    contract_file = models.CharField(max_length=255, blank=True, null=True)
+    contract_started_at = models.DateTimeField(blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def contract_state(self):
+        # a stale 'processing' is reported as failed, the next claim picks it up again
+        if self.contract_status == 'processing' and (
+            self.contract_started_at is None or self.contract_started_at < timezone.now() - CONTRACT_TIMEOUT
+        ):
+            return 'failed'
+        return self.contract_status
+
     # calculate total working hours
     def calculate_total_working_hours(self):
         if self.checkin_approve and self.checkout_approve:
@@ -177,6 +236,178 @@ class JobApplication(models.Model):
         return f'{self.applicant.user.email} - {self.vacancy.job_title}'
 
 
+# application status counters, kept up to date by client.signals
+TRACKED_STATUS = ('pending', 'accepted', 'rejected', 'expired')
+
+class VacancyStats(models.Model):
+    """DENORMALIZED APPLICATION COUNTS OF A VACANCY"""
+    vacancy = models.OneToOneField(Vacancy, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    pending = models.PositiveIntegerField(default=0)
+    accepted = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    expired = models.PositiveIntegerField(default=0)
+    participants = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Vacancy Stats'
+        verbose_name_plural = 'Vacancy Stats'
+
+    def __str__(self):
+        return f'{self.vacancy}'
+
+    def application_status(self):
+        return {job_status: getattr(self, job_status) for job_status in TRACKED_STATUS}
+
+    @classmethod
+    def counts_for(cls, vacancy_ids):
+        """Count applications and participants of the vacancies from scratch, two queries in total."""
+        counts = {vacancy_id: dict.fromkeys(TRACKED_STATUS + ('participants',), 0) for vacancy_id in vacancy_ids}
+        rows = (
+            JobApplication.objects.filter(vacancy_id__in=vacancy_ids, job_status__in=TRACKED_STATUS)
+            .values_list('vacancy_id', 'job_status')
+            .annotate(total=models.Count('id'))
+            .order_by()
+        )
+        for vacancy_id, job_status, total in rows:
+            counts[vacancy_id][job_status] = total
+        rows = (
+            Vacancy.participants.through.objects.filter(vacancy_id__in=vacancy_ids)
+            .values_list('vacancy_id')
+            .annotate(total=models.Count('id'))
+            .order_by()
+        )
+        for vacancy_id, total in rows:
+            counts[vacancy_id]['participants'] = total
+        return counts
+
+    @classmethod
+    def recount(cls, vacancy_ids):
+        """Rewrite the counters of the given vacancies, used after bulk writes that skip signals."""
+        vacancy_ids = list(vacancy_ids)
+        stats = [cls(vacancy_id=vacancy_id, **counts) for vacancy_id, counts in cls.counts_for(vacancy_ids).items()]
+        cls.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=['vacancy'],
+            update_fields=list(TRACKED_STATUS) + ['participants', 'updated_at'],
+        )
+        return stats
+
+
+# vacancy status counters of a company, kept up to date by client.signals
+VACANCY_STATUS = ('active', 'progress', 'draft', 'cancelled', 'finished')
+
+class CompanyRating(models.Model):
+    """REVIEW COUNT AND RATING TOTAL OF A COMPANY, KEPT UP TO DATE BY client.signals"""
+    company = models.OneToOneField(CompanyProfile, on_delete=models.CASCADE, primary_key=True, related_name='rating')
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Company Rating'
+        verbose_name_plural = 'Company Ratings'
+
+    def __str__(self):
+        return f'{self.company}'
+
+    @property
+    def avg_rating(self):
+        return self.rating_total / self.review_count if self.review_count else None
+
+    @classmethod
+    def counts_for(cls, company_ids):
+        """{company id: (review count, rating total)} from the reviews, one query."""
+        return {
+            company_id: (count, total)
+            for company_id, count, total in CompanyReview.objects.filter(review_for_id__in=company_ids)
+            .values_list('review_for_id')
+            .annotate(count=models.Count('id'), total=models.Sum('rating'))
+            .order_by()
+        }
+
+    @classmethod
+    def recount(cls, company_ids):
+        """Rewrite the rating rows of the given companies, used after writes that skip signals."""
+        company_ids = list(set(company_ids))
+        ratings = [
+            cls(company_id=company_id, review_count=count, rating_total=total)
+            for company_id, (count, total) in cls.counts_for(company_ids).items()
+        ]
+        with transaction.atomic():
+            cls.objects.filter(company_id__in=company_ids).delete()
+            cls.objects.bulk_create(ratings)
+        return ratings
+
+
+class CompanyJobSummary(models.Model):
+    """PER COMPANY VACANCY STATUS, APPLICANT AND JOB TOTALS FOR THE DASHBOARD"""
+    company = models.OneToOneField(CompanyProfile, on_delete=models.CASCADE, primary_key=True, related_name='job_summary')
+    active = models.PositiveIntegerField(default=0)
+    progress = models.PositiveIntegerField(default=0)
+    draft = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    finished = models.PositiveIntegerField(default=0)
+    total_applicants = models.PositiveIntegerField(default=0)
+    total_jobs = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Company Job Summary'
+        verbose_name_plural = 'Company Job Summaries'
+
+    def __str__(self):
+        return f'{self.company}'
+
+    def job_status_count(self):
+        return {job_status: getattr(self, job_status) for job_status in VACANCY_STATUS}
+
+    @classmethod
+    def counts_for(cls, company_ids):
+        """Count vacancies, applicants and jobs of the companies from scratch, three queries in total."""
+        counts = {
+            company_id: dict.fromkeys(VACANCY_STATUS + ('total_applicants', 'total_jobs'), 0)
+            for company_id in company_ids
+        }
+        rows = (
+            Vacancy.objects.filter(job__company_id__in=company_ids, job_status__in=VACANCY_STATUS)
+            .values_list('job__company_id', 'job_status')
+            .annotate(total=models.Count('id'))
+            .order_by()
+        )
+        for company_id, job_status, total in rows:
+            counts[company_id][job_status] = total
+        rows = (
+            JobApplication.objects.filter(vacancy__job__company_id__in=company_ids)
+            .values_list('vacancy__job__company_id')
+            .annotate(total=models.Count('id'))
+            .order_by()
+        )
+        for company_id, total in rows:
+            counts[company_id]['total_applicants'] = total
+        rows = Job.objects.filter(company_id__in=company_ids).values_list('company_id').annotate(total=models.Count('id')).order_by()
+        for company_id, total in rows:
+            counts[company_id]['total_jobs'] = total
+        return counts
+
+    @classmethod
+    def recount(cls, company_ids):
+        """Rewrite the summaries of the given companies, used after bulk writes that skip signals."""
+        company_ids = list(set(company_ids))
+        summaries = [cls(company_id=company_id, **counts) for company_id, counts in cls.counts_for(company_ids).items()]
+        cls.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['company'],
+            update_fields=list(VACANCY_STATUS) + ['total_applicants', 'total_jobs', 'updated_at'],
+        )
+        return summaries
+
+
 class StaffInvitation(models.Model):
     """INVITE STAFF TO JOIN THE JOB"""
     staff = models.ForeignKey(Staff, on_delete=models.CASCADE)
@@ -199,17 +430,20 @@ class Checkin(models.Model):
     application = models.ForeignKey(JobApplication, on_delete=models.CASCADE)
     in_time = models.DateTimeField(blank=True, null=True)
     location =  models.CharField(max_length=255, blank=True, null=True)
-    distance = models.IntegerField(default=0, blank=True, null=True, editable=False)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    # meters from the venue and geofence result, None until scored
+    distance = models.IntegerField(blank=True, null=True, editable=False)
+    within_geofence = models.BooleanField(blank=True, null=True, editable=False)
     checkin_status = models.CharField(max_length=10, choices=CHECK_STATUS, default='pending')
     is_approved = models.BooleanField(default=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
 
-    # calculate distance from vacancy.location to location
+    # calculate distance from vacancy coordinates to the check-in coordinates
     def calculate_distance(self):
-        # calculate distance using google map api
-        # use geocoder library for this
-        pass
+        from .geo import score_record
+        return score_record(self)
 
     def __str__(self):
         return f'{self.application.applicant} - checked in at {self.in_time}'
@@ -218,11 +452,19 @@ class Checkout(models.Model):
     application = models.ForeignKey(JobApplication, on_delete=models.CASCADE)
     out_time = models.DateTimeField(blank=True, null=True)
     location =  models.CharField(max_length=255, blank=True, null=True)
-    distance = models.IntegerField(default=0, blank=True, null=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    distance = models.IntegerField(blank=True, null=True)
+    within_geofence = models.BooleanField(blank=True, null=True, editable=False)
     checkout_status = models.CharField(max_length=10, choices=CHECK_STATUS, default='pending')
     is_approved = models.BooleanField(default=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
+
+    # calculate distance from vacancy coordinates to the check-out coordinates
+    def calculate_distance(self):
+        from .geo import score_record
+        return score_record(self)
     
     def __str__(self):
         return f'{self.application.applicant} - checked out at {self.out_time}'
@@ -301,12 +543,18 @@ class FavouriteStaff(models.Model):
     class Meta:
         verbose_name_plural = 'Favourite Staff'
         ordering = ['-created_at']
-        # unique_together = (('company', 'staff'),)
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'staff'], name='unique_favourite_staff'),
+        ]
     
     def __str__(self):
         return f'{self.company.company_name}'
     
 
+# payroll rules, shared with client.payroll
+REGULAR_HOURS = 9
+OVERTIME_RATE = Decimal('1.4')
+
 class JobReport(models.Model):
     job_application = models.OneToOneField(JobApplication, on_delete=models.SET_NULL, null=True, related_name='job_report')
     working_hour = models.IntegerField(null=True, blank=True)
@@ -327,17 +575,17 @@ class JobReport(models.Model):
             self.working_hour = int(self.job_application.total_working_hours.total_seconds() / 3600)  # Convert timedelta to hours
             base_rate = self.job_application.vacancy.job_title.staff_price  # Get hourly pay rate
             
-            # Calculate overtime (if work > 8 hours)
-            if self.working_hour > 9:
-                self.extra_hour = self.working_hour - 9
+            # Calculate overtime (if work > 9 hours)
+            if self.working_hour > REGULAR_HOURS:
+                self.extra_hour = self.working_hour - REGULAR_HOURS
             else:
                 self.extra_hour = 0
             
-            # Regular Pay: First 8 hours at base rate
-            self.regular_pay = base_rate * min(self.working_hour, 9)
+            # Regular Pay: First 9 hours at base rate
+            self.regular_pay = Decimal(base_rate * min(self.working_hour, REGULAR_HOURS))
             
-            # Overtime Pay: Extra hours at 1.4x the base rate
-            self.overtime_pay = self.extra_hour * base_rate * 1.4
+            # Overtime Pay: Extra hours at 1.4x the base rate, Decimal so no float rounding
+            self.overtime_pay = self.extra_hour * base_rate * OVERTIME_RATE
             
             # # Tax (25% of total earnings before tax)
             # total_earnings = self.regular_pay + self.overtime_pay
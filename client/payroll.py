@@ -0,0 +1,89 @@
+# batch payroll, same rules as JobReport.generate_report for many applications at once
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+
+from .models import JobApplication, JobReport, REGULAR_HOURS, OVERTIME_RATE
+
+
+REPORT_FIELDS = ['working_hour', 'extra_hour', 'regular_pay', 'overtime_pay', 'total_pay']
+# staff_price is a whole amount, in cents the overtime rate stays an exact integer
+OVERTIME_CENTS = int(OVERTIME_RATE * 100)
+
+
+def compute_pay(working_seconds, staff_prices):
+    """Hours and pay for arrays of worked seconds and hourly prices, pay in integer cents."""
+    working_seconds = np.asarray(working_seconds, dtype=np.int64)
+    staff_prices = np.asarray(staff_prices, dtype=np.int64)
+
+    working_hour = working_seconds // 3600
+    extra_hour = np.maximum(working_hour - REGULAR_HOURS, 0)
+    regular_pay = staff_prices * 100 * np.minimum(working_hour, REGULAR_HOURS)
+    overtime_pay = extra_hour * staff_prices * OVERTIME_CENTS
+    return {
+        'working_hour': working_hour,
+        'extra_hour': extra_hour,
+        'regular_pay': regular_pay,
+        'overtime_pay': overtime_pay,
+        'total_pay': regular_pay + overtime_pay,
+    }
+
+
+def _money(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def payroll_rows(start=None, end=None):
+    """Flat (application id, worked time, staff price, report id) rows of every payable application."""
+    applications = JobApplication.objects.filter(
+        checkout_approve=True,
+        total_working_hours__isnull=False,
+        vacancy__job_title__isnull=False,
+    )
+    if start:
+        applications = applications.filter(vacancy__open_date__gte=start)
+    if end:
+        applications = applications.filter(vacancy__open_date__lte=end)
+    return applications.order_by('id').values_list(
+        'id', 'total_working_hours', 'vacancy__job_title__staff_price', 'job_report__id'
+    )
+
+
+def _write_batch(rows):
+    application_ids, worked, prices, report_ids = zip(*rows)
+    pay = compute_pay([int(duration.total_seconds()) for duration in worked], prices)
+
+    created, updated = [], []
+    for i, (application_id, report_id) in enumerate(zip(application_ids, report_ids)):
+        report = JobReport(
+            id=report_id,
+            job_application_id=application_id,
+            working_hour=int(pay['working_hour'][i]),
+            extra_hour=int(pay['extra_hour'][i]),
+            regular_pay=_money(pay['regular_pay'][i]),
+            overtime_pay=_money(pay['overtime_pay'][i]),
+            total_pay=_money(pay['total_pay'][i]),
+        )
+        (updated if report_id else created).append(report)
+
+    with transaction.atomic():
+        JobReport.objects.bulk_create(created)
+        JobReport.objects.bulk_update(updated, REPORT_FIELDS)
+    return len(created), len(updated)
+
+
+def generate_reports(start=None, end=None, batch_size=5000):
+    """Create or refresh the JobReport of every checkout-approved application with a vacancy in the period."""
+    created = updated = 0
+    batch = []
+    for row in payroll_rows(start, end).iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            counts = _write_batch(batch)
+            created, updated = created + counts[0], updated + counts[1]
+            batch = []
+    if batch:
+        counts = _write_batch(batch)
+        created, updated = created + counts[0], updated + counts[1]
+    return created, updated
@@ -0,0 +1,75 @@
+# vacancy search, postgres full text + trigram with an icontains fallback for sqlite
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, Q
+
+
+# no stemming, titles and skills are short and not always english
+SEARCH_CONFIG = 'simple'
+MAX_TERMS = 8
+
+
+def is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def terms(text):
+    return re.findall(r'\w+', (text or '').lower())[:MAX_TERMS]
+
+
+def documents(vacancy_ids, model=None):
+    """{vacancy id: search text} from job title, role, skills and location, two queries."""
+    if model is None:
+        from .models import Vacancy as model
+    parts = {
+        vacancy_id: [title, role, location]
+        for vacancy_id, title, role, location in model.objects.filter(id__in=vacancy_ids).values_list(
+            'id', 'job__title', 'job_title__name', 'location'
+        )
+    }
+    skills = model.skills.through.objects.filter(vacancy_id__in=parts).values_list('vacancy_id', 'skill__name')
+    for vacancy_id, skill in skills:
+        parts[vacancy_id].append(skill)
+    return {vacancy_id: ' '.join(part for part in values if part) for vacancy_id, values in parts.items()}
+
+
+def refresh(vacancy_ids, model=None, batch_size=500):
+    """Rebuild search_text and, on postgres, search_vector of the vacancies."""
+    if model is None:
+        from .models import Vacancy as model
+    vacancy_ids = list(vacancy_ids)
+    for start in range(0, len(vacancy_ids), batch_size):
+        texts = documents(vacancy_ids[start:start + batch_size], model)
+        model.objects.bulk_update(
+            [model(id=vacancy_id, search_text=text) for vacancy_id, text in texts.items()], ['search_text']
+        )
+        if is_postgres():
+            model.objects.filter(id__in=texts).update(search_vector=SearchVector('search_text', config=SEARCH_CONFIG))
+
+
+def search(vacancies, text):
+    """Vacancies matching text, best match first.
+
+    every term is a prefix so results follow the keystrokes, trigram word
+    similarity catches typos, the GIN indexes of migration 0026 serve both
+    """
+    words = terms(text)
+    if not words:
+        return vacancies
+    if not is_postgres():
+        for word in words:
+            vacancies = vacancies.filter(search_text__icontains=word)
+        return vacancies.order_by('-created_at', '-id')
+
+    query = SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config=SEARCH_CONFIG)
+    phrase = ' '.join(words)
+    return (
+        vacancies.annotate(
+            rank=SearchRank(F('search_vector'), query),
+            similarity=TrigramWordSimilarity(phrase, 'search_text'),
+        )
+        .filter(Q(search_vector=query) | Q(search_text__trigram_word_similar=phrase))
+        .order_by('-rank', '-similarity', '-created_at', '-id')
+    )
@@ -2,7 +2,7 @@ from rest_framework import serializers, status
 from rest_framework.response import Response
 
 from django.shortcuts import get_object_or_404
-from django.db.models import Avg, Count
+from django.db.models import Prefetch
 from datetime import datetime, timedelta
 
 
@@ -23,6 +23,7 @@ from .models import (
     FavouriteStaff,
     MyStaff,
     CompanyReview,
+    TRACKED_STATUS,
 )
 from users.models import (
     JobRole,
@@ -31,6 +32,8 @@ from users.models import (
 )
 
 from dashboard.models import Notification
+from dashboard.notifications import NotificationBatch
+from . import geo
 
 from users.serializers import UserSerializer
 
@@ -58,13 +61,8 @@ class CompanyProfileSerializer(serializers.ModelSerializer):
         return data
 
     def get_avg_rating(self, obj):
-        reviews = CompanyReview.objects.filter(review_for=obj).aggregate(Avg("rating"))[
-            "rating__avg"
-        ]
-        if reviews:
-            return reviews
-        else:
-            return 0
+        # precomputed on the profile, no aggregate per company card
+        return obj.avg_rating or 0
 
     def update(self, instance, validated_data):
         user_data = validated_data.pop("user_data", None)
@@ -94,6 +92,21 @@ class VacancySerializer(serializers.ModelSerializer):
         model = Vacancy
         fields = "__all__"
 
+    @classmethod
+    def prefetch(cls, queryset, prefix=""):
+        """joins and prefetches of every field, prefix when the vacancy is a relation of the queryset rows"""
+        return queryset.select_related(
+            f"{prefix}job__company", f"{prefix}job_title", f"{prefix}stats"
+        ).prefetch_related(
+            f"{prefix}skills",
+            f"{prefix}participants",
+            Prefetch(
+                f"{prefix}jobapplication_set",
+                queryset=JobApplication.objects.select_related("applicant__user"),
+                to_attr="_prefetched_jobapplications",
+            ),
+        )
+
     def get_job_name(self, obj):
         return obj.job.title
     
@@ -108,19 +121,8 @@ class VacancySerializer(serializers.ModelSerializer):
         return None
 
     def get_application_status(self, obj):
-        # Use prefetched applications if available
-        job_apps = getattr(obj, "_prefetched_jobapplications", None)
-        if job_apps is None:
-            job_apps = obj.jobapplication_set.all()
-
-        status_counts = {}
-        for app in job_apps:
-            status_counts[app.job_status] = status_counts.get(app.job_status, 0) + 1
-
-        # Default all possible statuses
-        default = {"pending": 0, "accepted": 0, "rejected": 0, "expired": 0}
-        default.update(status_counts)
-        return default
+        # counters maintained in VacancyStats, no aggregate per vacancy
+        return obj.application_status()
 
 
     def get_applicants(self, obj):
@@ -139,6 +141,79 @@ class VacancySerializer(serializers.ModelSerializer):
         ]
 
 
+class FeedVacancySerializer(serializers.ModelSerializer):
+    """Slim vacancy of the staff feed, no participants or applicants, ?fields= picks a subset."""
+    job_name = serializers.CharField(source="job.title", read_only=True)
+    job_title = serializers.CharField(source="job_title.name", read_only=True, default=None)
+    company_name = serializers.CharField(source="job.company.company_name", read_only=True)
+    company_logo = serializers.SerializerMethodField()
+    skills = serializers.SlugRelatedField(slug_field="name", many=True, read_only=True)
+    application_status = serializers.SerializerMethodField()
+
+    # columns each field reads, the queryset loads only those of the requested fields
+    LOOKUPS = {
+        "job_name": ["job__title"],
+        "job_title": ["job_title__name"],
+        "company_name": ["job__company__company_name"],
+        "company_logo": ["job__company__company_logo"],
+        "skills": [],
+        "application_status": [f"stats__{job_status}" for job_status in TRACKED_STATUS],
+    }
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)  # Get dynamic fields if provided
+        super().__init__(*args, **kwargs)
+
+        if fields:
+            allowed = set(fields)
+            existing = set(self.fields.keys())
+            for field_name in existing - allowed:
+                self.fields.pop(field_name)
+
+    class Meta:
+        model = Vacancy
+        fields = [
+            "id",
+            "job_name",
+            "job_title",
+            "company_name",
+            "company_logo",
+            "open_date",
+            "close_date",
+            "start_time",
+            "end_time",
+            "location",
+            "latitude",
+            "longitude",
+            "number_of_staff",
+            "salary",
+            "shift_job",
+            "skills",
+            "application_status",
+        ]
+
+    @classmethod
+    def project(cls, queryset, fields=None):
+        """only() the columns of the fields, joins for the related ones, skills prefetched on request"""
+        fields = fields or cls.Meta.fields
+        # created_at and id are the pagination keys
+        lookups = {"id", "created_at"}
+        for field_name in fields:
+            lookups.update(cls.LOOKUPS.get(field_name, [field_name]))
+        relations = {lookup.rsplit("__", 1)[0] for lookup in lookups if "__" in lookup}
+        queryset = queryset.select_related(*relations).only(*lookups)
+        if "skills" in fields:
+            queryset = queryset.prefetch_related(Prefetch("skills", queryset=Skill.objects.only("id", "name")))
+        return queryset
+
+    def get_company_logo(self, obj):
+        company = obj.job.company
+        return company.company_logo.url if company.company_logo else None
+
+    def get_application_status(self, obj):
+        return obj.application_status()
+
+
 class CreateVacancySerializers(serializers.ModelSerializer):
     job = serializers.PrimaryKeyRelatedField(queryset=Job.objects.all())
     job_title = serializers.PrimaryKeyRelatedField(queryset=JobRole.objects.all())
@@ -149,6 +224,9 @@ class CreateVacancySerializers(serializers.ModelSerializer):
         queryset=Uniform.objects.all(), required=False, allow_null=True
     )
     invited_staff = serializers.ListField(required=False, allow_null=True)
+    # raw input, parsed and rounded by geo.parse_coordinates in validate
+    latitude = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    longitude = serializers.CharField(required=False, allow_null=True, allow_blank=True)
 
     class Meta:
         model = Vacancy
@@ -164,10 +242,21 @@ class CreateVacancySerializers(serializers.ModelSerializer):
             "start_time",
             "end_time",
             "location",
+            "latitude",
+            "longitude",
+            "geofence_radius",
             "job_status",
             "invited_staff",
         ]
 
+    def validate(self, attrs):
+        if "latitude" in attrs or "longitude" in attrs:
+            try:
+                attrs["latitude"], attrs["longitude"] = geo.parse_coordinates(attrs)
+            except ValueError as e:
+                raise serializers.ValidationError({"coordinates": str(e)})
+        return attrs
+
     def create(self, validated_data):
         skills = validated_data.pop("skills", [])
         invited_staff_id = validated_data.pop("invited_staff", [])
@@ -176,14 +265,12 @@ class CreateVacancySerializers(serializers.ModelSerializer):
         vacancy = Vacancy.objects.create(**validated_data)
 
         vacancy.skills.set(skills)
-        # send notifications to the invited staff
-        for staff in invited_staff_id:
-            # send notifications to the invited staff
-            staff = Staff.objects.filter(id=staff).first()
-            if staff:
-                Notification.objects.create(
-                    user=staff.user,
-                    message=f"You are invited to {vacancy.job.title} at {vacancy.open_date}. go to the job description.",
+        # send notifications to the invited staff, one query and one insert for all of them
+        with NotificationBatch() as batch:
+            for user_id in Staff.objects.filter(id__in=invited_staff_id).values_list("user_id", flat=True):
+                batch.add(
+                    user_id,
+                    f"You are invited to {vacancy.job.title} at {vacancy.open_date}. go to the job description.",
                 )
         return vacancy
 
@@ -207,6 +294,12 @@ class JobSerializer(serializers.ModelSerializer):
         read_only_fields = ["company"]
         depth = 1
 
+    @classmethod
+    def prefetch(cls, queryset, prefix=""):
+        return queryset.select_related(f"{prefix}company").prefetch_related(
+            Prefetch(f"{prefix}vacancies", queryset=VacancySerializer.prefetch(Vacancy.objects.all()))
+        )
+
     def create(self, validated_data):
         user = self.context["request"].user
         vacancy_data = validated_data.pop("vacancy_data", [])
@@ -367,6 +460,11 @@ class JobApplicationSerializer(serializers.ModelSerializer):
         model = JobApplication
         fields = "__all__"
 
+    @classmethod
+    def prefetch(cls, queryset):
+        queryset = VacancySerializer.prefetch(queryset, "vacancy__")
+        return StaffSerializer.prefetch(queryset, "applicant__")
+
     def to_representation(self, instance):
         data = super().to_representation(instance)
         data["vacancy"] = VacancySerializer(instance.vacancy).data
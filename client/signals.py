@@ -0,0 +1,237 @@
+from django.db.models import F, DEFERRED
+from django.utils import timezone
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from users.models import JobRole, Skill
+from utility import ratings
+from . import favourites, search
+from .models import (
+    CompanyProfile,
+    Job,
+    Vacancy,
+    VacancyStats,
+    CompanyJobSummary,
+    CompanyRating,
+    JobApplication,
+    CompanyReview,
+    FavouriteStaff,
+    TRACKED_STATUS,
+    VACANCY_STATUS,
+)
+
+
+def _shift(counters, **deltas):
+    # single UPDATE with F() so concurrent saves don't lose counts
+    deltas = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if deltas:
+        counters.update(updated_at=timezone.now(), **deltas)
+
+
+def _shift_counts(vacancy_id, **deltas):
+    # a missing row is rebuilt on read (Vacancy.application_status) or by reconcile_vacancy_stats,
+    # recreating it here would resurrect it while the vacancy is being deleted
+    _shift(VacancyStats.objects.filter(vacancy_id=vacancy_id), **deltas)
+
+
+def _shift_summary(lookup, **deltas):
+    # lookup reaches the company through job or vacancy without loading them
+    _shift(CompanyJobSummary.objects.filter(**lookup), **deltas)
+
+
+def _status_deltas(old_status, new_status, tracked):
+    deltas = {}
+    if old_status in tracked:
+        deltas[old_status] = -1
+    if new_status in tracked:
+        deltas[new_status] = deltas.get(new_status, 0) + 1
+    return deltas
+
+
+@receiver(post_save, sender=CompanyProfile)
+def create_company_summary(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CompanyJobSummary.objects.get_or_create(company_id=instance.id)
+
+
+@receiver(post_save, sender=Job)
+def count_job(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _shift(CompanyJobSummary.objects.filter(company_id=instance.company_id), total_jobs=1)
+
+
+@receiver(post_delete, sender=Job)
+def uncount_job(sender, instance, **kwargs):
+    _shift(CompanyJobSummary.objects.filter(company_id=instance.company_id), total_jobs=-1)
+
+
+def _loaded_status(instance):
+    # left out by only(), reading it here would cost a query per row
+    return instance.__dict__.get('job_status', DEFERRED) if instance.pk else None
+
+
+def _status_unknown(instance):
+    """True when the status was deferred on load, counters can't be shifted from it."""
+    return instance._loaded_job_status is DEFERRED
+
+
+def _search_key(instance):
+    return tuple(instance.__dict__.get(field) for field in ('job_id', 'job_title_id', 'location'))
+
+
+@receiver(post_init, sender=Vacancy)
+def remember_vacancy_status(sender, instance, **kwargs):
+    instance._loaded_job_status = _loaded_status(instance)
+    instance._loaded_search_key = _search_key(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Vacancy)
+def index_vacancy(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    key = _search_key(instance)
+    if created or key != instance._loaded_search_key:
+        search.refresh([instance.id])
+        instance._loaded_search_key = key
+
+
+@receiver(post_save, sender=Vacancy)
+def count_vacancy_status(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        VacancyStats.objects.get_or_create(vacancy_id=instance.id)
+    if not created and _status_unknown(instance):
+        # a deferred status isn't saved, one assigned afterwards has no known old value
+        if 'job_status' in instance.__dict__:
+            CompanyJobSummary.recount([instance.job.company_id])
+            instance._loaded_job_status = instance.job_status
+        return
+    old_status = None if created else instance._loaded_job_status
+    if old_status != instance.job_status:
+        _shift_summary({'company__jobs': instance.job_id}, **_status_deltas(old_status, instance.job_status, VACANCY_STATUS))
+    instance._loaded_job_status = instance.job_status
+
+
+@receiver(post_delete, sender=Vacancy)
+def uncount_vacancy_status(sender, instance, **kwargs):
+    # a deferred status matches nothing, refresh_company_job_summaries catches it
+    if instance._loaded_job_status in VACANCY_STATUS:
+        _shift_summary({'company__jobs': instance.job_id}, **{instance._loaded_job_status: -1})
+
+
+@receiver(post_init, sender=JobApplication)
+def remember_job_status(sender, instance, **kwargs):
+    # status as loaded, compared on save to know which counter moves
+    instance._loaded_job_status = _loaded_status(instance)
+
+
+@receiver(post_save, sender=JobApplication)
+def count_job_status(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created and _status_unknown(instance):
+        if 'job_status' in instance.__dict__:
+            VacancyStats.recount([instance.vacancy_id])
+            instance._loaded_job_status = instance.job_status
+        return
+    old_status = None if created else instance._loaded_job_status
+    new_status = instance.job_status
+    if old_status != new_status:
+        _shift_counts(instance.vacancy_id, **_status_deltas(old_status, new_status, TRACKED_STATUS))
+    if created:
+        _shift_summary({'company__jobs__vacancies': instance.vacancy_id}, total_applicants=1)
+    instance._loaded_job_status = new_status
+
+
+@receiver(post_delete, sender=JobApplication)
+def uncount_job_status(sender, instance, **kwargs):
+    if instance._loaded_job_status in TRACKED_STATUS:
+        _shift_counts(instance.vacancy_id, **{instance._loaded_job_status: -1})
+    _shift_summary({'company__jobs__vacancies': instance.vacancy_id}, total_applicants=-1)
+
+
+@receiver(m2m_changed, sender=Vacancy.participants.through)
+def count_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # staff.participants.clear(), the vacancies are gone by post_clear
+        instance._cleared_vacancy_ids = list(instance.participants.values_list('id', flat=True))
+        return
+    if action == 'post_add' and not reverse:
+        # pk_set only holds the staff that were really added
+        _shift_counts(instance.id, participants=len(pk_set))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        # remove() reports every pk it was given, count those from the table
+        if reverse:
+            vacancy_ids = pk_set if action != 'post_clear' else instance.__dict__.pop('_cleared_vacancy_ids', [])
+        else:
+            vacancy_ids = [instance.id]
+        VacancyStats.recount(vacancy_ids)
+
+
+@receiver(m2m_changed, sender=Vacancy.skills.through)
+def index_vacancy_skills(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        instance._cleared_vacancy_ids = list(instance.skills.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            search.refresh([instance.id])
+        elif action == 'post_clear':
+            search.refresh(getattr(instance, '_cleared_vacancy_ids', []))
+        else:
+            search.refresh(pk_set)
+
+
+@receiver(post_init, sender=Job)
+def remember_job_title(sender, instance, **kwargs):
+    instance._loaded_title = instance.__dict__.get('title')
+
+
+@receiver(post_save, sender=Job)
+def index_job_title(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw and instance.__dict__.get('title') != instance._loaded_title:
+        search.refresh(instance.vacancies.values_list('id', flat=True))
+        instance._loaded_title = instance.title
+
+
+@receiver(post_save, sender=JobRole)
+def index_job_role(sender, instance, created, raw=False, **kwargs):
+    # renames are rare admin edits
+    if not created and not raw:
+        search.refresh(Vacancy.objects.filter(job_title=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Skill)
+def index_skill(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.refresh(instance.skills.values_list('id', flat=True))
+
+
+def _review_key(instance):
+    # (company, rating) as loaded, None when a field was deferred
+    values = ratings.loaded_values(instance, ('review_for_id', 'rating'))
+    if values is None:
+        return None
+    company_id, rating = values
+    return company_id, int(rating)
+
+
+def _shift_rating(key, sign):
+    company_id, rating = key
+    if sign > 0 and company_id:
+        CompanyRating.objects.get_or_create(company_id=company_id)
+    return ratings.shift_counters(
+        CompanyRating.objects.filter(company_id=company_id), sign, rating,
+        'review_count', 'rating_total', updated_at=timezone.now(),
+    )
+
+
+ratings.track_ratings(CompanyReview, _review_key, _shift_rating, CompanyRating.recount)
+
+
+@receiver(post_save, sender=FavouriteStaff)
+@receiver(post_delete, sender=FavouriteStaff)
+def refresh_favourites(sender, instance, raw=False, **kwargs):
+    # bulk_create / update() skip this, call favourites.changed() after them
+    if not raw:
+        favourites.changed(instance.company_id)
@@ -1,6 +1,18 @@
+import hashlib
+
 from celery import shared_task
+
 from django.utils import timezone
-from .models import Vacancy
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.html import strip_tags
+
+from . import contracts, geo, payroll
+from .models import CompanyProfile, Vacancy, JobApplication, CompanyJobSummary, CONTRACT_TIMEOUT
 
 @shared_task
 def update_job_status():
@@ -15,4 +27,170 @@ def update_job_status():
 
 @shared_task
 def print_hello():
-    print('Hello world')
\ No newline at end of file
+    print('Hello world')
+
+
+@shared_task
+def refresh_company_job_summaries(company_ids=None, batch_size=500):
+    """RECOUNT COMPANY JOB SUMMARIES, CATCHES QUERYSET UPDATES THAT SKIP THE SIGNALS"""
+    if company_ids is None:
+        company_ids = CompanyProfile.objects.order_by('id').values_list('id', flat=True)
+    company_ids = list(company_ids)
+    for start in range(0, len(company_ids), batch_size):
+        CompanyJobSummary.recount(company_ids[start:start + batch_size])
+
+
+@shared_task
+def generate_payroll_task(start=None, end=None):
+    """CREATE OR REFRESH JOB REPORTS OF A PERIOD IN BATCHES"""
+    created, updated = payroll.generate_reports(start, end)
+    return {'created': created, 'updated': updated}
+
+
+@shared_task
+def score_pending_checkins():
+    """DISTANCE AND GEOFENCE OF CHECK-INS/OUTS NOT SCORED YET, E.G. VENUE COORDINATES ADDED LATER"""
+    checkins, checkouts = geo.score_pending()
+    return {'checkins': checkins, 'checkouts': checkouts}
+
+
+def _claimable():
+    # pending, failed, or processing for longer than a render takes, its worker died
+    stale = timezone.now() - CONTRACT_TIMEOUT
+    return (
+        Q(contract_status__in=['pending', 'failed'])
+        | Q(contract_status='processing', contract_started_at__lt=stale)
+        | Q(contract_status='processing', contract_started_at__isnull=True)
+    )
+
+
+def _claim_contracts(application_ids):
+    # claim the applications first, a duplicate delivery of the same task finds nothing to claim
+    with transaction.atomic():
+        claimed = list(
+            JobApplication.objects.select_for_update(skip_locked=True)
+            .filter(_claimable(), id__in=application_ids)
+            .values_list('id', flat=True)
+        )
+        JobApplication.objects.filter(id__in=claimed).update(contract_status='processing', contract_started_at=timezone.now())
+
+    return list(
+        JobApplication.objects.filter(id__in=claimed).select_related(
+            'applicant__user',
+            'vacancy__job__company',
+            'vacancy__job_title',
+        )
+    )
+
+
+def _store_contract(application_id, pdf_file):
+    # same name on every attempt, a retry replaces the file instead of adding a new one
+    pdf_filename = f"job_contacts/job_contact_{application_id}.pdf"
+    if default_storage.exists(pdf_filename):
+        default_storage.delete(pdf_filename)
+    return default_storage.save(pdf_filename, ContentFile(pdf_file))
+
+
+def _contract_mail(application, html_content, connection=None):
+    mail = EmailMultiAlternatives(
+        subject='Job Contact File',
+        body=strip_tags(html_content),  # Plain text version
+        from_email=settings.EMAIL_HOST_USER,
+        to=[application.applicant.user.email],
+        connection=connection,
+    )
+    mail.attach_alternative(html_content, 'text/html')  # HTML version
+    return mail
+
+
+def _send_contracts(applications):
+    contexts = [contracts.contract_context(application) for application in applications]
+    pdf_files = contracts.render_contracts(contexts)
+
+    error = None
+    # one smtp connection for the whole batch, every contract is recorded as soon as its mail is out
+    # so a retry only picks up the ones that failed
+    with get_connection() as connection:
+        for application, context, pdf_file in zip(applications, contexts, pdf_files):
+            try:
+                pdf_filename = _store_contract(application.id, pdf_file)
+                _contract_mail(application, contracts.render_contract_html(context), connection).send()
+            except Exception as exc:
+                error = exc
+                JobApplication.objects.filter(id=application.id).update(contract_status='failed')
+                continue
+            JobApplication.objects.filter(id=application.id).update(contract_status='sent', contract_file=pdf_filename)
+    if error:
+        raise error
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def generate_job_contract_task(self, application_id):
+    """RENDER, STORE AND EMAIL THE JOB CONTRACT OF AN APPROVED APPLICATION"""
+    applications = _claim_contracts([application_id])
+    if not applications:
+        return
+    try:
+        _send_contracts(applications)
+    except Exception as exc:
+        JobApplication.objects.filter(id=application_id, contract_status='processing').update(contract_status='failed')
+        raise self.retry(exc=exc)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def generate_job_contracts_task(self, application_ids):
+    """SAME AS generate_job_contract_task FOR A BATCH OF APPROVED APPLICATIONS"""
+    applications = _claim_contracts(application_ids)
+    if not applications:
+        return
+    try:
+        _send_contracts(applications)
+    except Exception as exc:
+        JobApplication.objects.filter(
+            id__in=[application.id for application in applications], contract_status='processing'
+        ).update(contract_status='failed')
+        raise self.retry(exc=exc)
+
+
+@shared_task
+def requeue_stale_contracts():
+    """QUEUE AGAIN THE CONTRACTS LEFT 'processing' BY A WORKER THAT DIED MID RENDER"""
+    stale = list(
+        JobApplication.objects.filter(contract_status='processing', contract_started_at__lt=timezone.now() - CONTRACT_TIMEOUT)
+        .values_list('id', flat=True)
+    )
+    if stale:
+        generate_job_contracts_task.delay(stale)
+    return len(stale)
+
+
+def _vacancy_applications(vacancy_id):
+    return JobApplication.objects.filter(vacancy_id=vacancy_id, is_approve=True).order_by('id')
+
+
+def vacancy_contracts_name(vacancy_id, rows=None):
+    """storage name of the merged contracts of a vacancy, None when nobody is approved"""
+    # named after the approved applications, any change to them gives a new file
+    if rows is None:
+        rows = list(_vacancy_applications(vacancy_id).values_list('id', 'updated_at'))
+    if not rows:
+        return None
+    digest = hashlib.md5(repr(rows).encode()).hexdigest()[:12]
+    return f"job_contacts/job_contacts_{vacancy_id}_{digest}.pdf"
+
+
+@shared_task
+def generate_vacancy_contracts_task(vacancy_id):
+    """RENDER ALL CONTRACTS OF A VACANCY INTO ONE PDF"""
+    applications = list(_vacancy_applications(vacancy_id).select_related(
+        'applicant__user',
+        'vacancy__job__company',
+        'vacancy__job_title'
+    ))
+    pdf_filename = vacancy_contracts_name(vacancy_id, [(application.id, application.updated_at) for application in applications])
+    if not pdf_filename or default_storage.exists(pdf_filename):
+        return pdf_filename
+    pdf_file = contracts.render_contracts_merged(
+        [contracts.contract_context(application) for application in applications]
+    )
+    return default_storage.save(pdf_filename, ContentFile(pdf_file))
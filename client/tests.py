@@ -1,3 +1,434 @@
-from django.test import TestCase
+import json
+import tempfile
+from io import BytesIO, StringIO
+from datetime import date, time, timedelta
+from decimal import Decimal
+from smtplib import SMTPException
+from unittest.mock import patch
 
-# Create your tests here.
+from openpyxl import load_workbook
+
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMultiAlternatives
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import User, JobRole
+from staff.models import Staff
+from dashboard.models import Notification
+from . import contracts, favourites, geo, payroll
+from .models import CompanyProfile, CompanyRating, CompanyReview, FavouriteStaff, Job, Vacancy, JobApplication, JobReport, VacancyStats, Checkin
+from .serializers import CompanyProfileSerializer
+from .tasks import generate_job_contract_task, generate_job_contracts_task, generate_vacancy_contracts_task, requeue_stale_contracts
+
+
+def create_user(email, **extra_fields):
+    return User.objects.create_user(
+        email=email, phone_number="12345678", first_name="Test", last_name="User", password="foo", **extra_fields
+    )
+
+
+class VacancyTestCase(TestCase):
+
+    def setUp(self):
+        self.client_user = create_user("client@user.com", is_client=True)
+        self.company = CompanyProfile.objects.create(
+            user=self.client_user, company_name="Company", contact_number="123",
+            company_email="company@user.com", billing_email="billing@user.com", company_address="Oslo",
+        )
+        role = JobRole.objects.create(name="Waiter", staff_price=200, client_price=300)
+        job = Job.objects.create(company=self.company, title="Dinner")
+        self.vacancy = Vacancy.objects.create(
+            job=job, job_title=role, number_of_staff=2, open_date=date.today(), close_date=date.today(),
+            start_time=time(9), end_time=time(17),
+        )
+        staff_user = create_user("staff@user.com", is_staff=True)
+        self.staff = Staff.objects.create(user=staff_user, role=role, dob=date(2000, 1, 1))
+        self.application = JobApplication.objects.create(vacancy=self.vacancy, applicant=self.staff)
+
+
+class JobContractTests(VacancyTestCase):
+
+    def test_approve_queues_contract(self):
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        with patch("client.views.generate_job_contract_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = api.post(f"/api/v1/app/company/job/applications/{self.application.id}/", {"status": True}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["contract_status"], "pending")
+        delay.assert_called_once_with(self.application.id)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_contract_task_runs_once(self):
+        JobApplication.objects.filter(id=self.application.id).update(contract_status="pending")
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            generate_job_contract_task(self.application.id)
+            generate_job_contract_task(self.application.id)
+
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.contract_status, "sent")
+        self.assertEqual(self.application.contract_file, f"job_contacts/job_contact_{self.application.id}.pdf")
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_stale_processing_contract_is_claimed_again(self):
+        started_at = timezone.now() - timedelta(hours=1)
+        JobApplication.objects.filter(id=self.application.id).update(contract_status="processing", contract_started_at=started_at)
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.contract_state(), "failed")
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            self.assertEqual(requeue_stale_contracts(), 1)
+
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.contract_status, "sent")
+        self.assertEqual(len(mail.outbox), 1)
+
+    def approve_more(self, count):
+        applications = [self.application]
+        for i in range(count):
+            staff_user = create_user(f"staff{i}@user.com", is_staff=True)
+            staff = Staff.objects.create(user=staff_user, role=self.staff.role, dob=date(2000, 1, 1))
+            applications.append(JobApplication.objects.create(vacancy=self.vacancy, applicant=staff))
+        JobApplication.objects.filter(vacancy=self.vacancy).update(is_approve=True, contract_status="pending")
+        return [application.id for application in applications]
+
+    def test_batch_task_only_retries_unsent_contracts(self):
+        ids = self.approve_more(1)
+        send = EmailMultiAlternatives.send
+
+        def fail_second(message, *args, **kwargs):
+            if message.to == ["staff0@user.com"]:
+                raise SMTPException("mailbox unavailable")
+            return send(message, *args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with patch.object(EmailMultiAlternatives, "send", autospec=True, side_effect=fail_second):
+                with self.assertRaises(SMTPException):
+                    generate_job_contracts_task(ids)
+            statuses = dict(JobApplication.objects.values_list("id", "contract_status"))
+            self.assertEqual(statuses, {ids[0]: "sent", ids[1]: "failed"})
+
+            generate_job_contracts_task(ids)
+
+        self.assertEqual(JobApplication.objects.get(id=ids[1]).contract_status, "sent")
+        self.assertEqual([message.to for message in mail.outbox], [["staff@user.com"], ["staff0@user.com"]])
+
+    def test_vacancy_contracts_are_merged_in_the_background(self):
+        self.approve_more(2)
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        url = f"/api/v1/app/company/job/{self.vacancy.id}/contracts/"
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with patch("client.views.generate_vacancy_contracts_task.delay") as delay:
+                response = api.get(url)
+                api.get(url)
+            self.assertEqual(response.data["data"]["contract_status"], "processing")
+            delay.assert_called_once_with(self.vacancy.id)
+
+            with patch("client.tasks.contracts.render_contracts_merged", wraps=contracts.render_contracts_merged) as merged:
+                pdf_filename = generate_vacancy_contracts_task(self.vacancy.id)
+                generate_vacancy_contracts_task(self.vacancy.id)
+            merged.assert_called_once()
+            self.assertEqual(len(merged.call_args.args[0]), 3)
+
+            response = api.get(url)
+            self.assertEqual(response.data["data"]["contract_status"], "sent")
+            with default_storage.open(pdf_filename) as pdf_file:
+                self.assertTrue(pdf_file.read().startswith(b"%PDF"))
+
+    def test_bulk_approve_respects_capacity(self):
+        applications = [self.application]
+        for i in range(2):
+            staff_user = create_user(f"staff{i}@user.com", is_staff=True)
+            staff = Staff.objects.create(user=staff_user, role=self.staff.role, dob=date(2000, 1, 1))
+            applications.append(JobApplication.objects.create(vacancy=self.vacancy, applicant=staff))
+        ids = [application.id for application in applications]
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+
+        url = f"/api/v1/app/company/job/{self.vacancy.id}/applications/bulk/"
+        response = api.post(url, {"application_ids": ids, "status": True}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.vacancy.participants.count(), 0)
+
+        with patch("client.views.generate_job_contracts_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = api.post(url, {"application_ids": ids[:2], "status": True}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["data"]["approved"], ids[:2])
+        self.assertEqual(self.vacancy.participants.count(), 2)
+        self.assertEqual(Notification.objects.count(), 2)
+        delay.assert_called_once_with(ids[:2])
+
+    def test_bulk_ids_are_normalized(self):
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        url = f"/api/v1/app/company/job/{self.vacancy.id}/applications/bulk/"
+
+        response = api.post(url, {"application_ids": ["abc"], "status": False}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        response = api.post(url, {"application_ids": [str(self.application.id), 99999], "status": False}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["data"], {"rejected": [self.application.id], "skipped": [99999]})
+
+
+class VacancyStatsTests(VacancyTestCase):
+
+    def test_counters_follow_application_changes(self):
+        self.assertEqual(self.vacancy.application_status(), {"pending": 1, "accepted": 0, "rejected": 0, "expired": 0})
+
+        self.application.job_status = "accepted"
+        self.application.save()
+        self.vacancy.participants.add(self.staff)
+        stats = VacancyStats.objects.get(vacancy=self.vacancy)
+        self.assertEqual((stats.pending, stats.accepted, stats.participants), (0, 1, 1))
+
+        self.application.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.accepted, 0)
+
+    def test_deferred_status_is_not_loaded_per_row(self):
+        with self.assertNumQueries(1):
+            application = JobApplication.objects.only("id", "vacancy").get(id=self.application.id)
+        application.job_status = "rejected"
+        application.save()
+        stats = VacancyStats.objects.get(vacancy=self.vacancy)
+        self.assertEqual((stats.pending, stats.rejected), (0, 1))
+
+    def test_reconcile_fixes_drift(self):
+        VacancyStats.objects.filter(vacancy=self.vacancy).update(pending=7)
+        call_command("reconcile_vacancy_stats", stdout=StringIO())
+        self.assertEqual(VacancyStats.objects.get(vacancy=self.vacancy).pending, 1)
+
+    def test_vacancy_delete_drops_counters(self):
+        self.vacancy.delete()
+        self.assertFalse(VacancyStats.objects.exists())
+
+
+class PayrollTests(VacancyTestCase):
+
+    def test_generate_reports_creates_then_updates(self):
+        JobApplication.objects.filter(id=self.application.id).update(
+            checkout_approve=True, total_working_hours=timedelta(hours=11, minutes=30)
+        )
+        self.assertEqual(payroll.generate_reports(), (1, 0))
+        self.assertEqual(payroll.generate_reports(), (0, 1))
+
+        report = JobReport.objects.get(job_application=self.application)
+        self.assertEqual((report.working_hour, report.extra_hour), (11, 2))
+        self.assertEqual(report.regular_pay, Decimal("1800.00"))
+        self.assertEqual(report.overtime_pay, Decimal("560.00"))
+        self.assertEqual(report.total_pay, Decimal("2360.00"))
+
+
+class PayrollExportTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        JobApplication.objects.filter(id=self.application.id).update(
+            checkout_approve=True, total_working_hours=timedelta(hours=8)
+        )
+        payroll.generate_reports()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def test_csv_export_streams_company_reports(self):
+        response = self.api.get("/api/v1/app/company/reports/export/", {"file_format": "csv"})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("1600.00", lines[1])
+
+        response = self.api.get("/api/v1/app/company/reports/export/", {"start": date.today() + timedelta(days=1)})
+        self.assertEqual(len(b"".join(response.streaming_content).decode().splitlines()), 1)
+
+    def test_xlsx_export(self):
+        response = self.api.get(f"/api/v1/app/staff/workinghours/{self.staff.id}/", {"file_format": "xlsx"})
+        workbook = load_workbook(BytesIO(b"".join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.values)
+        self.assertEqual(rows[1][:2], ("Test", "User"))
+
+    def test_invalid_staff_is_rejected(self):
+        response = self.api.get("/api/v1/app/company/reports/export/", {"staff": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_actions_stream_selected_reports(self):
+        admin_user = User.objects.create_superuser(email="admin@user.com", password="foo")
+        self.client.force_login(admin_user)
+        selected = list(JobReport.objects.values_list("id", flat=True))
+        url = reverse("admin:client_jobreport_changelist")
+
+        response = self.client.post(url, {"action": "export_csv", "_selected_action": selected})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("1600.00", lines[1])
+
+        response = self.client.post(url, {"action": "export_xlsx", "_selected_action": selected})
+        workbook = load_workbook(BytesIO(b"".join(response.streaming_content)), read_only=True)
+        self.assertEqual(len(list(workbook.active.values)), 2)
+
+
+class GeofenceTests(VacancyTestCase):
+
+    def test_haversine_one_degree_of_longitude(self):
+        self.assertAlmostEqual(float(geo.haversine(0, 0, 0, 1)), 111195.08, places=1)
+
+    def test_pending_checkins_scored_in_one_pass(self):
+        Vacancy.objects.filter(id=self.vacancy.id).update(latitude=Decimal("59.911491"), longitude=Decimal("10.757933"))
+        near = Checkin.objects.create(application=self.application, latitude=Decimal("59.912000"), longitude=Decimal("10.758000"))
+        far = Checkin.objects.create(application=self.application, latitude=Decimal("59.920000"), longitude=Decimal("10.757933"))
+        unknown = Checkin.objects.create(application=self.application, location="Oslo")
+
+        with self.assertNumQueries(2):
+            self.assertEqual(geo.score_records(geo.pending()), 2)
+
+        near.refresh_from_db()
+        far.refresh_from_db()
+        unknown.refresh_from_db()
+        self.assertEqual((near.distance, near.within_geofence), (57, True))
+        self.assertFalse(far.within_geofence)
+        self.assertGreater(far.distance, 900)
+        self.assertIsNone(unknown.distance)
+
+    def test_non_finite_coordinates_are_rejected(self):
+        for latitude in ("NaN", "Infinity", "-inf"):
+            with self.assertRaises(ValueError):
+                geo.parse_coordinates({"latitude": latitude, "longitude": "10.75"})
+
+    def test_created_vacancy_scores_checkins(self):
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        payload = {
+            "job": self.vacancy.job_id, "job_title": self.vacancy.job_title_id, "number_of_staff": 1,
+            "open_date": date.today(), "close_date": date.today(), "start_time": "09:00", "end_time": "17:00",
+            "latitude": "59.9114914", "longitude": "10.757933", "geofence_radius": 100,
+        }
+        response = api.post("/api/v1/app/company/vacancy/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        vacancy = Vacancy.objects.get(id=response.data["data"]["id"])
+        self.assertEqual((vacancy.latitude, vacancy.geofence_radius), (Decimal("59.911491"), 100))
+        self.assertIsNotNone(vacancy.geohash)
+
+        application = JobApplication.objects.create(vacancy=vacancy, applicant=self.staff)
+        checkin = Checkin.objects.create(application=application, latitude=Decimal("59.912000"), longitude=Decimal("10.758000"))
+        self.assertEqual(geo.score_records(geo.pending()), 1)
+        checkin.refresh_from_db()
+        self.assertEqual((checkin.distance, checkin.within_geofence), (57, True))
+
+        payload["latitude"] = "NaN"
+        self.assertEqual(api.post("/api/v1/app/company/vacancy/", payload, format="json").status_code, 400)
+
+
+class BenchmarkDataTests(TestCase):
+
+    @override_settings(BENCHMARK=False)
+    def test_generator_refuses_other_settings(self):
+        with self.assertRaises(CommandError):
+            call_command("generate_benchmark_data", stdout=StringIO())
+
+    @override_settings(BENCHMARK=True)
+    def test_small_dataset_is_consistent_and_benchmarked(self):
+        call_command(
+            "generate_benchmark_data", companies=3, staff=10, vacancies=40, applications=200,
+            chat_rooms=5, messages=20, notifications=20, batch_size=50, stdout=StringIO(),
+        )
+        self.assertEqual(JobApplication.objects.count(), 200)
+        vacancy = Vacancy.objects.exclude(search_text="").first()
+        self.assertIsNotNone(vacancy.geohash)
+        self.assertEqual(
+            sum(VacancyStats.objects.values_list("pending", flat=True)),
+            JobApplication.objects.filter(job_status="pending").count(),
+        )
+
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            call_command("benchmark_endpoints", iterations=2, warmup=0, output=output.name, stdout=StringIO())
+            results = json.load(output)["endpoints"]
+        self.assertEqual(set(results), {
+            "staff-feed", "client-feed", "pending-actions", "chat-list", "notifications", "payroll-export"
+        })
+        self.assertLessEqual(results["chat-list"]["p50_ms"], results["chat-list"]["p95_ms"])
+
+
+class CompanyRatingTests(VacancyTestCase):
+
+    def test_rating_follows_reviews(self):
+        api = APIClient()
+        api.force_authenticate(self.staff.user)
+        response = api.post(f"/api/v1/app/company/{self.application.id}/review/", {"rating": 4, "content": "ok"})
+        self.assertEqual(response.status_code, 201)
+        other = JobApplication.objects.create(vacancy=self.vacancy, applicant=self.staff)
+        CompanyReview.objects.create(review_by=self.staff, review_for=self.company, application=other, rating=1)
+
+        rating = CompanyRating.objects.get(company=self.company)
+        self.assertEqual((rating.review_count, rating.rating_total), (2, 5))
+        company = CompanyProfile.objects.select_related("user", "rating").get(id=self.company.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(CompanyProfileSerializer(company).data["avg_rating"], 2.5)
+
+        CompanyReview.objects.filter(application=other).delete()
+        self.assertEqual(CompanyProfile.objects.get(id=self.company.id).avg_rating, 4)
+
+    def test_reconcile_fixes_drift(self):
+        CompanyReview.objects.create(review_by=self.staff, review_for=self.company, application=self.application, rating=5)
+        CompanyReview.objects.update(rating=3)
+        call_command("reconcile_company_ratings", stdout=StringIO())
+        self.assertEqual(CompanyProfile.objects.get(id=self.company.id).avg_rating, 3)
+
+    def test_deletes_never_take_below_zero(self):
+        other = JobApplication.objects.create(vacancy=self.vacancy, applicant=self.staff)
+        CompanyReview.objects.create(review_by=self.staff, review_for=self.company, application=self.application, rating=5)
+        CompanyReview.objects.create(review_by=self.staff, review_for=self.company, application=other, rating=2)
+
+        # a partially loaded review still takes its own numbers off
+        CompanyReview.objects.only("id").get(application=other).delete()
+        rating = CompanyRating.objects.get(company=self.company)
+        self.assertEqual((rating.review_count, rating.rating_total), (1, 5))
+
+        # drifted to zero, the delete recounts instead of going negative
+        CompanyRating.objects.update(review_count=0, rating_total=0)
+        CompanyReview.objects.get().delete()
+        self.assertFalse(CompanyRating.objects.filter(company=self.company).exists())
+        self.assertIsNone(CompanyProfile.objects.get(id=self.company.id).avg_rating)
+
+
+class FavouriteStaffTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def toggle(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.post(f"/api/v1/app/company/staff/favourites/{self.staff.id}/").status_code
+
+    def test_membership_set_follows_toggles(self):
+        self.assertEqual(favourites.staff_ids(self.company.id), frozenset())
+        self.assertEqual(self.toggle(), 201)
+        self.assertEqual(favourites.staff_ids(self.company.id), {self.staff.id})
+        with self.assertNumQueries(0):
+            self.assertTrue(favourites.is_favourite(self.company.id, self.staff.id))
+
+        response = self.api.get(f"/api/v1/app/company/job/{self.vacancy.id}/applications/")
+        self.assertTrue(response.data["data"][0]["is_favourite"])
+
+        self.assertEqual(self.toggle(), 200)
+        self.assertFalse(favourites.is_favourite(self.company.id, self.staff.id))
+
+    def test_pair_is_unique(self):
+        FavouriteStaff.objects.create(company=self.company, staff=self.staff)
+        with self.assertRaises(IntegrityError):
+            FavouriteStaff.objects.create(company=self.company, staff=self.staff)
@@ -33,6 +33,10 @@ urlpatterns = [
 
     path('company/job/<int:vacancy_id>/applications/', views.JobApplicationAPI.as_view()),
     path('company/job/<int:vacancy_id>/applications/<int:pk>/', views.JobApplicationAPI.as_view()),
+    path('company/reports/export/', views.JobReportExportView.as_view()), # streaming csv / xlsx
+    path('company/job/<int:vacancy_id>/applications/bulk/', views.BulkJobApplicationAPI.as_view()), # approve / reject many
+    path('company/job/applications/<int:pk>/contract/', views.JobContractView.as_view()), # poll contract pdf status
+    path('company/job/<int:vacancy_id>/contracts/', views.VacancyContractsView.as_view()), # poll all contracts in one pdf
 
     # job checkin 
     path('company/job/applications/checkin/', views.CheckInView.as_view()),
@@ -1,19 +1,20 @@
 import os
 from datetime import datetime
-from weasyprint import HTML
 import stripe
 import json 
 
 
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
-from django.db.models import Q, Avg
+from django.db import transaction
+from django.db.models import Q
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.utils.html import strip_tags
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.timesince import timesince
 from django.utils.timezone import now, make_aware, localtime
 
@@ -37,7 +38,8 @@ from .models import (
     MyStaff,
     JobReport,
     CompanyReview,
-    InviteMystaff
+    InviteMystaff,
+    VacancyStats
 
 )
 
@@ -58,6 +60,7 @@ from .serializers import (
 )
 
 from dashboard.models import Notification
+from dashboard.notifications import notify, NotificationBatch
 from staff.models import Staff
 from staff.serializers import StaffSerializer
 from shifting.models import DailyShift, Shifting
@@ -65,6 +68,8 @@ from shifting.serializers import DailyShiftSerializer
 from subscription.models import Packages, Subscription
 from subscription.tasks import send_staff_joining_mail_task
 from utility.utils import generate_random_invitation_code, save_invited_staff
+from . import exports, favourites
+from .tasks import generate_job_contract_task, generate_job_contracts_task, generate_vacancy_contracts_task, vacancy_contracts_name
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 # create company profile
@@ -136,7 +141,7 @@ class CompanyProfileCreateView(generics.ListCreateAPIView):
 class VacancyView(APIView):
     def get(self, request,job_id=None, pk=None, **kwargs):
         if job_id:
-            vacancy = Vacancy.objects.filter(job__id=job_id)
+            vacancy = VacancySerializer.prefetch(Vacancy.objects.filter(job__id=job_id))
             serializer = VacancySerializer(vacancy, many=True)
             response = {
                 "status": status.HTTP_200_OK,
@@ -221,7 +226,7 @@ class JobView(APIView):
         user=request.user
         client = CompanyProfile.objects.filter(user=user).first()
         if pk:
-            job = Job.objects.filter(company=client, pk=pk).first()
+            job = JobSerializer.prefetch(Job.objects.filter(company=client, pk=pk)).first()
             if not job:
                 return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
             serializer = JobSerializer(job)
@@ -233,7 +238,7 @@ class JobView(APIView):
             }
             return Response(response_data, status=status.HTTP_200_OK)
         
-        jobs = Job.objects.filter(company=client)
+        jobs = JobSerializer.prefetch(Job.objects.filter(company=client))
         serializer = JobSerializer(jobs, many=True)
         response_data = {
                 "status": status.HTTP_200_OK,
@@ -302,7 +307,9 @@ class JobApplicationAPI(APIView): # pending actions page approve job
             return Response({"error": "Only clients can access this endpoint"}, status=status.HTTP_403_FORBIDDEN)
         # not used
         if pk:
-            job_application = JobApplication.objects.filter(pk=pk, vacancy__client=client, is_approve = False).first()
+            job_application = JobApplicationSerializer.prefetch(
+                JobApplication.objects.filter(pk=pk, vacancy__job__company=client, is_approve = False)
+            ).first()
             if not job_application:
                 return Response({"error": "Job application not found"}, status=status.HTTP_404_NOT_FOUND)
             serializer = JobApplicationSerializer(job_application)
@@ -321,6 +328,7 @@ class JobApplicationAPI(APIView): # pending actions page approve job
                 return Response({"error": "Vacancy not found"}, status=status.HTTP_404_NOT_FOUND)
             
             job_applications = JobApplication.objects.filter(vacancy=vacancy, is_approve=False).select_related('vacancy','applicant').order_by('created_at')            
+            favourite_staff_ids = favourites.staff_ids(client and client.id)
 
             # serializer = JobApplicationSerializer(job_applications, many=True)
             applications = []
@@ -334,7 +342,7 @@ class JobApplicationAPI(APIView): # pending actions page approve job
                     "gender": application.applicant.gender,
                     "timesince": f"{timesince(application.created_at, now())} ago", 
                     "job_title": application.applicant.role.name,
-                    "is_favourite": True if FavouriteStaff.objects.filter(company=client, staff=application.applicant).select_related('staff','company').exists() else False
+                    "is_favourite": application.applicant_id in favourite_staff_ids
                 }
                 if application.vacancy.open_date < now().date():
                     obj['job_status'] = 'expired'
@@ -382,10 +390,7 @@ class JobApplicationAPI(APIView): # pending actions page approve job
             job_status__in=['active', 'pending', 'accepted']
         ).only('id')
 
-        # Prefetch favourite staff in one query
-        favourite_staff_ids = set(
-            FavouriteStaff.objects.filter(company=client).values_list('staff_id', flat=True)
-        )
+        favourite_staff_ids = favourites.staff_ids(client and client.id)
 
         # Prefetch all needed related fields
         job_applications = JobApplication.objects.filter(
@@ -396,7 +401,7 @@ class JobApplicationAPI(APIView): # pending actions page approve job
             'applicant__role'
         ).only(
             'id', 'created_at', 'job_status',
-            'vacancy__job__title',
+            'vacancy__open_date', 'vacancy__job__title',
             'applicant__id', 'applicant__age', 'applicant__gender', 'applicant__avatar',
             'applicant__user__first_name', 'applicant__user__last_name',
             'applicant__role__name'
@@ -518,47 +523,18 @@ class JobApplicationAPI(APIView): # pending actions page approve job
                 
                 job_application.job_status = 'accepted'
                 job_application.is_approve = True
+                job_application.contract_status = 'pending'
                 job_application.save()
 
-                full_name = job_application.applicant.user.first_name + ' ' + job_application.applicant.user.last_name
-                time = f'{vacancy.open_date} at {vacancy.start_time}'
-                html_content = render_to_string(
-                    'contact.html', {
-                    'staff_name': full_name,
-                    'vacancy_name': vacancy.job_title.name,
-                    'starting_date_time': time,
-                    'price_per_hour': vacancy.job_title.staff_price,
-                    'location': vacancy.location,
-                    'company_name': vacancy.job.company,
-                    'company_website': 'https://www.example.com',
-                    'year': '2025',
-                })
-
-                # Convert HTML to PDF
-                pdf_file = HTML(string=html_content).write_pdf()
-
-                # Define storage path
-                pdf_filename = f"job_contacts/job_contact_{job_application.id}.pdf"
-                pdf_path = os.path.join(settings.MEDIA_ROOT, pdf_filename)
-
-                # Save PDF in Django storage
-                default_storage.save(pdf_filename, ContentFile(pdf_file))
-
-                # Send email
-                send_mail(
-                    subject='Job Contact File',
-                    message=strip_tags(html_content),  # Plain text version
-                    from_email= settings.EMAIL_HOST_USER,
-                    recipient_list=[job_application.applicant.user.email],
-                    html_message=html_content,  # HTML version
-                )
+                # contract pdf is rendered, stored and mailed by the worker
+                transaction.on_commit(lambda: generate_job_contract_task.delay(job_application.id))
 
                 # send notification to staff
-                Notification.objects.create(
+                notify(
                     user = job_application.applicant.user,
                     message = f"Your application for {job_application.vacancy.job_title} has been approved",
                 )
-                return Response(status=status.HTTP_200_OK, data={"message": "Job application approved"})
+                return Response(status=status.HTTP_200_OK, data={"message": "Job application approved", "contract_status": job_application.contract_status})
             elif data['status'] == False:
                 job_application.job_status = 'rejected'
                 job_application.is_approve = False
@@ -577,6 +553,180 @@ class JobApplicationAPI(APIView): # pending actions page approve job
     #     return Response(status=status.HTTP_204_NO_CONTENT)
     
 
+class BulkJobApplicationAPI(APIView):
+    def post(self, request, vacancy_id):
+        """APPROVE / REJECT MANY APPLICATIONS OF A VACANCY AT ONCE"""
+        data = request.data # application_ids, status
+        user = request.user
+        if not user.is_client:
+            return Response({"error": "Only client can approve job applications"}, status=status.HTTP_403_FORBIDDEN)
+        client = CompanyProfile.objects.filter(user=user).first()
+
+        application_ids = data.get('application_ids')
+        if not isinstance(application_ids, list) or not application_ids or data.get('status') not in (True, False):
+            return Response({"error": "application_ids and status are required"}, status=status.HTTP_400_BAD_REQUEST)
+        # normalized before any query, "1" and 1 are the same application
+        try:
+            application_ids = {int(application_id) for application_id in application_ids}
+        except (TypeError, ValueError):
+            return Response({"error": "application_ids must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # lock the vacancy so concurrent approvals see the same capacity
+            vacancy = Vacancy.objects.select_for_update().filter(id=vacancy_id, job__company=client).first()
+            if not vacancy:
+                return Response({"error": "Vacancy not found"}, status=status.HTTP_404_NOT_FOUND)
+            if vacancy.close_date < datetime.now().date():
+                return Response(status=status.HTTP_400_BAD_REQUEST, data={"message": "This job has expired"})
+
+            applications = list(
+                JobApplication.objects.filter(vacancy=vacancy, id__in=application_ids, is_approve=False)
+                .select_related('applicant__user')
+            )
+            skipped = application_ids - {application.id for application in applications}
+
+            if data['status'] == False:
+                for application in applications:
+                    application.job_status = 'rejected'
+                    application.updated_at = timezone.now()
+                JobApplication.objects.bulk_update(applications, ['job_status', 'updated_at'])
+                VacancyStats.recount([vacancy.id])
+                response_data = {
+                    "status": status.HTTP_200_OK,
+                    "success": True,
+                    "message": "Job applications declined",
+                    "data": {"rejected": [application.id for application in applications], "skipped": sorted(skipped)}
+                }
+                return Response(response_data, status=status.HTTP_200_OK)
+
+            # staff who have another job at the same time, one query for the whole batch
+            conflicts = set(
+                JobApplication.objects.filter(
+                    applicant_id__in=[application.applicant_id for application in applications],
+                    vacancy__open_date=vacancy.open_date,
+                    vacancy__start_time=vacancy.start_time,
+                    is_approve=False
+                ).exclude(id__in=[application.id for application in applications]).values_list('applicant_id', flat=True)
+            )
+            approved = [application for application in applications if application.applicant_id not in conflicts]
+            skipped |= {application.id for application in applications if application.applicant_id in conflicts}
+
+            free_places = vacancy.number_of_staff - vacancy.participants.count()
+            if len(approved) > free_places:
+                return Response(status=status.HTTP_400_BAD_REQUEST, data={"message": f"No space for applicants. {max(free_places, 0)} place(s) left"})
+
+            Participant = Vacancy.participants.through
+            Participant.objects.bulk_create(
+                [Participant(vacancy_id=vacancy.id, staff_id=application.applicant_id) for application in approved],
+                ignore_conflicts=True
+            )
+            for application in approved:
+                application.job_status = 'accepted'
+                application.is_approve = True
+                application.contract_status = 'pending'
+                application.updated_at = timezone.now()
+            JobApplication.objects.bulk_update(approved, ['job_status', 'is_approve', 'contract_status', 'updated_at'])
+            # bulk writes skip the counter signals, recount once for the batch
+            VacancyStats.recount([vacancy.id])
+
+            # one insert for the batch, pushed once the transaction commits
+            with NotificationBatch() as batch:
+                for application in approved:
+                    batch.add(application.applicant.user_id, f"Your application for {vacancy.job_title} has been approved")
+
+            # all contracts of the batch go to the worker as one task
+            approved_ids = [application.id for application in approved]
+            if approved_ids:
+                transaction.on_commit(lambda: generate_job_contracts_task.delay(approved_ids))
+
+        response_data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "message": "Job applications approved",
+            "data": {"approved": approved_ids, "skipped": sorted(skipped)}
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+class JobReportExportView(APIView):
+    def get(self, request):
+        """DOWNLOAD THE COMPANY JOB REPORTS AS CSV OR XLSX"""
+        client = CompanyProfile.objects.filter(user=request.user).first()
+        if not client:
+            return Response({"error": "Only client can export job reports"}, status=status.HTTP_403_FORBIDDEN)
+        staff = request.query_params.get('staff')
+        try:
+            file_format, start, end = exports.export_params(request.query_params)
+            if staff and not staff.isdigit():
+                raise ValueError("staff must be a staff id")
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = exports.payroll_rows(company=client, staff=int(staff) if staff else None, start=start, end=end)
+        return exports.payroll_response(rows, file_format, 'job_reports')
+
+
+class JobContractView(APIView):
+    def get(self, request, pk):
+        """CONTRACT STATUS OF AN APPROVED APPLICATION"""
+        user = request.user
+        application = JobApplication.objects.select_related(
+            'applicant__user',
+            'vacancy__job__company__user'
+        ).filter(id=pk).first()
+        if not application:
+            return Response({"error": "Job application not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if user != application.applicant.user and user != application.vacancy.job.company.user:
+            return Response({"error": "You are not authorized to access this contract"}, status=status.HTTP_403_FORBIDDEN)
+
+        response_data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "message": "Job contract status",
+            "data": {
+                "application_id": application.id,
+                "contract_status": application.contract_state(),
+                "contract_url": default_storage.url(application.contract_file) if application.contract_file else None,
+            }
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+class VacancyContractsView(APIView):
+    def get(self, request, vacancy_id):
+        """ALL CONTRACTS OF A VACANCY AS ONE PDF, RENDERED IN THE BACKGROUND, POLL UNTIL THE URL IS SET"""
+        user = request.user
+        client = CompanyProfile.objects.filter(user=user).first()
+        vacancy = Vacancy.objects.filter(id=vacancy_id, job__company=client).first()
+        if not client or not vacancy:
+            return Response({"error": "Vacancy not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        pdf_filename = vacancy_contracts_name(vacancy.id)
+        if not pdf_filename:
+            return Response({"error": "No approved applications for this vacancy"}, status=status.HTTP_404_NOT_FOUND)
+
+        if default_storage.exists(pdf_filename):
+            contract_status, contract_url = 'sent', default_storage.url(pdf_filename)
+        else:
+            # queue once per version, polling while it renders does not queue it again
+            if cache.add(f'vacancy_contracts_{pdf_filename}', True, 60 * 10):
+                generate_vacancy_contracts_task.delay(vacancy.id)
+            contract_status, contract_url = 'processing', None
+
+        response_data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "message": "Vacancy contracts status",
+            "data": {
+                "vacancy_id": vacancy.id,
+                "contract_status": contract_status,
+                "contract_url": contract_url,
+            }
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
 class CheckInView(APIView):
 
     def get(self, request, vacancy_id=None, *args, **kwargs):
@@ -664,6 +814,8 @@ class CheckInView(APIView):
                 "time": created_at.strftime('%H:%M:%S'),
                 "job_status": application.job_status,
                 "checkin_approved": application.checkin_approve,
+                "distance": obj.distance,
+                "within_geofence": obj.within_geofence,
             })
 
         return Response({
@@ -716,7 +868,7 @@ class CheckInView(APIView):
             checkin.checkin_status = 'declined'
             checkin.save()
             # send notification to staff
-            Notification.objects.create(
+            notify(
                 user = application.applicant.user,
                 message = f"Your check-in request for {application.vacancy.job_title} has been declined",
             )
@@ -736,7 +888,7 @@ class CheckInView(APIView):
         application.checkin_location = checkin.location
         application.save()
         # send notification to staff
-        Notification.objects.create(
+        notify(
             user = application.applicant.user,
             message = f"Your check-in request for {application.vacancy.job_title} has been approved",
         )
@@ -791,6 +943,8 @@ class CheckOutView(APIView):
                 "job_status": application.job_status,
                 "checkin_approved": application.checkin_approve,
                 "checkout_approved": application.checkout_approve,
+                "distance": obj.distance,
+                "within_geofence": obj.within_geofence,
 
             }
             checkin_requests.append(obj)
@@ -845,7 +999,7 @@ class CheckOutView(APIView):
             checkout.checkout_status = 'declined'
             checkout.save()
             # send notification to staff
-            Notification.objects.create(
+            notify(
                 user = application.applicant.user,
                 message = f"Your check-out request for {application.vacancy.job_title} has been declined",
             )
@@ -872,7 +1026,7 @@ class CheckOutView(APIView):
         
         
         # send notification to staff
-        Notification.objects.create(
+        notify(
             user = application.applicant.user,
             message = f"Your check-out request for {application.vacancy.job_title} has been approved",
         )
@@ -903,7 +1057,7 @@ class JobAdsView(APIView):
             }
             return Response(response, status=status.HTTP_200_OK)
         
-        permanent_jobs = JobAds.objects.filter(company=company)
+        permanent_jobs = JobAds.objects.filter(company=company).select_related('company').prefetch_related('skills')
         
         serializer = PermanentJobsSerializer(permanent_jobs, many=True)
         response_data = {
@@ -992,7 +1146,7 @@ class ShiftCheckinAcceptView(APIView):
                 daily_shift.checkin_status = True
                 daily_shift.checkin_time = timezone.now()
                 daily_shift.save()
-                notification = Notification.objects.create(
+                notification = notify(
                 user = daily_shift.staff.user,
                 message = f"Your check-in request for  has been approved", # need to add the 
                 
@@ -1006,7 +1160,7 @@ class ShiftCheckinAcceptView(APIView):
                 daily_shift.checkout_status = True
                 daily_shift.checkout_time = timezone.now()
                 daily_shift.save()
-                notification = Notification.objects.create(
+                notification = notify(
                 user = daily_shift.staff.user,
                 message = f"Your check-out request for  has been approved", 
                 )
@@ -1021,11 +1175,11 @@ class ShiftCheckinAcceptView(APIView):
             return Response(response_data, status=status.HTTP_200_OK)
 
 class FavouriteStaffView(APIView):
-    def get(self, request):
+    def get(self, request, *args, **kwargs):
         user = request.user
         company = get_object_or_404(CompanyProfile, user=user)
 
-        favourites = FavouriteStaff.objects.filter(company = company)
+        favourites = FavouriteStaff.objects.filter(company = company).select_related('staff__user', 'staff__role')
         if not favourites:
             response = {
                 "status": status.HTTP_404_NOT_FOUND,
@@ -1071,7 +1225,7 @@ class FavouriteStaffView(APIView):
         company = get_object_or_404(CompanyProfile, user=user)
 
         try:
-            staff = Staff.objects.select_related('user','role').prefetch_related('skills','experience').get(id=pk)
+            staff = Staff.objects.only('id').get(id=pk)
         except Staff.DoesNotExist:
             response = {
                 "status": status.HTTP_404_NOT_FOUND,
@@ -1080,11 +1234,9 @@ class FavouriteStaffView(APIView):
             }
             return Response(response,status=status.HTTP_404_NOT_FOUND)
         
-        favourite_staff = FavouriteStaff.objects.filter(company=company, staff=staff).first() 
-
         # if already added then remove it 
-        if favourite_staff:
-            favourite_staff.delete()
+        removed, _ = FavouriteStaff.objects.filter(company=company, staff=staff).delete()
+        if removed:
             response = {
                 "status": status.HTTP_200_OK,
                 "success": True,
@@ -1092,7 +1244,8 @@ class FavouriteStaffView(APIView):
             }
             return Response(response, status=status.HTTP_200_OK)
         else:
-            favourite_staff = FavouriteStaff.objects.create(company=company, staff=staff)
+            # a double tap lands on the unique constraint, get_or_create keeps it a no-op
+            FavouriteStaff.objects.get_or_create(company=company, staff=staff)
             response = {
                 "status": status.HTTP_201_CREATED,
                 "success": True,
@@ -1105,7 +1258,7 @@ class MyStaffView(APIView):
     def get(self, request, pk=None):
         user = request.user
         company = get_object_or_404(CompanyProfile, user=user)
-        mystaff = MyStaff.objects.filter(client=company, status = True)
+        mystaff = StaffSerializer.prefetch(MyStaff.objects.filter(client=company, status = True).select_related('client'), 'staff__')
         serializer = MyStaffSerializer(mystaff, many=True)
         response = {
             "status": status.HTTP_200_OK,
@@ -1118,13 +1271,16 @@ class MyStaffView(APIView):
 
 
 class CompanyReviewView(APIView):
-    def get(self, request):
+    def get(self, request, *args, **kwargs):
         user = request.user
         if user.is_client:
             client = get_object_or_404(CompanyProfile, user=user)
-            reviews = CompanyReview.objects.filter(review_for=client)
-            # calculate avg rating 
-            avg_rating = reviews.aggregate(Avg('rating'))['rating__avg']
+            reviews = (
+                CompanyReview.objects.filter(review_for=client)
+                .select_related('review_by', 'review_for', 'application')
+                .prefetch_related('review_by__skills', 'review_by__experience')
+            )
+            avg_rating = client.avg_rating
             serializer = CompanyReviewSerializer(reviews, many=True)
 
             response = {
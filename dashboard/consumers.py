@@ -1,7 +1,11 @@
 # notifications/consumers.py
+import asyncio
 import json
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from . import notifications, presence
+
 class NotificationConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
         user = self.scope['user']
@@ -11,6 +15,14 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
             self.group_name = f"user_{user.id}_notifications"
             await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
+            await presence.connected(presence.NOTIFICATIONS, user.id, self.channel_name)
+            self.heartbeat = asyncio.ensure_future(
+                presence.keep_alive(presence.NOTIFICATIONS, user.id, self.channel_name)
+            )
+            # what was held while the user had no socket, as one digest
+            held = await sync_to_async(notifications.take_held)(user.id)
+            if held:
+                await self.send_json(notifications.digest_content(held))
         else:
             await self.close()
 
@@ -18,6 +30,9 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
         user = self.scope['user']
         if user and user.is_authenticated:
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            if hasattr(self, "heartbeat"):
+                self.heartbeat.cancel()
+                await presence.disconnected(presence.NOTIFICATIONS, user.id, self.channel_name)
 
     async def send_notification(self, event):
         await self.send_json(event["content"])
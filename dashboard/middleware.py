@@ -1,7 +1,13 @@
 # notifications/middleware.py
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from urllib.parse import parse_qs
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.db import close_old_connections
@@ -10,13 +16,110 @@ from channels.middleware import BaseMiddleware
 
 User = get_user_model()
 
+# reconnects with the same token within the ttl skip the user query
+TOKEN_USER_CACHE_SIZE = 2048
+TOKEN_USER_CACHE_TTL = 60
+
+
+@dataclass
+class UserSnapshot:
+    """The few user fields the consumers need, cached instead of a full User."""
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    is_client: bool
+    is_staff: bool
+    is_active: bool
+
+    is_authenticated = True
+    is_anonymous = False
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return f'{self.first_name} {self.last_name} {self.email}'
+
+
+class TokenUserCache:
+    """Per process LRU of token jti -> UserSnapshot, entries expire after ttl seconds."""
+
+    def __init__(self, maxsize=TOKEN_USER_CACHE_SIZE, ttl=TOKEN_USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, jti):
+        with self.lock:
+            entry = self.entries.get(jti)
+            if entry is None:
+                return None
+            snapshot, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[jti]
+                return None
+            self.entries.move_to_end(jti)
+            return snapshot
+
+    def set(self, jti, snapshot):
+        with self.lock:
+            self.entries[jti] = (snapshot, time.monotonic() + self.ttl)
+            self.entries.move_to_end(jti)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard(self, jti):
+        with self.lock:
+            self.entries.pop(jti, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_users = TokenUserCache()
+
+
+def revoked_key(jti):
+    return f"ws_token_revoked_{jti}"
+
+
+def revoke_token(token):
+    """Refuse websocket connects with this token until it expires, called on logout."""
+    jti = token.get("jti")
+    if not jti:
+        return
+    # the default cache is redis (settings.CACHES), every asgi worker checks the marker before its own lru
+    timeout = max(int(token.get("exp", 0) - time.time()), 1)
+    cache.set(revoked_key(jti), True, timeout)
+    token_users.discard(jti)
+
+
 @database_sync_to_async
 def get_user(validated_token):
-    try:
-        user_id = validated_token.get("user_id")
-        return User.objects.get(id=user_id)
-    except User.DoesNotExist:
+    user_id = validated_token.get("user_id")
+    row = (
+        User.objects.filter(id=user_id)
+        .values("id", "email", "first_name", "last_name", "is_client", "is_staff", "is_active")
+        .first()
+    )
+    return UserSnapshot(**row) if row else None
+
+
+async def get_token_user(validated_token):
+    jti = validated_token.get("jti")
+    if jti and await cache.aget(revoked_key(jti)):
         return None
+    user = token_users.get(jti) if jti else None
+    if user is None:
+        user = await get_user(validated_token)
+        if user and jti:
+            token_users.set(jti, user)
+    return user
+
 
 class JWTAuthMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
@@ -24,17 +127,18 @@ class JWTAuthMiddleware(BaseMiddleware):
         query_string = parse_qs(scope["query_string"].decode())
         token = query_string.get("token", [None])[0]
 
+        # AnonymousUser rather than None, AuthMiddleware below sets attributes on it
         if token is None:
-            scope["user"] = None
+            scope["user"] = AnonymousUser()
             return await super().__call__(scope, receive, send)
 
         try:
             validated_token = UntypedToken(token)
-            scope["user"] = await get_user(validated_token)
+            scope["user"] = await get_token_user(validated_token) or AnonymousUser()
         except (InvalidToken, TokenError):
-            scope["user"] = None
+            scope["user"] = AnonymousUser()
 
         return await super().__call__(scope, receive, send)
 
 def JWTAuthMiddlewareStack(inner):
-    return JWTAuthMiddleware(AuthMiddlewareStack(inner))
\ No newline at end of file
+    return JWTAuthMiddleware(AuthMiddlewareStack(inner))
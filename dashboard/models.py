@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.core.cache import cache
 
 
 User = get_user_model()
@@ -8,6 +9,9 @@ from staff.models import Staff
 from client.models import CompanyProfile, Vacancy
 from project.s3bucket import CustomS3Storage
 
+# bounds a count refilled by a read racing an uncommitted write
+UNREAD_COUNT_TIMEOUT = 60 * 5
+
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)# to whom
     message = models.CharField(max_length=255)
@@ -18,10 +22,37 @@ class Notification(models.Model):
     class Meta:
         verbose_name_plural = 'Notifications'   
         ordering = ['-created_at']
+        indexes = [
+            # unread counter and unread filters
+            models.Index(fields=['user', 'is_read', 'created_at']),
+            # inbox cursor pagination on (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f'{self.user.first_name} {self.user.last_name} - {self.message[:20]}...'
 
+    @staticmethod
+    def unread_cache_key(user_id):
+        return f'notifications_unread_{user_id}'
+
+    @classmethod
+    def unread_count(cls, user_id):
+        """Unread notifications of the user, kept in the shared cache until the next write"""
+        return cache.get_or_set(
+            cls.unread_cache_key(user_id),
+            lambda: cls.objects.filter(user_id=user_id, is_read=False).count(),
+            UNREAD_COUNT_TIMEOUT,
+        )
+
+    @classmethod
+    def clear_unread_count(cls, *user_ids):
+        # bulk_create / update() skip the signals, call this after them
+        keys = [cls.unread_cache_key(user_id) for user_id in user_ids]
+        cache.delete_many(keys)
+        # again once committed, a read in between cached the count from before the write
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
 class Report(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     type = models.CharField(max_length=100)
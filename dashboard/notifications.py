@@ -0,0 +1,154 @@
+# notification service, buffered inserts and one channels pass per batch
+import asyncio
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import transaction
+
+from . import presence
+from .models import Notification
+
+
+# live pushes per user in a window, the rest is sent as one digest when the window closes
+# the counters live in the shared (redis) cache, the digest task reads them from a celery worker
+BURST_LIMIT = 5
+BURST_WINDOW = 60
+# notifications of a user without a socket are counted until the next connect, one digest then
+OFFLINE_HOLD_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def user_group(user_id):
+    return f"user_{user_id}_notifications"
+
+
+def notification_event(content):
+    return {"type": "send_notification", "content": content}
+
+
+def _content(notification):
+    return {
+        "id": notification.id,
+        "message": notification.message,
+        "link": notification.link,
+    }
+
+
+def send_events(events):
+    """group_send every (user_id, event) pair inside a single event loop."""
+    channel_layer = get_channel_layer()
+    if not events or channel_layer is None:
+        return
+
+    async def send_all():
+        await asyncio.gather(*(channel_layer.group_send(user_group(user_id), event) for user_id, event in events))
+
+    async_to_sync(send_all)()
+
+
+def _live_slots(user_id, count):
+    # how many of count notifications still fit in the user's live budget
+    key = f"notifications_burst_{user_id}"
+    cache.add(key, 0, BURST_WINDOW)
+    sent = cache.incr(key, count)
+    return max(0, min(count, BURST_LIMIT - (sent - count)))
+
+
+def _hold(user_id, count):
+    from .tasks import send_notification_digest
+
+    cache.add(f"notifications_held_{user_id}", 0, BURST_WINDOW * 2)
+    cache.incr(f"notifications_held_{user_id}", count)
+    # first held notification of the window schedules the digest
+    if cache.add(f"notifications_digest_{user_id}", True, BURST_WINDOW):
+        send_notification_digest.apply_async((user_id,), countdown=BURST_WINDOW)
+
+
+def hold_offline(user_id, count):
+    """Count notifications for a user without a socket, sent as one digest on the next connect."""
+    cache.add(f"notifications_offline_{user_id}", 0, OFFLINE_HOLD_TIMEOUT)
+    cache.incr(f"notifications_offline_{user_id}", count)
+
+
+def _take(key):
+    count = cache.get(key, 0)
+    if count:
+        # decr instead of delete, a hold counted meanwhile stays for the next digest
+        try:
+            cache.decr(key, count)
+        except ValueError:
+            pass
+    return count
+
+
+def take_held(user_id):
+    """Number of notifications held back for the user, resets the window."""
+    # a hold landing from here on schedules the next digest
+    cache.delete(f"notifications_digest_{user_id}")
+    return _take(f"notifications_held_{user_id}") + _take(f"notifications_offline_{user_id}")
+
+
+def digest_content(count):
+    return {"message": f"You have {count} new notifications", "count": count, "digest": True}
+
+
+def push(notifications):
+    """Push saved notifications to the users' sockets, bursts are coalesced into a digest.
+
+    users without a notification socket get no publish, their count waits for their next connect
+    """
+    by_user = defaultdict(list)
+    for notification in notifications:
+        by_user[notification.user_id].append(notification)
+
+    online = presence.online_users(by_user)
+    events = []
+    for user_id, items in by_user.items():
+        if user_id not in online:
+            hold_offline(user_id, len(items))
+            continue
+        live = _live_slots(user_id, len(items))
+        events.extend((user_id, notification_event(_content(notification))) for notification in items[:live])
+        if len(items) > live:
+            _hold(user_id, len(items) - live)
+    send_events(events)
+
+
+class NotificationBatch:
+    """Collect notifications and write them with one bulk_create, pushed after commit.
+
+    with NotificationBatch() as batch:
+        for staff in invited:
+            batch.add(staff.user, "...")
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def add(self, user, message, link=None):
+        user_id = getattr(user, "id", user)
+        self.pending.append(Notification(user_id=user_id, message=message, link=link))
+
+    def flush(self):
+        if not self.pending:
+            return []
+        created = Notification.objects.bulk_create(self.pending)
+        self.pending = []
+        Notification.clear_unread_count(*{notification.user_id for notification in created})
+        transaction.on_commit(lambda: push(created))
+        return created
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+
+def notify(user, message, link=None):
+    """Save and push a single notification."""
+    batch = NotificationBatch()
+    batch.add(user, message, link)
+    return batch.flush()[0]
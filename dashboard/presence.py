@@ -0,0 +1,124 @@
+# who has an open websocket, one redis sorted set per user and socket kind, members expire without heartbeat
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+
+
+NOTIFICATIONS = 'notifications'
+CHAT = 'chat'
+# any open socket shows a user as online to chat peers
+ONLINE_KINDS = (NOTIFICATIONS, CHAT)
+# a connection counts as online this long after its last heartbeat
+PRESENCE_TTL = 120
+HEARTBEAT_INTERVAL = 45
+
+
+class LocalPresence:
+    """In-process registry, used with the in-memory channel layer (tests, runserver)."""
+
+    def __init__(self):
+        self.connections = defaultdict(dict)
+        self.lock = threading.Lock()
+
+    async def add(self, kind, user_id, connection_id):
+        with self.lock:
+            self.connections[(kind, user_id)][connection_id] = time.time() + PRESENCE_TTL
+
+    async def remove(self, kind, user_id, connection_id):
+        with self.lock:
+            self.connections[(kind, user_id)].pop(connection_id, None)
+
+    def online(self, kind, user_ids):
+        now = time.time()
+        with self.lock:
+            return {
+                user_id for user_id in user_ids
+                if any(expires_at > now for expires_at in self.connections.get((kind, user_id), {}).values())
+            }
+
+    def clear(self):
+        with self.lock:
+            self.connections.clear()
+
+
+class RedisPresence:
+    def __init__(self, url):
+        self.url = url
+
+    @staticmethod
+    def key(kind, user_id):
+        return f'presence:{kind}:{user_id}'
+
+    @property
+    def async_client(self):
+        # consumers run on one event loop per process, the client is created on it
+        if not hasattr(self, '_async_client'):
+            import redis.asyncio
+            self._async_client = redis.asyncio.from_url(self.url)
+        return self._async_client
+
+    @property
+    def client(self):
+        if not hasattr(self, '_client'):
+            import redis
+            self._client = redis.from_url(self.url)
+        return self._client
+
+    async def add(self, kind, user_id, connection_id):
+        key = self.key(kind, user_id)
+        async with self.async_client.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {connection_id: time.time() + PRESENCE_TTL})
+            pipe.expire(key, PRESENCE_TTL)
+            await pipe.execute()
+
+    async def remove(self, kind, user_id, connection_id):
+        await self.async_client.zrem(self.key(kind, user_id), connection_id)
+
+    def online(self, kind, user_ids):
+        user_ids = list(user_ids)
+        now = time.time()
+        # one round trip for the whole batch of users
+        with self.client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                key = self.key(kind, user_id)
+                pipe.zremrangebyscore(key, '-inf', now)
+                pipe.zcard(key)
+            counts = pipe.execute()[1::2]
+        return {user_id for user_id, count in zip(user_ids, counts) if count}
+
+
+@lru_cache(maxsize=None)
+def get_registry():
+    backend = settings.CHANNEL_LAYERS.get('default', {}).get('BACKEND', '')
+    url = getattr(settings, 'PRESENCE_REDIS_URL', None)
+    if backend.endswith('InMemoryChannelLayer') or not url:
+        return LocalPresence()
+    return RedisPresence(url)
+
+
+async def connected(kind, user_id, connection_id):
+    await get_registry().add(kind, user_id, connection_id)
+
+
+async def disconnected(kind, user_id, connection_id):
+    await get_registry().remove(kind, user_id, connection_id)
+
+
+async def keep_alive(kind, user_id, connection_id):
+    """Refresh the connection until the task is cancelled on disconnect."""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        await connected(kind, user_id, connection_id)
+
+
+def online_users(user_ids, kinds=(NOTIFICATIONS,)):
+    """Users of user_ids with at least one live socket of the given kinds."""
+    user_ids = set(user_ids)
+    online = set()
+    for kind in kinds:
+        online |= get_registry().online(kind, user_ids - online)
+    return online
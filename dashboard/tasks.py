@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from . import notifications, presence
+
+
+@shared_task
+def send_notification_digest(user_id):
+    """ONE PUSH FOR THE NOTIFICATIONS HELD BACK DURING A BURST"""
+    count = notifications.take_held(user_id)
+    if not count:
+        return
+    if presence.online_users([user_id]):
+        notifications.send_events([(user_id, notifications.notification_event(notifications.digest_content(count)))])
+    else:
+        # went offline during the burst, the digest goes out on the next connect
+        notifications.hold_offline(user_id, count)
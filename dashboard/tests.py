@@ -1,3 +1,311 @@
+from datetime import date, time
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, UntypedToken
+
+from users.models import User, JobRole, Skill
+from staff.models import Staff
+from client.models import CompanyProfile, CompanyJobSummary, Job, Vacancy, JobApplication
+from client.tasks import refresh_company_job_summaries
+from client import geohash
+from . import notifications, presence
+from .middleware import get_token_user, revoke_token, token_users
+from .models import Notification
+from .notifications import NotificationBatch, BURST_LIMIT
+from .routing import websocket_urlpatterns
+from .tasks import send_notification_digest
+
+
+class CompanySummaryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="client@user.com", phone_number="123", first_name="Test", last_name="User", password="foo", is_client=True
+        )
+        self.company = CompanyProfile.objects.create(
+            user=self.user, company_name="Company", contact_number="123",
+            company_email="company@user.com", billing_email="billing@user.com", company_address="Oslo",
+        )
+        role = JobRole.objects.create(name="Waiter", staff_price=200, client_price=300)
+        job = Job.objects.create(company=self.company, title="Dinner")
+        self.vacancy = Vacancy.objects.create(
+            job=job, job_title=role, open_date=date.today(), close_date=date.today(), start_time=time(9), end_time=time(17),
+        )
+        Vacancy.objects.create(
+            job=job, job_title=role, job_status="draft", open_date=date.today(), close_date=date.today(),
+            start_time=time(9), end_time=time(17),
+        )
+        staff_user = User.objects.create_user(
+            email="staff@user.com", phone_number="123", first_name="Test", last_name="User", password="foo", is_staff=True
+        )
+        staff = Staff.objects.create(user=staff_user, role=role, dob=date(2000, 1, 1))
+        JobApplication.objects.create(vacancy=self.vacancy, applicant=staff)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_status_count_follows_vacancies(self):
+        self.vacancy.job_status = "finished"
+        self.vacancy.save()
+
+        with self.assertNumQueries(1):
+            response = self.api.get("/api/v1/app/dashboard/jobs/status-count/")
+        self.assertEqual(response.data["data"], {"active": 0, "progress": 0, "draft": 1, "cancelled": 0, "finished": 1})
+        self.assertIsNotNone(response.data["updated_at"])
+
+        response = self.api.get("/api/v1/app/dashboard/statistics/")
+        self.assertEqual(response.data["data"], {"total_applicant": 1, "total_job": 1})
+
+    def test_refresh_task_fixes_drift(self):
+        Vacancy.objects.filter(id=self.vacancy.id).update(job_status="cancelled")
+        refresh_company_job_summaries()
+        summary = CompanyJobSummary.objects.get(company=self.company)
+        self.assertEqual((summary.active, summary.cancelled), (0, 1))
+
+
+class NearbyJobTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(
+            email="client@user.com", phone_number="123", first_name="Test", last_name="User", password="foo", is_client=True
+        )
+        company = CompanyProfile.objects.create(
+            user=user, company_name="Company", contact_number="123",
+            company_email="company@user.com", billing_email="billing@user.com", company_address="Oslo",
+        )
+        role = JobRole.objects.create(name="Waiter", staff_price=200, client_price=300)
+        job = Job.objects.create(company=company, title="Dinner")
+
+        def vacancy(latitude, longitude, **extra):
+            return Vacancy.objects.create(
+                job=job, job_title=role, open_date=date.today(), close_date=date.today(),
+                start_time=time(9), end_time=time(17), latitude=latitude, longitude=longitude, **extra
+            )
+
+        # around Oslo central station
+        self.near = vacancy("59.915000", "10.752000")
+        self.mid = vacancy("59.935000", "10.752000")
+        vacancy("59.935000", "10.752000", job_status="draft")
+        vacancy("60.200000", "10.752000")
+        vacancy(None, None)
+        self.api = APIClient()
+        self.api.force_authenticate(user)
+
+    def test_geohash_encode(self):
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(self.near.geohash, geohash.encode(59.915, 10.752))
+
+    def test_radius_query_sorted_by_distance(self):
+        params = {"latitude": "59.911491", "longitude": "10.750000", "radius": 5000}
+        with self.assertNumQueries(2):
+            response = self.api.get("/api/v1/app/dashboard/jobs/nearby/", params)
+        self.assertEqual([job["id"] for job in response.data["data"]], [self.near.id, self.mid.id])
+        self.assertLess(response.data["data"][0]["distance"], response.data["data"][1]["distance"])
+
+        response = self.api.get("/api/v1/app/dashboard/jobs/nearby/", {"latitude": "59.9"})
+        self.assertEqual(response.status_code, 400)
+
+
+class StaffFeedTests(TestCase):
+
+    def setUp(self):
+        client_user = User.objects.create_user(
+            email="client@user.com", phone_number="123", first_name="Test", last_name="User", password="foo", is_client=True
+        )
+        company = CompanyProfile.objects.create(
+            user=client_user, company_name="Company", contact_number="123",
+            company_email="company@user.com", billing_email="billing@user.com", company_address="Oslo",
+        )
+        role = JobRole.objects.create(name="Waiter", staff_price=200, client_price=300)
+        job = Job.objects.create(company=company, title="Dinner")
+        for _ in range(25):
+            Vacancy.objects.create(
+                job=job, job_title=role, open_date=date.today(), close_date=date.today(), start_time=time(9), end_time=time(17),
+            )
+        staff_user = User.objects.create_user(
+            email="staff@user.com", phone_number="123", first_name="Test", last_name="User", password="foo", is_staff=True
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(staff_user)
+
+    def test_keyset_pages_with_projection(self):
+        with self.assertNumQueries(2):
+            response = self.api.get("/api/v1/app/dashboard/jobs/")
+        self.assertEqual(len(response.data["data"]), 20)
+        first = response.data["data"][0]
+        self.assertEqual((first["job_name"], first["company_name"]), ("Dinner", "Company"))
+        self.assertNotIn("participants", first)
+
+        response = self.api.get(response.data["next"])
+        self.assertEqual(len(response.data["data"]), 5)
+        self.assertIsNone(response.data["next"])
+
+        with self.assertNumQueries(1):
+            response = self.api.get("/api/v1/app/dashboard/jobs/", {"fields": "id,open_date", "limit": 5})
+        self.assertEqual(set(response.data["data"][0]), {"id", "open_date"})
+        self.assertEqual(self.api.get("/api/v1/app/dashboard/jobs/", {"fields": "id,password"}).status_code, 400)
+
+
+class VacancySearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="client@user.com", phone_number="123", first_name="Test", last_name="User", password="foo", is_client=True
+        )
+        company = CompanyProfile.objects.create(
+            user=self.user, company_name="Company", contact_number="123",
+            company_email="company@user.com", billing_email="billing@user.com", company_address="Oslo",
+        )
+        role = JobRole.objects.create(name="Waiter", staff_price=200, client_price=300)
+        self.job = Job.objects.create(company=company, title="Dinner")
+        self.vacancy = Vacancy.objects.create(
+            job=self.job, job_title=role, open_date=date.today(), close_date=date.today(),
+            start_time=time(9), end_time=time(17), location="Grunerlokka",
+        )
+        self.vacancy.skills.add(Skill.objects.create(name="Bartending"))
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def search(self, text):
+        response = self.api.get("/api/v1/app/dashboard/jobs/", {"search": text})
+        return [job["id"] for job in response.data["data"]]
+
+    def test_search_text_follows_related_changes(self):
+        self.assertEqual(self.search("bart grun"), [self.vacancy.id])
+        self.assertEqual(self.search("waiter"), [self.vacancy.id])
+        self.assertEqual(self.search("lunch"), [])
+
+        self.job.title = "Lunch"
+        self.job.save()
+        self.assertEqual(self.search("lunch"), [self.vacancy.id])
+
+
+class NotificationInboxTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="user@user.com", phone_number="123", first_name="Test", last_name="User", password="foo"
+        )
+        for i in range(15):
+            Notification.objects.create(user=self.user, message=f"message {i}")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_cursor_pages_and_unread_counter(self):
+        response = self.api.get("/api/v1/app/dashboard/notification/")
+        self.assertEqual(len(response.data["data"]), 10)
+        self.assertEqual(response.data["data"][0]["message"], "message 14")
+        self.assertEqual(response.data["unread_count"], 15)
+
+        response = self.api.get(response.data["next"])
+        self.assertEqual(len(response.data["data"]), 5)
+        self.assertIsNone(response.data["next"])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Notification.unread_count(self.user.id), 15)
+
+        self.api.post("/api/v1/app/dashboard/notification/", {"all": True}, format="json")
+        self.assertEqual(Notification.unread_count(self.user.id), 0)
+        Notification.objects.create(user=self.user, message="new")
+        self.assertEqual(Notification.unread_count(self.user.id), 1)
+
+    def test_count_cached_before_commit_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.user, message="new")
+            # a read racing the write, it still sees the old rows
+            cache.set(Notification.unread_cache_key(self.user.id), 15)
+        self.assertEqual(Notification.unread_count(self.user.id), 16)
+
+
+class NotificationBatchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        presence.get_registry().clear()
+        self.user = User.objects.create_user(
+            email="user@user.com", phone_number="123", first_name="Test", last_name="User", password="foo"
+        )
+
+    def test_burst_is_written_once_and_coalesced(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"user_{self.user.id}_notifications", channel)
+        async_to_sync(presence.connected)(presence.NOTIFICATIONS, self.user.id, channel)
+
+        with patch("dashboard.tasks.send_notification_digest.apply_async") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertNumQueries(1):
+                    with NotificationBatch() as batch:
+                        for i in range(BURST_LIMIT + 2):
+                            batch.add(self.user, f"check-in {i}")
+        schedule.assert_called_once()
+        send_notification_digest(self.user.id)
+
+        events = [async_to_sync(layer.receive)(channel) for _ in range(BURST_LIMIT + 1)]
+        self.assertEqual(events[0]["content"]["message"], "check-in 0")
+        self.assertEqual(events[-1]["content"]["count"], 2)
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), BURST_LIMIT + 2)
+
+    def test_digest_resets_the_window(self):
+        with patch("dashboard.tasks.send_notification_digest.apply_async") as schedule:
+            notifications._hold(self.user.id, 3)
+            notifications._hold(self.user.id, 1)
+            self.assertEqual(notifications.take_held(self.user.id), 4)
+            self.assertEqual(notifications.take_held(self.user.id), 0)
+            notifications._hold(self.user.id, 2)
+        self.assertEqual(schedule.call_count, 2)
+        self.assertEqual(notifications.take_held(self.user.id), 2)
+
+    def test_offline_user_gets_digest_on_connect(self):
+        layer = get_channel_layer()
+        with patch.object(layer, "group_send") as group_send, \
+                patch("dashboard.tasks.send_notification_digest.apply_async") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                with NotificationBatch() as batch:
+                    batch.add(self.user, "check-in")
+                    batch.add(self.user, "check-out")
+        group_send.assert_not_called()
+        schedule.assert_not_called()
+
+        async def reconnect():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/notifications/")
+            communicator.scope["user"] = self.user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            digest = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return digest
+
+        self.assertEqual(async_to_sync(reconnect)(), notifications.digest_content(2))
+        self.assertEqual(notifications.take_held(self.user.id), 0)
+
+
+class WebsocketTokenCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_users.clear()
+        self.user = User.objects.create_user(
+            email="user@user.com", phone_number="123", first_name="Test", last_name="User", password="foo"
+        )
+        self.token = AccessToken.for_user(self.user)
+
+    def test_reconnect_uses_cache_until_logout(self):
+        validated = UntypedToken(str(self.token))
+        with self.assertNumQueries(1):
+            first = async_to_sync(get_token_user)(validated)
+        with self.assertNumQueries(0):
+            second = async_to_sync(get_token_user)(validated)
+        self.assertEqual(first.id, self.user.id)
+        self.assertIs(first, second)
 
-# Create your tests here.
+        revoke_token(self.token)
+        self.assertIsNone(async_to_sync(get_token_user)(validated))
@@ -4,11 +4,14 @@ from . import views
 urlpatterns = [
     path('dashboard/notification/', views.NotificationView.as_view()),
     path('dashboard/notification/<int:pk>/', views.NotificationView.as_view()),
+    path('dashboard/notification/unread-count/', views.NotificationUnreadCountView.as_view()),
     path('dashboard/skills/', views.SkillView.as_view()),
 
     path('dashboard/jobs/', views.FeedJobView.as_view()),
     path('dashboard/jobs/<int:pk>/', views.FeedJobView.as_view()),
+    path('dashboard/jobs/nearby/', views.NearbyJobView.as_view()),
     path('dashboard/jobs/status-count/', views.JobCountAPI.as_view()),
+    path('dashboard/statistics/', views.StatisticsAPIView.as_view()),
 
     path('job/templates/', views.GetJobTemplateAPIView.as_view()),
     path('job/templates/<int:pk>/', views.GetJobTemplateAPIView.as_view()),
@@ -10,11 +10,13 @@ from django.core.cache import cache
 from rest_framework import status, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 
 # Create your views here.
+from .notifications import notify, send_events, notification_event, hold_offline
+from .presence import online_users
 from .models import (
     Notification,
     Report,
@@ -37,46 +39,61 @@ from client.models import (
     Job,
     JobTemplate,
     JobApplication,
-    FavouriteStaff,
+    CompanyJobSummary,
 )
 from client.serializers import (
-    VacancySerializer,
+    FeedVacancySerializer,
     JobTemplateSserializers,
     JobApplicationSerializer,
+    JobSerializer,
 )
+from client import favourites, geo
+from client import search as vacancy_search
 from staff.models import Staff
 from users.models import Skill
 
 
+class NotificationPagination(CursorPagination):
+    # keyset on (created_at, id), no COUNT(*) over the whole history
+    page_size = 10
+    ordering = ("-created_at", "-id")
+
+
+class FeedPagination(CursorPagination):
+    # keyset on (created_at, id), pages stay cheap however many vacancies are active
+    page_size = 20
+    page_size_query_param = "limit"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+
 class NotificationView(APIView):
-    def get(self, request):
+    def get(self, request, *args, **kwargs):
         user = request.user
 
-        notifications = Notification.objects.filter(user=user).order_by("-created_at")
+        notifications = Notification.objects.filter(user=user)
 
-        # add pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10
-
-        result = paginator.paginate_queryset(notifications, request)
+        paginator = NotificationPagination()
+        result = paginator.paginate_queryset(notifications, request, view=self)
         serializer = NotificationSerializer(result, many=True)
         response_data = {
             "status": status.HTTP_200_OK,
             "success": True,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "unread_count": Notification.unread_count(user.id),
             "data": serializer.data,
         }
         return Response(response_data, status=status.HTTP_200_OK)
 
     def post(self, request, pk=None):
         user = request.user
-        notification = Notification.objects.filter(user=user, id=pk).first()
         # mark all read
         data = request.data
-        if data["all"] == True:
-            notifications = Notification.objects.filter(user=user, is_read=False)
-            for notification in notifications:
-                notification.is_read = True
-                notification.save()
+        if data.get("all") == True:
+            # one UPDATE, skips the signals so the counter is cleared here
+            Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+            Notification.clear_unread_count(user.id)
             response_data = {
                 "status": status.HTTP_200_OK,
                 "success": True,
@@ -84,6 +101,7 @@ class NotificationView(APIView):
             }
             return Response(response_data, status=status.HTTP_200_OK)
 
+        notification = Notification.objects.filter(user=user, id=pk).first()
         if notification:
             if notification.user == user:
                 notification.is_read = True
@@ -109,6 +127,16 @@ class NotificationView(APIView):
         return Response(response_data, status=status.HTTP_404_NOT_FOUND)
 
 
+class NotificationUnreadCountView(APIView):
+    def get(self, request):
+        response_data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "data": {"unread_count": Notification.unread_count(request.user.id)},
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
 class SkillView(APIView):
     def get(self, request):
         skills = Skill.objects.all()
@@ -143,8 +171,11 @@ class FeedJobView(APIView):
 
             vacancy = (
                 Vacancy.objects.filter(pk=pk)
-                .select_related("job", "job_title", "uniform")
-                .prefetch_related("skills", "participants")
+                .select_related("job__company", "job_title", "uniform", "stats")
+                .prefetch_related(
+                    "skills",
+                    Prefetch("participants", queryset=Staff.objects.select_related("user", "role")),
+                )
                 .first()
             )
             if not vacancy:
@@ -156,36 +187,9 @@ class FeedJobView(APIView):
                 }
                 return Response(response, status=status.HTTP_200_OK)
 
-            # def get_application_status(obj):
-            #     # return the count of each job status
-            #     job_application = JobApplication.objects.filter(vacancy=obj)
-            #     pending = job_application.filter(job_status='pending').count()
-            #     accepted = job_application.filter(job_status='accepted').count()
-            #     rejected = job_application.filter(job_status='rejected').count()
-            #     expierd = job_application.filter(job_status='expired').count()
-            #     return {'pending': pending, 'accepted': accepted,'rejected': rejected, 'expired': expierd}
-            def get_application_status(obj):
-                # Aggregate job_status counts in a single query
-                status_counts = (
-                    JobApplication.objects.filter(vacancy=obj)
-                    .values("job_status")
-                    .annotate(count=Count("id"))
-                )
-
-                # Create a default dictionary
-                result = {"pending": 0, "accepted": 0, "rejected": 0, "expired": 0}
-
-                # Fill the actual counts
-                for entry in status_counts:
-                    status = entry["job_status"]
-                    count = entry["count"]
-                    if status in result:
-                        result[status] = count
-
-                return result
-
             # if vacancy.job.company.user == user:
             # serializer = VacancySerializer(vacancy)
+            favourite_staff_ids = favourites.staff_ids(vacancy.job.company_id)
             data = {
                 "id": vacancy.id,
                 "company_avatar": (
@@ -215,19 +219,11 @@ class FeedJobView(APIView):
                         "gender": staff.gender,
                         "timesince": f"{timesince(staff.created_at, now())} ago",
                         "job_title": staff.role.name,
-                        "is_favourite": (
-                            True
-                            if FavouriteStaff.objects.filter(
-                                company=vacancy.job.company, staff=staff
-                            )
-                            .select_related("staff", "company")
-                            .exists()
-                            else False
-                        ),
+                        "is_favourite": staff.id in favourite_staff_ids,
                     }
                     for staff in vacancy.participants.all()
                 ],
-                "application_status": get_application_status(vacancy),
+                "application_status": vacancy.application_status(),
             }
             response = {
                 "status": status.HTTP_200_OK,
@@ -257,18 +253,11 @@ class FeedJobView(APIView):
 
             vacancies = (
                 Vacancy.objects.filter(job__company=client)
-                .select_related("job", "job_title", "uniform")
+                .select_related("job__company", "job_title", "uniform", "stats")
                 .prefetch_related("skills", "participants")
                 .order_by("-created_at")
             )
 
-            if search:
-                vacancies = vacancies.filter(
-                    Q(job__title__icontains=search)
-                    | Q(skills__name__icontains=search)
-                    | Q(job_title__name__icontains=search)
-                ).distinct()
-
             if job_status:
                 vacancies = vacancies.filter(job_status=job_status)
 
@@ -301,6 +290,10 @@ class FeedJobView(APIView):
                         status=status.HTTP_400_BAD_REQUEST,
                     )
 
+            if search:
+                # ranked full text on postgres, one indexed column instead of a join per keystroke
+                vacancies = vacancy_search.search(vacancies, search)
+
             if not vacancies.exists():
                 response = {
                     "status": status.HTTP_200_OK,
@@ -310,31 +303,17 @@ class FeedJobView(APIView):
                 }
                 return Response(response, status=status.HTTP_200_OK)
 
-            # Prefetch related JobApplications and annotate counts
-            vacancies = (
-                vacancies.prefetch_related(
-                    Prefetch(
-                        "jobapplication_set",
-                        queryset=JobApplication.objects.only("applicant__avatar"),
-                    )
-                )
-                .annotate(
-                    pending_applications=Count(
-                        "jobapplication", filter=Q(jobapplication__job_status="pending")
-                    ),
-                    accepted_applications=Count(
-                        "jobapplication",
-                        filter=Q(jobapplication__job_status="accepted"),
-                    ),
-                    rejected_applications=Count(
-                        "jobapplication",
-                        filter=Q(jobapplication__job_status="rejected"),
-                    ),
-                    expired_applications=Count(
-                        "jobapplication", filter=Q(jobapplication__job_status="expired")
+            # Prefetch related JobApplications, counts come from VacancyStats
+            vacancies = vacancies.prefetch_related(
+                Prefetch(
+                    "jobapplication_set",
+                    queryset=JobApplication.objects.select_related("applicant__user").only(
+                        "vacancy_id",
+                        "applicant__avatar",
+                        "applicant__user__first_name",
+                        "applicant__user__last_name",
                     ),
                 )
-                .order_by("-created_at")
             )
 
             paginator = PageNumberPagination()
@@ -375,12 +354,7 @@ class FeedJobView(APIView):
                         }
                         for app in vacancy.jobapplication_set.all()
                     ],
-                    "application_status": {
-                        "pending": vacancy.pending_applications,
-                        "accepted": vacancy.accepted_applications,
-                        "rejected": vacancy.rejected_applications,
-                        "expired": vacancy.expired_applications,
-                    },
+                    "application_status": vacancy.application_status(),
                 }
                 job_list.append(data)
 
@@ -394,56 +368,120 @@ class FeedJobView(APIView):
             }
             return Response(response_data, status=status.HTTP_200_OK)
 
-        vacancies = (
-            Vacancy.objects.filter(job_status="active")
-            .select_related("job__company", "job_title", "uniform")
-            .prefetch_related(
-                "skills",
-                "participants",
-                Prefetch(
-                    "jobapplication_set",
-                    queryset=JobApplication.objects.select_related("applicant__user"),
-                    to_attr="_prefetched_jobapplications",
-                ),
-            )
-            .order_by("-created_at")
-        )
-        serializer = VacancySerializer(vacancies, many=True)
+        # staff feed, slim rows in keyset pages, ?fields=id,job_name,... for a subset
+        fields = request.query_params.get("fields")
+        fields = [field for field in fields.split(",") if field] if fields else None
+        unknown = set(fields or ()) - set(FeedVacancySerializer.Meta.fields)
+        if unknown:
+            response_data = {
+                "status": status.HTTP_400_BAD_REQUEST,
+                "success": False,
+                "message": f"Unknown fields: {', '.join(sorted(unknown))}",
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        vacancies = FeedVacancySerializer.project(Vacancy.objects.filter(job_status="active"), fields)
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(vacancies, request, view=self)
+        serializer = FeedVacancySerializer(page, many=True, fields=fields)
         response_data = {
             "status": status.HTTP_200_OK,
             "success": True,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
             "data": serializer.data,
         }
         return Response(response_data, status=status.HTTP_200_OK)
 
 
+NEARBY_RADIUS = 10000
+NEARBY_MAX_RADIUS = 50000
+NEARBY_LIMIT = 30
+NEARBY_MAX_LIMIT = 100
+
+
+class NearbyJobView(APIView):
+    """
+    NEAR ME FEED
+    upcoming active vacancies within ?radius= meters of ?latitude=&longitude=, closest and earliest first
+    """
+    def get(self, request):
+        try:
+            latitude, longitude = geo.parse_coordinates(request.query_params)
+            if latitude is None:
+                raise ValueError("latitude and longitude are required")
+            radius = min(int(request.query_params.get("radius", NEARBY_RADIUS)), NEARBY_MAX_RADIUS)
+            limit = min(int(request.query_params.get("limit", NEARBY_LIMIT)), NEARBY_MAX_LIMIT)
+            if radius <= 0 or limit <= 0:
+                raise ValueError("radius and limit must be positive")
+        except ValueError as e:
+            response = {
+                "status": status.HTTP_400_BAD_REQUEST,
+                "success": False,
+                "message": str(e),
+            }
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+
+        upcoming = Vacancy.objects.filter(job_status="active", open_date__gte=date.today())
+        matches = geo.nearby(upcoming, latitude, longitude, radius, limit)
+        vacancies = Vacancy.objects.select_related("job__company", "job_title").in_bulk(
+            [vacancy_id for vacancy_id, _ in matches]
+        )
+
+        job_list = []
+        for vacancy_id, distance in matches:
+            vacancy = vacancies[vacancy_id]
+            company = vacancy.job.company
+            job_list.append({
+                "id": vacancy.id,
+                "job_title": vacancy.job.title,
+                "job_role": vacancy.job_title.name if vacancy.job_title else None,
+                "company_name": company.company_name,
+                "company_logo": company.company_logo.url if company.company_logo else None,
+                "open_date": vacancy.open_date,
+                "start_time": vacancy.start_time,
+                "end_time": vacancy.end_time,
+                "location": vacancy.location,
+                "latitude": vacancy.latitude,
+                "longitude": vacancy.longitude,
+                "distance": distance,
+                "number_of_staff": vacancy.number_of_staff,
+            })
+
+        response = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "data": job_list,
+        }
+        return Response(response, status=status.HTTP_200_OK)
+
+
+def get_company_summary(user):
+    # one indexed read, the row is kept by client.signals
+    summary = CompanyJobSummary.objects.filter(company__user=user).first()
+    if summary is None:
+        client = CompanyProfile.objects.filter(user=user).first()
+        if client:
+            summary = CompanyJobSummary.recount([client.id])[0]
+    return summary
+
+
 class JobCountAPI(APIView):
     def get(self, request):
         user = request.user
         if user.is_client:
-            client = CompanyProfile.objects.filter(user=user).first()
-            if not client:
+            summary = get_company_summary(user)
+            if not summary:
                 return Response(
                     {"error": "Client profile not found."},
                     status=status.HTTP_404_NOT_FOUND,
                 )
 
-            vacancies = (
-                Vacancy.objects.filter(job__company=client)
-                .select_related("job", "job_title", "uniform")
-                .prefetch_related("skills", "participants")
-            )
-            status_count = {
-                "active": vacancies.filter(job_status="active").count(),
-                "progress": vacancies.filter(job_status="progress").count(),
-                "draft": vacancies.filter(job_status="draft").count(),
-                "cancelled": vacancies.filter(job_status="cancelled").count(),
-                "finished": vacancies.filter(job_status="finished").count(),
-            }
             response_data = {
                 "status": status.HTTP_200_OK,
                 "success": True,
-                "data": status_count,
+                "data": summary.job_status_count(),
+                "updated_at": summary.updated_at,
             }
             return Response(response_data, status=status.HTTP_200_OK)
 
@@ -454,7 +492,7 @@ class GetJobTemplateAPIView(APIView):
         if user.is_client:
             client = CompanyProfile.objects.filter(user=user).first()
             if pk:
-                job_template = JobTemplate.objects.filter(client=client, pk=pk).first()
+                job_template = JobSerializer.prefetch(JobTemplate.objects.filter(client=client, pk=pk), "job__").first()
                 if job_template:
                     serializer = JobTemplateSserializers(job_template)
                     response_data = {
@@ -483,7 +521,7 @@ class GetJobTemplateAPIView(APIView):
                     "name": template.name,
                     "title": template.title,
                     "description": template.description,
-                    "job_id": template.job.id,
+                    "job_id": template.job_id,
                 }
                 template_list.append(data)
 
@@ -672,25 +710,19 @@ class StatisticsAPIView(APIView):
     def get(self, request):
         user = request.user
         if user.is_client:
-            client = CompanyProfile.objects.filter(user=user).first()
-            if not client:
+            summary = get_company_summary(user)
+            if not summary:
                 return Response(
                     {"error": "Client profile not found."},
                     status=status.HTTP_404_NOT_FOUND,
                 )
 
-            # calculate total applicant
-            total_applicant = JobApplication.objects.filter(
-                vacancy__job__company=client
-            ).count()
-            # calculate total job
-            total_job = Job.objects.filter(company=client).count()
-
             response = {
                 "status": status.HTTP_200_OK,
                 "success": True,
                 "message": "Statistics",
-                "data": {"total_applicant": total_applicant, "total_job": total_job},
+                "data": {"total_applicant": summary.total_applicants, "total_job": summary.total_jobs},
+                "updated_at": summary.updated_at,
             }
             return Response(response, status=status.HTTP_200_OK)
         return Response(
@@ -699,30 +731,21 @@ class StatisticsAPIView(APIView):
         )
 
 
-# notifications/utils.py
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-
 def send_notification_to_user(user_id, message, link=None):
-    channel_layer = get_channel_layer()
-    data = {
-        "type": "send_notification",
-        "content": {
-            "message": message,
-            "link": link,
-        },
-    }
-    async_to_sync(channel_layer.group_send)(f"user_{user_id}_notifications", data)
+    if not online_users([user_id]):
+        # counted into the digest sent on the next connect
+        hold_offline(user_id, 1)
+        return
+    content = {"message": message, "link": link}
+    send_events([(user_id, notification_event(content))])
 
 
 class NotifyUser(APIView):
     def post(self, request):
         user = request.user
         message = request.data.get("message", "")
-        notification = Notification.objects.create(user=user, message=message)
-        print('saved to db')
-        send_notification_to_user(user.id, message)
-        print('sent to user')
+        # saved and pushed after commit
+        notification = notify(user, message)
         response_data = {
             "status": status.HTTP_201_CREATED,
             "success": True,
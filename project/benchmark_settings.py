@@ -0,0 +1,65 @@
+"""
+Local benchmark profile, no remote database, redis or smtp needed.
+
+    DJANGO_SETTINGS_MODULE=project.benchmark_settings python manage.py migrate
+    DJANGO_SETTINGS_MODULE=project.benchmark_settings python manage.py generate_benchmark_data
+    DJANGO_SETTINGS_MODULE=project.benchmark_settings python manage.py benchmark_endpoints --output run.json
+
+BENCHMARK_DB_ENGINE=sqlite switches to a file database for a quick run,
+postgres is the default because the search and payroll paths differ on it.
+"""
+import os
+
+# storage settings are read without defaults, nothing is uploaded while benchmarking
+for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_STORAGE_BUCKET_NAME", "AWS_S3_REGION_NAME"):
+    os.environ.setdefault(name, "benchmark")
+
+from decouple import config
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, MIDDLEWARE
+
+
+# the data commands refuse to run against any other settings
+BENCHMARK = True
+
+DEBUG = False
+
+if config("BENCHMARK_DB_ENGINE", default="postgresql") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": config("BENCHMARK_DB_NAME", default=str(BASE_DIR / "benchmark.sqlite3")),
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": config("BENCHMARK_DB_NAME", default="letme_benchmark"),
+            "USER": config("BENCHMARK_DB_USER", default="postgres"),
+            "PASSWORD": config("BENCHMARK_DB_PASSWORD", default=""),
+            "HOST": config("BENCHMARK_DB_HOST", default="localhost"),
+            "PORT": config("BENCHMARK_DB_PORT", default="5432"),
+        }
+    }
+
+CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+# in process presence registry
+PRESENCE_REDIS_URL = None
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark",
+    }
+}
+
+EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+
+# prints every request, the runner counts queries itself
+MIDDLEWARE = [name for name in MIDDLEWARE if name != "querycount.middleware.QueryCountMiddleware"]
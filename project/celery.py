@@ -23,6 +23,18 @@ app.conf.beat_schedule = {
         # 'schedule': crontab(hour=14, minute=54),
         'schedule': crontab(hour=17,minute=42),  
     },
+    'refresh-company-job-summaries': {
+        'task': 'client.tasks.refresh_company_job_summaries',
+        'schedule': crontab(minute='*/15'),
+    },
+    'score-pending-checkins': {
+        'task': 'client.tasks.score_pending_checkins',
+        'schedule': crontab(minute='*/5'),
+    },
+    'requeue-stale-contracts': {
+        'task': 'client.tasks.requeue_stale_contracts',
+        'schedule': crontab(minute='*/15'),
+    },
     
 
 }
\ No newline at end of file
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     
     # 3rd party 
     "rest_framework",
@@ -159,6 +160,9 @@ CHANNEL_LAYERS = {
     },
 }
 
+# websocket presence registry, see dashboard/presence.py
+PRESENCE_REDIS_URL = 'redis://localhost:6379/2'
+
 
 CELERY_BROKER_URL = 'redis://localhost:6379/0' 
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/1'
@@ -289,11 +293,11 @@ AWS_DEFAULT_ACL = None
 
 
 
-# inmemory cache backend
+# shared cache backend, the web processes and the celery workers read the same counters and markers
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-snowflake",
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://localhost:6379/3",
     }
 }
 
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from staff.models import Staff, StaffRating
+
+
+class Command(BaseCommand):
+    help = 'Recount the per job role rating rows of every staff from their reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Only report the staff that drifted')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        staff_ids = list(Staff.objects.order_by('id').values_list('id', flat=True))
+        checked = fixed = 0
+
+        for start in range(0, len(staff_ids), batch_size):
+            batch = staff_ids[start:start + batch_size]
+            counts = StaffRating.counts_for(batch)
+            current = {
+                (staff_id, job_role): (count, total)
+                for staff_id, job_role, count, total in StaffRating.objects.filter(staff_id__in=batch, review_count__gt=0)
+                .values_list('staff_id', 'job_role', 'review_count', 'rating_total')
+            }
+            drifted = sorted({
+                staff_id for staff_id, job_role in counts.keys() | current.keys()
+                if counts.get((staff_id, job_role)) != current.get((staff_id, job_role))
+            })
+            for staff_id in drifted:
+                self.stdout.write(f'staff {staff_id}: ratings drifted')
+            if drifted and not options['dry_run']:
+                StaffRating.recount(drifted)
+            checked += len(batch)
+            fixed += len(drifted)
+
+        action = 'drifted' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} staff, {fixed} {action}.'))
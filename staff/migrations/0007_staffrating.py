@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_staff_ratings(apps, schema_editor):
+    StaffReview = apps.get_model('staff', 'StaffReview')
+    StaffRating = apps.get_model('staff', 'StaffRating')
+
+    ratings = {}
+    rows = (
+        StaffReview.objects.values_list('staff_id', 'job_role')
+        .annotate(count=models.Count('id'), total=models.Sum('rating'))
+        .order_by()
+    )
+    for staff_id, job_role, count, total in rows:
+        rating = ratings.setdefault((staff_id, job_role or ''), StaffRating(staff_id=staff_id, job_role=job_role or ''))
+        rating.review_count += count
+        rating.rating_total += total
+    StaffRating.objects.bulk_create(ratings.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0006_alter_staff_avatar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_role', models.CharField(blank=True, default='', max_length=100)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to='staff.staff')),
+            ],
+            options={
+                'verbose_name_plural': 'Staff Ratings',
+                'ordering': ['job_role'],
+                'constraints': [models.UniqueConstraint(fields=('staff', 'job_role'), name='unique_staff_rating_role')],
+            },
+        ),
+        migrations.RunPython(fill_staff_ratings, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime
@@ -142,3 +142,71 @@ class StaffReview(models.Model):
         super().save(*args, **kwargs)
 
     
+
+
+class StaffRating(models.Model):
+    """REVIEW COUNT AND RATING TOTAL OF A STAFF PER JOB ROLE, KEPT UP TO DATE BY staff.signals"""
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='ratings')
+    # '' for reviews without a job role, null can't be part of the unique key
+    job_role = models.CharField(max_length=100, blank=True, default='')
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Staff Ratings'
+        ordering = ['job_role']
+        constraints = [
+            models.UniqueConstraint(fields=['staff', 'job_role'], name='unique_staff_rating_role'),
+        ]
+
+    def __str__(self):
+        return f'{self.staff_id} {self.job_role or "-"}: {self.review_count} reviews'
+
+    @staticmethod
+    def summary(ratings):
+        """Overall average and per job role breakdown of a staff from its rating rows, no query."""
+        ratings = [rating for rating in ratings if rating.review_count]
+        count = sum(rating.review_count for rating in ratings)
+        return {
+            'total_avg_rating': sum(rating.rating_total for rating in ratings) / count if count else None,
+            'job_role_ratings': [
+                {
+                    'job_role': rating.job_role or None,
+                    'avg_rating': rating.rating_total / rating.review_count,
+                    'review_count': rating.review_count,
+                }
+                for rating in sorted(ratings, key=lambda rating: rating.job_role)
+            ],
+        }
+
+    @classmethod
+    def counts_for(cls, staff_ids):
+        """{(staff id, job role): (review count, rating total)} from the reviews, one query."""
+        rows = (
+            StaffReview.objects.filter(staff_id__in=staff_ids)
+            .values_list('staff_id', 'job_role')
+            .annotate(count=models.Count('id'), total=models.Sum('rating'))
+            .order_by()
+        )
+        counts = {}
+        for staff_id, job_role, count, total in rows:
+            # null and '' roles share a row
+            previous = counts.get((staff_id, job_role or ''), (0, 0))
+            counts[(staff_id, job_role or '')] = (previous[0] + count, previous[1] + total)
+        return counts
+
+    @classmethod
+    def recount(cls, staff_ids):
+        """Rewrite the rating rows of the given staff, used after writes that skip signals."""
+        staff_ids = list(set(staff_ids))
+        counts = cls.counts_for(staff_ids)
+        ratings = [
+            cls(staff_id=staff_id, job_role=job_role, review_count=count, rating_total=total)
+            for (staff_id, job_role), (count, total) in counts.items()
+        ]
+        with transaction.atomic():
+            cls.objects.filter(staff_id__in=staff_ids).delete()
+            cls.objects.bulk_create(ratings)
+        return ratings
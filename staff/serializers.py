@@ -2,13 +2,14 @@ import json
 
 from rest_framework import serializers
 
-from django.db.models import Avg, Count
+from django.db.models import Prefetch
 
 from .models import (
     Staff,
     Experience, 
     BankDetails,
-    StaffReview
+    StaffReview,
+    StaffRating,
     
 )
 
@@ -122,24 +123,18 @@ class StaffSerializer(serializers.ModelSerializer):
         fields = ['id','user', 'avg_rating','role', 'gender', 'nid_number', 'phone', 'address', 'dob', 'age', 'avatar', 'about', 'cv', 'video_cv','skills','is_available','is_letme_staff']
         depth = 1
     
-    def get_avg_rating(self, obj):
-
-        total_avg = StaffReview.objects.filter(staff=obj).aggregate(total_avg_rating=Avg('rating'))['total_avg_rating']
-
-        rating = (
-            StaffReview.objects
-            .filter(staff=obj)
-            .values('job_role')
-            .annotate(
-                avg_rating=Avg('rating'), 
-                review_count=Count('id') 
-            )
+    @classmethod
+    def prefetch(cls, queryset, prefix=''):
+        """joins and prefetches of every nested field, prefix when the staff is a relation of the queryset rows"""
+        return queryset.select_related(f'{prefix}user', f'{prefix}role').prefetch_related(
+            f'{prefix}skills',
+            Prefetch(f'{prefix}user__experiences', queryset=Experience.objects.select_related('job_role')),
+            f'{prefix}ratings',
         )
 
-        return {
-            'total_avg_rating': total_avg,  
-            'job_role_ratings': list(rating)  
-        }
+    def get_avg_rating(self, obj):
+        # precomputed per role rows, prefetched by prefetch() or one small query
+        return StaffRating.summary(obj.ratings.all())
     
     # to_representation for showing experience
     def to_representation(self, instance):
@@ -1,8 +1,10 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver 
-from .models import Staff
+from django.utils import timezone
+from .models import Staff, StaffReview, StaffRating
 from users.models import Invitation
 from client.models import MyStaff, CompanyProfile, InviteMystaff
+from utility import ratings
 
 
 @receiver(post_save, sender=Staff)
@@ -21,3 +23,25 @@ def add_staff_to_mystaff(sender, instance, created, **kwargs):
                 pass
             
             # send email to invited staff
+
+
+def _rating_key(instance):
+    # (staff, job role, rating) as loaded, None when a field was deferred
+    values = ratings.loaded_values(instance, ('staff_id', 'job_role', 'rating'))
+    if values is None:
+        return None
+    staff_id, job_role, rating = values
+    return staff_id, job_role or '', int(rating)
+
+
+def _shift_rating(key, sign):
+    staff_id, job_role, rating = key
+    if sign > 0:
+        StaffRating.objects.get_or_create(staff_id=staff_id, job_role=job_role)
+    return ratings.shift_counters(
+        StaffRating.objects.filter(staff_id=staff_id, job_role=job_role), sign, rating,
+        'review_count', 'rating_total', updated_at=timezone.now(),
+    )
+
+
+ratings.track_ratings(StaffReview, _rating_key, _shift_rating, StaffRating.recount)
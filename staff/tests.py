@@ -1,3 +1,95 @@
+from datetime import date, time
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from users.models import User, JobRole
+from client.models import CompanyProfile, Job, Vacancy, JobApplication, Checkout
+from .models import Staff, StaffReview, StaffRating
+from .serializers import StaffSerializer
+
+
+class StaffRatingTests(TestCase):
+
+    def setUp(self):
+        client_user = User.objects.create_user(
+            email="client@user.com", phone_number="123", first_name="Test", last_name="User", password="foo", is_client=True
+        )
+        company = CompanyProfile.objects.create(
+            user=client_user, company_name="Company", contact_number="123",
+            company_email="company@user.com", billing_email="billing@user.com", company_address="Oslo",
+        )
+        self.waiter = JobRole.objects.create(name="Waiter", staff_price=200, client_price=300)
+        chef = JobRole.objects.create(name="Chef", staff_price=250, client_price=350)
+        job = Job.objects.create(company=company, title="Dinner")
+        self.vacancies = [
+            Vacancy.objects.create(
+                job=job, job_title=role, open_date=date.today(), close_date=date.today(), start_time=time(9), end_time=time(17),
+            )
+            for role in (self.waiter, self.waiter, chef)
+        ]
+        staff_user = User.objects.create_user(
+            email="staff@user.com", phone_number="123", first_name="Test", last_name="User", password="foo", is_staff=True
+        )
+        self.staff = Staff.objects.create(user=staff_user, role=self.waiter, dob=date(2000, 1, 1))
+
+    def rating(self):
+        staff = StaffSerializer.prefetch(Staff.objects.filter(id=self.staff.id)).get()
+        with self.assertNumQueries(0):
+            return StaffSerializer(staff).data["avg_rating"]
+
+    def test_summary_follows_review_writes(self):
+        reviews = [
+            StaffReview.objects.create(staff=self.staff, vacancy=vacancy, rating=rating)
+            for vacancy, rating in zip(self.vacancies, (5, 4, 2))
+        ]
+        self.assertEqual(self.rating(), {
+            "total_avg_rating": 11 / 3,
+            "job_role_ratings": [
+                {"job_role": "Chef", "avg_rating": 2.0, "review_count": 1},
+                {"job_role": "Waiter", "avg_rating": 4.5, "review_count": 2},
+            ],
+        })
+
+        review = StaffReview.objects.get(id=reviews[2].id)
+        review.rating = "4"
+        review.save()
+        reviews[0].delete()
+        self.assertEqual(self.rating()["total_avg_rating"], 4.0)
+        self.assertEqual(self.rating()["job_role_ratings"][1], {"job_role": "Waiter", "avg_rating": 4.0, "review_count": 1})
+
+    def test_reconcile_fixes_drift(self):
+        StaffReview.objects.create(staff=self.staff, vacancy=self.vacancies[0], rating=5)
+        StaffReview.objects.update(rating=1)
+        call_command("reconcile_staff_ratings", stdout=StringIO())
+        rating = StaffRating.objects.get(staff=self.staff)
+        self.assertEqual((rating.job_role, rating.review_count, rating.rating_total), ("Waiter", 1, 1))
+
+    def test_drifted_counter_is_recounted_not_decremented(self):
+        review = StaffReview.objects.create(staff=self.staff, vacancy=self.vacancies[0], rating=5)
+        StaffRating.objects.update(review_count=0, rating_total=0)
+        StaffReview.objects.create(staff=self.staff, vacancy=self.vacancies[1], rating=3)
+        review.delete()
+        rating = StaffRating.objects.get(staff=self.staff)
+        self.assertEqual((rating.review_count, rating.rating_total), (1, 3))
+
+        StaffReview.objects.only("id").get().delete()
+        self.assertEqual(self.rating()["job_role_ratings"], [])
+
+    def test_checkin_and_checkout_are_scored(self):
+        vacancy = self.vacancies[0]
+        Vacancy.objects.filter(id=vacancy.id).update(latitude=Decimal("59.911491"), longitude=Decimal("10.757933"))
+        application = JobApplication.objects.create(vacancy=vacancy, applicant=self.staff, is_approve=True)
+        api = APIClient()
+        api.force_authenticate(self.staff.user)
+        payload = {"location": "Oslo", "latitude": "59.912000", "longitude": "10.758000"}
+
+        response = api.post(f"/api/v1/app/staff/jobs/{application.id}/checkin/", {**payload, "type": "checkin"}, format="json")
+        self.assertEqual(response.data["data"], {"distance": 57, "within_geofence": True})
 
-# Create your tests here.
+        response = api.post(f"/api/v1/app/staff/jobs/{application.id}/checkout/", {**payload, "type": "checkout"}, format="json")
+        self.assertEqual(response.data["data"], {"distance": 57, "within_geofence": True})
+        self.assertEqual(Checkout.objects.get(application=application).distance, 57)
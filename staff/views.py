@@ -1,7 +1,7 @@
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
 from datetime import datetime
-from django.db.models import Avg, Count, Case, When, Q
+from django.db.models import Count, Case, When, Q
 
 import csv
 from io import StringIO
@@ -17,7 +17,8 @@ from .models import (
     Staff,
     Experience,
     BankDetails,
-    StaffReview
+    StaffReview,
+    StaffRating,
 
 )
 from .serializers import (
@@ -32,9 +33,11 @@ from .serializers import (
 from shifting.models import Shifting, DailyShift
 from shifting.serializers import ShiftingSerializer, DailyShiftSerializer
 from dashboard.models import Notification
+from dashboard.notifications import notify
 
-from client.models import Job, JobApplication, Vacancy, MyStaff, Checkin, Checkout, JobRole, JobReport, CompanyProfile, FavouriteStaff
+from client.models import Job, JobApplication, Vacancy, MyStaff, Checkin, Checkout, JobRole, JobReport, CompanyProfile
 from client.serializers import JobApplicationSerializer, CheckinSerializer, CheckOutSerializer
+from client import exports, favourites, geo
 
 from shifting.models import Shifting, DailyShift
 from shifting.serializers import ShiftingSerializer, DailyShiftSerializer
@@ -45,15 +48,17 @@ class StaffProfileView(APIView):
 
         if pk:
             
-            try:
-                staff = Staff.objects.get(id=pk)
-            except Staff.DoesNotExist:
+            segments = request.path.strip('/').split('/')
+            staff = Staff.objects.filter(id=pk).select_related('user', 'role')
+            if 'app' in segments:
+                staff = StaffSerializer.prefetch(staff)
+            staff = staff.first()
+            if not staff:
                 return Response({
                     "status": status.HTTP_404_NOT_FOUND,
                     "message": "Staff not found"
                 }, status=status.HTTP_404_NOT_FOUND)
             
-            segments = request.path.strip('/').split('/')
             if 'app' in segments:
                 serializer = StaffSerializer(staff)
                 response_data = {
@@ -65,10 +70,16 @@ class StaffProfileView(APIView):
                 return Response(response_data, status=status.HTTP_200_OK)
             
             
-            StaffReview.objects.filter(staff=staff).values('job_role').annotate(avg_rating=Avg('rating'), review_count=Count('id') )
+            ratings = StaffRating.summary(staff.ratings.all())['job_role_ratings']
+            # the four counters in one aggregate
+            job_info = staff.job_applications.aggregate(
+                total_apply=Count('id'),
+                total_approved=Count('id', filter=Q(is_approve=True, job_status='accepted')),
+                total_cancel=Count('id', filter=Q(is_approve=False, job_status='cancelled')),
+                total_late=Count('id', filter=Q(is_approve=False, job_status='late')),
+            )
             user = request.user
-            if user.is_client:
-                client = CompanyProfile.objects.filter(user=request.user).first()
+            company_id = user.is_client and CompanyProfile.objects.filter(user=user).values_list('id', flat=True).first()
             
             # custom response data
             staff_data = {
@@ -82,23 +93,9 @@ class StaffProfileView(APIView):
                 "gender": staff.gender,
                 "cv": staff.cv.url if staff.cv else None,
                 "video_cv": staff.video_cv.url if staff.video_cv else None,
-                "rating": [
-                    {
-                        "job_role": review.job_role,
-                        "avg_rating": review.avg_rating,
-                        "review_count": review.review_count
-                    } for review in StaffReview.objects.filter(staff=staff).annotate(avg_rating=Avg('rating'), review_count=Count('id') )
-                ],
-                "job_info":{
-                    "total_apply": staff.job_applications.count(),
-
-                    "total_approved": staff.job_applications.filter(is_approve=True, job_status='accepted').count(),
-
-                    "total_cancel": staff.job_applications.filter(is_approve=False, job_status='cancelled').count(),
-
-                    "total_late": staff.job_applications.filter(is_approve=False, job_status='late').count(),
-                },
-                "is_favaurite": True if user.is_client and  FavouriteStaff.objects.filter(company=client, staff=staff).select_related('staff','company').exists() else False
+                "rating": ratings,
+                "job_info": job_info,
+                "is_favaurite": favourites.is_favourite(company_id, staff.id)
 
 
             }
@@ -112,9 +109,8 @@ class StaffProfileView(APIView):
             }
             return Response(response_data, status=status.HTTP_200_OK)
         
-        try:
-            staff = Staff.objects.get(user=user)
-        except Staff.DoesNotExist:
+        staff = StaffSerializer.prefetch(Staff.objects.filter(user=user)).first()
+        if not staff:
             return Response({
                 "status": status.HTTP_404_NOT_FOUND,
                 "message": "Staff profile not found"
@@ -183,7 +179,7 @@ class JobApplicationView(APIView):
                 "message": "Staff not found"
             }, status=status.HTTP_404_NOT_FOUND)
         
-        applications = JobApplication.objects.filter(applicant=staff)
+        applications = JobApplicationSerializer.prefetch(JobApplication.objects.filter(applicant=staff))
         if not applications:
             response_data = {
                 "status": status.HTTP_200_OK,
@@ -255,7 +251,7 @@ class JobApplicationView(APIView):
                 vacancy=vacancy
             )
             # send notification to client
-            notification = Notification.objects.create(
+            notification = notify(
                 user=vacancy.job.company.user,
                 message=f'{staff} has submitted a job application for {vacancy.job_title}'
             )
@@ -421,6 +417,16 @@ class StaffJobView(APIView): # jobapplication
                 return Response(response_data, status=status.HTTP_404_NOT_FOUND)
 
             if application.is_approve:
+                try:
+                    latitude, longitude = geo.parse_coordinates(data)
+                except ValueError as e:
+                    response_data = {
+                        "status": status.HTTP_400_BAD_REQUEST,
+                        "success": False,
+                        "message": str(e)
+                    }
+                    return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
                 if data['type'] == 'checkin':
                     
 
@@ -432,20 +438,25 @@ class StaffJobView(APIView): # jobapplication
                             "message": "You have already checked in this"
                         }
                         return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
-                    Checkin.objects.create(
+                    checkin = Checkin.objects.create(
                         application=application,
                         in_time = timezone.now(),
-                        location = data['location']
+                        location = data['location'],
+                        latitude = latitude,
+                        longitude = longitude
                     )
+                    # scored right away when both ends have coordinates, the beat task retries the rest
+                    if latitude is not None:
+                        checkin.calculate_distance()
 
                     response_data = {
                         "status": status.HTTP_200_OK,
                         "success": True,
                         "message": "Shift checked in successfully",
-                        # "data": JobApplicationSerializer(application).data
+                        "data": {"distance": checkin.distance, "within_geofence": checkin.within_geofence}
                     }
                     # send notification to the client 
-                    notification = Notification.objects.create(
+                    notification = notify(
                         user=application.vacancy.job.company.user,
                         message=f'{staff} has checked in for {application.vacancy.job_title}! Approve the checkin request.'
                     )
@@ -470,20 +481,25 @@ class StaffJobView(APIView): # jobapplication
                         }
                         return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
                     
-                    Checkout.objects.create(
+                    checkout = Checkout.objects.create(
                         application=application,
                         out_time = timezone.now(),
-                        location = data['location']
+                        location = data['location'],
+                        latitude = latitude,
+                        longitude = longitude
                     )
+                    # scored right away when both ends have coordinates, the beat task retries the rest
+                    if latitude is not None:
+                        checkout.calculate_distance()
                     
                     response_data = {
                         "status": status.HTTP_200_OK,
                         "success": True,
                         "message": "Shift checked out successfully",
-                        # "data": JobApplicationSerializer(application).data
+                        "data": {"distance": checkout.distance, "within_geofence": checkout.within_geofence}
                     }
                     # send notification to the client
-                    notification = Notification.objects.create(
+                    notification = notify(
                         user=application.vacancy.job.company.user,
                         message=f'{staff} has checked out for {application.vacancy.job_title}! Approve the checkout request.'
                     )
@@ -550,7 +566,7 @@ class ShiftRequestView(APIView):
                 daily_shift.status = True
                 daily_shift.shift_status = 'accepted'
                 daily_shift.save()
-                notification = Notification.objects.create(
+                notification = notify(
                     user=daily_shift.shift.company.user,
                     message=f'{daily_shift.staff.user } has accepted your shift request.'
                 )
@@ -565,7 +581,7 @@ class ShiftRequestView(APIView):
                 daily_shift.status = False
                 daily_shift.shift_status = 'rejected'
                 daily_shift.save()
-                notification = Notification.objects.create(
+                notification = notify(
                     user=daily_shift.shift.company.user,
                     message=f'{daily_shift.staff.user } has rejected your shift request.'
                 )
@@ -619,7 +635,7 @@ class ShiftCheckinView(APIView):
             daily_shift.checkin_time = timezone.now()
             daily_shift.checkin_location = data['checkin_location']
             daily_shift.save()
-            notification = Notification.objects.create(
+            notification = notify(
                 user=daily_shift.shift.company.user,
                 message=f'{daily_shift.staff.user } has checked-in for your shift.'
             )
@@ -670,7 +686,7 @@ class ShiftCheckoutView(APIView):
             daily_shift.checkout_time = timezone.now()
             daily_shift.checkout_location = data['checkout_location']
             daily_shift.save()
-            notification = Notification.objects.create(
+            notification = notify(
                 user=daily_shift.shift.company.user,
                 message=f'{daily_shift.staff.user } has checked-out for your shift.'
             )
@@ -778,7 +794,7 @@ class ExperienceView(APIView):
                     "message": "Experience record not found"
                 }
                 return Response(response_data, status=status.HTTP_404_NOT_FOUND)
-        experiences = Experience.objects.filter(user=user)
+        experiences = Experience.objects.filter(user=user).select_related('job_role')
         serializers = ExperienceSerializer(experiences, many=True)
         response_data = {
             "status": status.HTTP_200_OK,
@@ -814,7 +830,7 @@ class StaffReviewView(APIView):
         if user and user.is_staff:
             staff = Staff.objects.filter(user=user).first()
             if staff:
-                reviews = StaffReview.objects.filter(staff=staff)
+                reviews = StaffReview.objects.filter(staff=staff).select_related('review_by')
                 serializer = StaffReviewSerializer(reviews, many=True)
                 response_data = {
                     "status": status.HTTP_200_OK,
@@ -884,57 +900,17 @@ class StaffReviewView(APIView):
 
 class StaffWorkingHoursView(APIView):
     def get(self, request, staff_id, *args, **kwargs):
+        """DOWNLOAD THE STAFF WORKING HOURS AS CSV OR XLSX"""
         staff = Staff.objects.filter(id=staff_id).first()
         if staff:
-            working_hours = JobReport.objects.filter(job_application__applicant=staff)
-            
-            working_hours_list = []
-            for report in working_hours:
-                obj = {
-                    ""
-                    "job_title": report.job_application.vacancy.job.title,
-                    "company": report.job_application.vacancy.job.company.company_name,
-                    "working_hour": report.working_hour,
-                    "extra_hour": report.extra_hour,
-                    "regular_pay": report.regular_pay,
-                    "overtime_pay": report.overtime_pay,
-                    "tips": report.tips,
-                    "total_pay": report.total_pay,
-
-                    "date": report.job_application.created_at,
-                    "shift": f'{report.job_application.vacancy.start_time} to {report.job_application.vacancy.end_time}',
-                    "location": report.job_application.vacancy.location
-                }
-                working_hours_list.append(obj)
-                # convert this data into csv file and send it to the response.
-                # a downloadable csv file
-                # if the request comes from the app url 
-                # split the path
-                url_route = request.path.split('/')
-                if 'app' in url_route:
-                    # make csv file, save it in media folder
-                    pass 
-                
-                csv_file = StringIO()
-                csv_writer = csv.writer(csv_file)
-                headers = ['Job Title', 'Company', 'Working Hour', 'Extra Hour', 'Regular Pay', 'Overtime Pay', 'Tips', 'Total Pay', 'Date', 'Shift', 'Location']
-                csv_writer.writerow(headers)
-                csv_writer.writerow(obj.values())
-                response_data = {
-                    "status": status.HTTP_200_OK,
-                    "success": True,
-                    "message": "List of working hours",
-                    "data": csv_file.getvalue()
-                }
-                return Response(response_data, status=status.HTTP_200_OK)
+            try:
+                file_format, start, end = exports.export_params(request.query_params)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            rows = exports.payroll_rows(staff=staff, start=start, end=end)
+            return exports.payroll_response(rows, file_format, f'working_hours_{staff.id}')
 
-            # response_data = {
-            #     "status": status.HTTP_200_OK,
-            #     "success": True,
-            #     "message": "List of working hours",
-            #     "data": working_hours_list
-            # }
-            # return Response(response_data, status=status.HTTP_200_OK)
         response_data = {
             "status": status.HTTP_404_NOT_FOUND,
             "success": False,
@@ -950,7 +926,7 @@ class UpcommingJobsPreview(APIView):
         staff = get_object_or_404(Staff, id=pk)
 
 
-        upcoming_jobs = JobApplication.objects.filter(applicant=staff, is_approve=True).select_related('vacancy__job__company')
+        upcoming_jobs = JobApplication.objects.filter(applicant=staff, is_approve=True).select_related('vacancy__job__company', 'vacancy__job_title', 'vacancy__stats')
         # use pagination 
         page = request.GET.get('page',1)
         paginator = Paginator(upcoming_jobs, 5)
@@ -965,15 +941,6 @@ class UpcommingJobsPreview(APIView):
 
         # serializer = JobApplicationSerializer(jobs, many=True)
         upcoming_jobs = []
-        def get_application_status(obj):
-            # return the count of each job status 
-            job_application = JobApplication.objects.filter(vacancy=obj)
-            pending = job_application.filter(job_status='pending').count()
-            accepted = job_application.filter(job_status='accepted').count()
-            rejected = job_application.filter(job_status='rejected').count()
-            expierd = job_application.filter(job_status='expired').count()
-            return {'pending': pending, 'accepted': accepted,'rejected': rejected, 'expired': expierd}
-        
         # split route for app
         app_route = request.path.strip('/').split('/')
         if 'app' in app_route:
@@ -1012,7 +979,7 @@ class UpcommingJobsPreview(APIView):
                 # 'job_role': job.vacancy.job_title.name,
                 "job_status": job.vacancy.job_status,
                 "date": job.vacancy.created_at,
-                "application_status": get_application_status(job.vacancy)
+                "application_status": job.vacancy.application_status()
             }
             upcoming_jobs.append(obj)
 
@@ -1045,7 +1012,7 @@ class JobHistoryPreveiw(APIView):
     def get(self, request, pk, format=None):
         staff = get_object_or_404(Staff, id=pk)
         
-        job_history = JobApplication.objects.filter(applicant=staff, is_approve=True, job_status='completed').select_related('vacancy__job__company')
+        job_history = JobApplication.objects.filter(applicant=staff, is_approve=True, job_status='completed').select_related('vacancy__job__company', 'vacancy__job_title')
         # serializer = JobApplicationSerializer(job_history, many=True)
         # add pagination
         page = request.GET.get('page',1)
@@ -1059,15 +1026,12 @@ class JobHistoryPreveiw(APIView):
         
         url_route = request.path.strip('/').split('/')
         if 'app' in url_route:
-            data = {
-                    "total_apply": staff.job_applications.count(),
-
-                    "total_approved": staff.job_applications.filter(is_approve=True, job_status='accepted').count(),
-
-                    "total_cancel": staff.job_applications.filter(is_approve=False, job_status='cancelled').count(),
-
-                    "total_late": staff.job_applications.filter(is_approve=False, job_status='late').count(),
-                }
+            data = staff.job_applications.aggregate(
+                total_apply=Count('id'),
+                total_approved=Count('id', filter=Q(is_approve=True, job_status='accepted')),
+                total_cancel=Count('id', filter=Q(is_approve=False, job_status='cancelled')),
+                total_late=Count('id', filter=Q(is_approve=False, job_status='late')),
+            )
             response_data = {
                 "status": status.HTTP_200_OK,
                 "success": True,
@@ -1079,6 +1043,11 @@ class JobHistoryPreveiw(APIView):
             }
             return Response(response_data, status=status.HTTP_200_OK)
 
+        # one review per vacancy, all of them in one query
+        reviews = {
+            review.pop('vacancy_id'): review
+            for review in StaffReview.objects.filter(staff=staff, vacancy__isnull=False).values('vacancy_id', 'rating', 'content')
+        }
         job_history_list = []
         for job in job_history:
             obj = {
@@ -1093,7 +1062,7 @@ class JobHistoryPreveiw(APIView):
                 "end_time": job.vacancy.end_time,
                 # get review content for the vacancy
                 "locatin":job.vacancy.location,
-                "review": StaffReview.objects.filter(staff=staff, vacancy=job.vacancy).values('rating', 'content').first(),
+                "review": reviews.get(job.vacancy_id),
 
             }
             job_history_list.append(obj)
@@ -1115,7 +1084,7 @@ class ReviewPreview(APIView):
 
     def get(self, request, pk, format=None):
         staff = get_object_or_404(Staff, id=pk)
-        review_queryset = StaffReview.objects.filter(staff=staff)
+        review_queryset = StaffReview.objects.filter(staff=staff).select_related('vacancy__job__company')
 
         page = request.GET.get('page', 1)
         paginator = Paginator(review_queryset, 3)
@@ -1167,7 +1136,7 @@ class CancelJobAPIView(APIView):
                     if job_application:
                         job_application.job_status = 'cancelled'
                         job_application.save()
-                        notification = Notification.objects.create(
+                        notification = notify(
                             user=staff.user,
                             message=f'{staff} has cancelled the job application for {vacancy.job_title}'
                         )
@@ -1212,7 +1181,7 @@ class JobReportView(APIView):
 
         if params == 'true':
             applications = JobApplication.objects.filter(applicant=applicant, is_approve=True).only("id")
-            job_reports = JobReport.objects.filter(job_application__in=applications).select_related('job_application__vacancy__job__company')
+            job_reports = JobReport.objects.filter(job_application__in=applications).select_related('job_application__applicant__user', 'job_application__vacancy__job_title')
 
             report = []
             for job_report in job_reports:
@@ -24,6 +24,7 @@ from .models import (
     Uniform
 )
 from .email_service import send_staff_signup_email, send_client_signup_email, send_staff_invitation_email_from_client
+from dashboard.middleware import revoke_token
 
 
 # Create your views here.
@@ -216,6 +217,8 @@ class LogoutAPIView(APIView):
             token_obj = OutstandingToken.objects.filter(token=access_token_str).first()
             if token_obj:
                 BlacklistedToken.objects.get_or_create(token=token_obj)
+            # drop the cached websocket user and refuse reconnects with this token
+            revoke_token(access_token)
 
             return Response({
                 "success": True,
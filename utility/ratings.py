@@ -0,0 +1,73 @@
+# review count and rating total kept on a parent row, shared by the staff and company review signals
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete
+
+
+def loaded_values(instance, fields):
+    """values of fields as loaded, None for an unsaved row or when one of them was deferred"""
+    if not instance.pk or any(field not in instance.__dict__ for field in fields):
+        return None
+    return tuple(instance.__dict__[field] for field in fields)
+
+
+def shift_counters(counters, sign, rating, count_field, total_field, **extra):
+    """Add (sign 1) or take (sign -1) one review of rating on the counters queryset.
+
+    False when nothing was updated, a take that would go below zero matches no row
+    """
+    # single UPDATE with F() so concurrent reviews don't lose counts
+    if sign < 0:
+        counters = counters.filter(**{f'{count_field}__gte': 1, f'{total_field}__gte': rating})
+    return counters.update(**{
+        count_field: F(count_field) + sign,
+        total_field: F(total_field) + sign * rating,
+    }, **extra) > 0
+
+
+def track_ratings(review_model, key, shift, recount):
+    """Keep rating counters in step with every save and delete of review_model.
+
+    key(review): (parent id, ...) of the counted fields as loaded, None when one was deferred
+    shift(key, sign): add or take one review, False when the counters could not take it
+    recount(parent_ids): rebuild the counters of these parents from their reviews
+    """
+    def rebuild(*parent_ids):
+        parent_ids = {parent_id for parent_id in parent_ids if parent_id}
+        if parent_ids:
+            recount(parent_ids)
+
+    def remember(sender, instance, **kwargs):
+        instance._loaded_rating = key(instance)
+
+    def count(sender, instance, created, raw=False, **kwargs):
+        if raw:
+            return
+        old, new = None if created else instance._loaded_rating, key(instance)
+        if new is None or (not created and old is None):
+            # partially loaded review, its old numbers are unknown
+            parent_id = new[0] if new else key(review_model._base_manager.get(pk=instance.pk))[0]
+            rebuild(old and old[0], parent_id)
+        elif old != new:
+            # the counters drifted below this review, the recount sees the saved row already
+            if old and not shift(old, -1):
+                rebuild(old[0], new[0])
+            else:
+                shift(new, 1)
+        instance._loaded_rating = new
+
+    def load(sender, instance, **kwargs):
+        # the row is still there, read the numbers a partial load left out
+        if instance._loaded_rating is None and instance.pk:
+            stored = review_model._base_manager.filter(pk=instance.pk).first()
+            instance._loaded_rating = stored and stored._loaded_rating
+
+    def uncount(sender, instance, **kwargs):
+        old = instance._loaded_rating
+        if old and not shift(old, -1):
+            rebuild(old[0])
+
+    uid = f'{review_model._meta.label_lower}_ratings'
+    post_init.connect(remember, sender=review_model, weak=False, dispatch_uid=uid)
+    post_save.connect(count, sender=review_model, weak=False, dispatch_uid=uid)
+    pre_delete.connect(load, sender=review_model, weak=False, dispatch_uid=uid)
+    post_delete.connect(uncount, sender=review_model, weak=False, dispatch_uid=uid)
@@ -1,5 +1,3 @@
-# calculate distance 
-from geopy.distance import geodesic
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.core.mail import send_mail
@@ -11,16 +9,12 @@ from weasyprint import HTML
 import os
 
 from client.models import InviteMystaff
+from client.geo import haversine
 
 
 def calculate_distance(lat1, lon1, lat2, lon2, radius=25):
-    # Create tuples for coordinates
-    coord1 = (lat1, lon1)
-    coord2 = (lat2, lon2)
-    
-    # Calculate distance using geodesic function
-    distance = geodesic(coord1, coord2).meters
-    return distance
+    # meters, same haversine the check-in scoring uses
+    return float(haversine(lat1, lon1, lat2, lon2))
 
 
 